@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2019 IUCT-O
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__author__ = 'Frederic Escudie'
+__copyright__ = 'Copyright (C) 2019 IUCT-O'
+__license__ = 'GNU General Public License'
+__version__ = '1.1.0'
+__email__ = 'escudie.frederic@iuct-oncopole.fr'
+__status__ = 'prod'
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from copy import deepcopy
+from statistics import median
+from collections import Counter
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB_DIR = os.path.join(APP_FOLDER, "jflow", "workflows", "lib")
+sys.path.insert(0, LIB_DIR)
+BIN_DIR = os.path.join(APP_FOLDER, "jflow", "workflows", "bin")
+sys.path.insert(0, BIN_DIR)
+STARTUP_SCRIPTS = [  # Scripts executed by each short task of the workflows
+    os.path.join(BIN_DIR, "combinePairs.py"),
+    os.path.join(BIN_DIR, "gatherLocusRes.py"),
+    os.path.join(APP_FOLDER, "jflow", "workflows", "MIAmS_tag", "bin", "miamsClassify.py"),
+    os.path.join(APP_FOLDER, "jflow", "workflows", "MIAmS_tag", "bin", "MSIMergeReports.py")
+]
+
+from anacore.sequenceIO import FastqIO
+from simulateAmplicons import getAlleleShift, getAmpliconLength, getLoci, parseDistrib, simulate
+
+
+########################################################################
+#
+# FUNCTIONS
+#
+########################################################################
+class SkippedBenchmark(Exception):
+    """Raised by a benchmark which cannot be run in the current environment (example: missing dependency)."""
+
+
+def measure(function, setup=None, nb_repeats=3):
+    """
+    Return the wall times and the peak of memory allocated by the function. The times are measured without memory tracing and the memory is measured on an additional call.
+
+    :param function: The benchmarked function. It takes the value returned by setup.
+    :type function: function
+    :param setup: The function called before each call of the benchmarked function. Its execution is not measured.
+    :type setup: function
+    :param nb_repeats: The number of timed calls.
+    :type nb_repeats: int
+    :return: The measures: wall_time (values, median and min in seconds) and peak_memory (in bytes).
+    :rtype: dict
+    """
+    times = list()
+    for repeat_idx in range(nb_repeats):
+        data = None if setup is None else setup()
+        start_time = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start_time)
+    data = None if setup is None else setup()
+    tracemalloc.start()
+    try:
+        function(data)
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_time": {"values": times, "median": median(times), "min": min(times)},
+        "peak_memory": peak_memory
+    }
+
+
+def getLengthsCount(locus, rand, depth, somatic_shift, tumor_fraction, stutter_rate):
+    """
+    Return the number of fragments by length for a locus without simulation of the reads.
+
+    :param locus: The locus (see simulateAmplicons.getLoci).
+    :type locus: dict
+    :param rand: The random generator.
+    :type rand: random.Random
+    :param depth: The number of fragments.
+    :type depth: int
+    :param somatic_shift: The shift of the somatic allele in repeat units (0 for a stable locus).
+    :type somatic_shift: int
+    :param tumor_fraction: The proportion of fragments coming from the somatic allele.
+    :type tumor_fraction: float
+    :param stutter_rate: The probability of a PCR slippage removing one unit.
+    :type stutter_rate: float
+    :return: The number of fragments by length (the keys are str as in MSIReport).
+    :rtype: dict
+    """
+    count_by_length = Counter()
+    for frag_idx in range(depth):
+        shift = getAlleleShift(somatic_shift, rand, tumor_fraction, stutter_rate)
+        count_by_length[str(getAmpliconLength(locus, shift))] += 1
+    return dict(count_by_length)
+
+
+def getMSISamples(nb_samples, nb_loci, depth, random_seed, stutter_rate=0.1, tumor_fraction=0.4, method="model"):
+    """
+    Return simulated MSISample with the lengths distributions and the status of their loci.
+
+    :param nb_samples: The number of samples. The odd samples are unstable.
+    :type nb_samples: int
+    :param nb_loci: The number of loci.
+    :type nb_loci: int
+    :param depth: The number of fragments by locus.
+    :type depth: int
+    :param random_seed: The seed of the random generator.
+    :type random_seed: int
+    :param stutter_rate: The probability of a PCR slippage removing one unit.
+    :type stutter_rate: float
+    :param tumor_fraction: The proportion of fragments coming from the somatic allele.
+    :type tumor_fraction: float
+    :param method: The name of the method storing status and distributions.
+    :type method: str
+    :return: The samples.
+    :rtype: list
+    """
+    from anacore.msi import LocusResPairsCombi, MSILocus, MSISample, Status
+    rand = random.Random(random_seed)
+    loci = getLoci(nb_loci, ["A", "T", "CA"], rand)
+    shifts_distrib = parseDistrib("-2:0.1,-3:0.2,-4:0.3,-5:0.2,-6:0.1,-8:0.1")
+    shifts = sorted(shifts_distrib)
+    samples = list()
+    for spl_idx in range(nb_samples):
+        spl = MSISample("splA_{}".format(spl_idx))
+        for locus in loci:
+            locus_id = "{}:{}-{}".format(locus["chrom"], locus["start"], locus["start"] + getAmpliconLength(locus, 0))
+            somatic_shift = 0
+            if spl_idx % 2 == 1 and rand.random() < 0.7:
+                somatic_shift = rand.choices(shifts, [shifts_distrib[elt] for elt in shifts])[0]
+            msi_locus = MSILocus(locus_id, locus["name"])
+            msi_locus.results[method] = LocusResPairsCombi(
+                Status.unstable if somatic_shift != 0 else Status.stable,
+                round(rand.uniform(0.6, 1.0), 6),
+                {"nb_by_length": getLengthsCount(locus, rand, depth, somatic_shift, tumor_fraction, stutter_rate)}
+            )
+            spl.addLocus(msi_locus)
+        samples.append(spl)
+    return samples
+
+
+def benchFastqParse(paths, nb_repeats):
+    """Measure the iteration on all the records of the R1 file with FastqIO."""
+    def parse(data):
+        with FastqIO(paths["R1"]) as FH_in:
+            for record in FH_in:
+                pass
+    return measure(parse, nb_repeats=nb_repeats)
+
+
+def benchFastqWrite(paths, nb_repeats, work_folder):
+    """Measure the writing of all the records of the R1 file with FastqIO."""
+    with FastqIO(paths["R1"]) as FH_in:
+        records = [record for record in FH_in]
+    out_path = os.path.join(work_folder, "written.fastq")
+
+    def write(data):
+        with FastqIO(out_path, "w") as FH_out:
+            for record in records:
+                FH_out.write(record)
+    return measure(write, nb_repeats=nb_repeats)
+
+
+def benchCombinePairs(paths, nb_repeats, work_folder):
+    """Measure combinePairs.process on the R1 and R2 files."""
+    import combinePairs
+    args = argparse.Namespace(
+        input_R1=paths["R1"],
+        input_R2=paths["R2"],
+        output_combined=os.path.join(work_folder, "combined.fastq"),
+        output_report=os.path.join(work_folder, "combined_report.json"),
+        min_overlap=20,
+        max_contradict_ratio=0.1,
+        min_frag_length=None,
+        max_frag_length=None,
+        reading_workers=None,
+        cache_size=10000,
+        kmer_size=None, input_targets=None
+    )
+    log = logging.getLogger("combinePairs")
+    log.setLevel(logging.WARNING)
+    return measure(lambda data: combinePairs.process(args, log), nb_repeats=nb_repeats)
+
+
+def benchGetReadsFromBAM(paths, nb_repeats):
+    """Measure bamAreasToFastq.getReadsFromBAM on the alignments file and the targets."""
+    try:
+        import bamAreasToFastq
+    except ImportError as error:
+        raise SkippedBenchmark(str(error))
+    if paths["bam"] is None:
+        raise SkippedBenchmark("The alignments file has not been simulated (pysam is missing).")
+    from anacore.bed import getAreas
+    selected_areas = getAreas(paths["targets"])
+    return measure(lambda data: bamAreasToFastq.getReadsFromBAM(paths["bam"], selected_areas, 20), nb_repeats=nb_repeats)
+
+
+def benchPickSeq(paths, nb_repeats, work_folder):
+    """Measure bamAreasToFastq.pickSeq on the R1 file with one read out of two kept."""
+    try:
+        import bamAreasToFastq
+    except ImportError as error:
+        raise SkippedBenchmark(str(error))
+    kept_ids = set()
+    with FastqIO(paths["R1"]) as FH_in:
+        for record_idx, record in enumerate(FH_in):
+            if record_idx % 2 == 0:
+                kept_ids.add(record.id)
+    out_path = os.path.join(work_folder, "picked.fastq")
+    return measure(lambda data: bamAreasToFastq.pickSeq(paths["R1"], out_path, kept_ids), nb_repeats=nb_repeats)
+
+
+def requireModules(modules_names):
+    """
+    Raise SkippedBenchmark if one of the modules cannot be imported. It is used for the dependencies imported only in the benchmarked methods (example: numpy in anacore.msi).
+
+    :param modules_names: The names of the required modules.
+    :type modules_names: list
+    """
+    for module_name in modules_names:
+        try:
+            __import__(module_name)
+        except ImportError as error:
+            raise SkippedBenchmark(str(error))
+
+
+def importMSI(dependencies=None):
+    """
+    Return the anacore.msi module or raise SkippedBenchmark if its dependencies are missing.
+
+    :param dependencies: The modules imported by the benchmarked methods of anacore.msi (example: ["numpy"] for the classifiers).
+    :type dependencies: list
+    :return: The module anacore.msi.
+    :rtype: module
+    """
+    try:
+        from anacore import msi
+    except ImportError as error:
+        raise SkippedBenchmark(str(error))
+    requireModules([] if dependencies is None else dependencies)
+    return msi
+
+
+def benchMSIReportWrite(samples, nb_repeats, work_folder):
+    """Measure MSIReport.write on the samples."""
+    msi = importMSI()
+    out_path = os.path.join(work_folder, "report.json")
+    return measure(lambda data: msi.MSIReport.write(samples, out_path), nb_repeats=nb_repeats)
+
+
+def benchMSIReportParse(samples, nb_repeats, work_folder):
+    """Measure MSIReport.parse on the file containing the samples."""
+    msi = importMSI()
+    in_path = os.path.join(work_folder, "report.json")
+    msi.MSIReport.write(samples, in_path)
+    return measure(lambda data: msi.MSIReport.parse(in_path), nb_repeats=nb_repeats)
+
+
+def getClassifier(name="SVC"):
+    """Return the classifier used in LocusClassifier benchmarks (SVC or Wasserstein) or raise SkippedBenchmark if its dependencies are missing."""
+    if name == "Wasserstein":
+        return importMSI(["numpy"]).WassersteinClassifier()
+    try:
+        from sklearn.svm import SVC
+    except ImportError as error:
+        raise SkippedBenchmark(str(error))
+    return SVC(gamma="scale", probability=True, random_state=42)
+
+
+def benchLocusClassifierFit(samples, nb_repeats, classifier_name="SVC"):
+    """Measure LocusClassifier.fit for each locus on the samples."""
+    msi = importMSI(["numpy"])
+    loci_id = sorted(samples[0].loci)
+
+    def fit(data):
+        for locus_id in loci_id:
+            msi.LocusClassifier(locus_id, classifier_name, getClassifier(classifier_name)).fit(samples)
+    return measure(fit, nb_repeats=nb_repeats)
+
+
+def benchLocusClassifierFitCompacted(samples, nb_repeats, compaction_size=20):
+    """Measure LocusClassifier.fit with SVC for each locus on the samples compacted in at most compaction_size weighted references by locus and by status (see createMSIRef.compactReferences)."""
+    msi = importMSI(["numpy"])  # Required by compactReferences and LocusClassifier.fit
+    getClassifier("SVC")  # Skip before the compaction if scikit-learn is missing
+    sys.path.insert(0, os.path.join(APP_FOLDER, "jflow", "workflows", "MIAmS_learn", "bin"))
+    from createMSIRef import compactReferences
+    compacted_samples = deepcopy(samples)
+    compactReferences(compacted_samples, "model", compaction_size)
+    loci_id = sorted(samples[0].loci)
+
+    def fit(data):
+        for locus_id in loci_id:
+            msi.LocusClassifier(locus_id, "SVC", getClassifier("SVC")).fit(compacted_samples)
+    return measure(fit, nb_repeats=nb_repeats)
+
+
+def benchLocusClassifierPredict(samples, nb_repeats, classifier_name="SVC"):
+    """Measure LocusClassifier.predict for each locus on the samples with half of them used for training."""
+    msi = importMSI(["numpy"])
+    train_dataset = samples[::2]
+    test_dataset = samples[1::2]
+    loci_id = sorted(samples[0].loci)
+
+    def setup():
+        classifiers = list()
+        for locus_id in loci_id:
+            clf = msi.LocusClassifier(locus_id, classifier_name, getClassifier(classifier_name), data_method_name="model")
+            clf.fit(train_dataset)
+            classifiers.append(clf)
+        return classifiers
+
+    def predict(classifiers):
+        for clf in classifiers:
+            clf.predict(test_dataset)
+    return measure(predict, setup, nb_repeats)
+
+
+def benchConsensus(samples, nb_repeats, consensus_method):
+    """Measure the sample status calculation from the loci status with the selected consensus function."""
+    msi = importMSI()
+
+    def consensus(data):
+        for spl in samples:
+            if consensus_method == "count":
+                spl.setStatusByInstabilityCount("model", 3, 3)
+            elif consensus_method == "majority":
+                spl.setStatusByMajority("model", 3)
+            else:
+                spl.setStatusByInstabilityRatio("model", 3, 0.2)
+    return measure(consensus, nb_repeats=nb_repeats)
+
+
+def benchStartup(script_path, nb_repeats, nb_slowest=5):
+    """
+    Measure the start of the script with "python -X importtime script --version": wall time of the process, total time spent in imports and slowest imported modules.
+
+    :param script_path: Path to the script.
+    :type script_path: str
+    :param nb_repeats: The number of timed executions.
+    :type nb_repeats: int
+    :param nb_slowest: The number of slowest top-level imports reported.
+    :type nb_slowest: int
+    :return: The measures: wall_time (values, median and min in seconds), peak_memory (None: not measured), import_time (values, median and min in seconds) and slowest_imports (cumulative time in seconds by top-level module of the last execution).
+    :rtype: dict
+    """
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([LIB_DIR] + ([environment["PYTHONPATH"]] if environment.get("PYTHONPATH") else []))
+    times = list()
+    import_times = list()
+    for repeat_idx in range(nb_repeats):
+        start_time = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", script_path, "--version"],
+            env=environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+        times.append(time.perf_counter() - start_time)
+        if process.returncode != 0:
+            raise SkippedBenchmark(process.stderr.strip().split("\n")[-1])
+        total_import_time = 0
+        top_level_imports = dict()
+        for line in process.stderr.split("\n"):  # Format: "import time: self [us] | cumulative | imported package"
+            if line.startswith("import time:") and not line.endswith("imported package"):
+                self_time, cumulative_time, module_name = line[len("import time:"):].split("|")
+                total_import_time += int(self_time) / 1000000
+                if not module_name.startswith("  "):  # Imported by the script itself
+                    top_level_imports[module_name.strip()] = int(cumulative_time) / 1000000
+        import_times.append(total_import_time)
+    return {
+        "wall_time": {"values": times, "median": median(times), "min": min(times)},
+        "peak_memory": None,
+        "import_time": {"values": import_times, "median": median(import_times), "min": min(import_times)},
+        "slowest_imports": dict(sorted(top_level_imports.items(), key=lambda elt: -elt[1])[:nb_slowest])
+    }
+
+
+def runBenchmark(name, scale, scale_unit, function, *args):
+    """
+    Run one benchmark and return its result. The benchmarks which cannot be run in the current environment are reported as skipped.
+
+    :param name: The name of the benchmark.
+    :type name: str
+    :param scale: The size of the dataset.
+    :type scale: int
+    :param scale_unit: The unit of the scale (example: "pairs").
+    :type scale_unit: str
+    :param function: The benchmark function.
+    :type function: function
+    :return: The result with name, scale, scale_unit, status ("ok" or "skipped") and if the benchmark is run wall_time and peak_memory otherwise message.
+    :rtype: dict
+    """
+    result = {"name": name, "scale": scale, "scale_unit": scale_unit, "status": "ok"}
+    try:
+        result.update(function(*args))
+        log.info("{} on {} {}: {:.4f}s (peak memory: {} bytes).".format(name, scale, scale_unit, result["wall_time"]["median"], result["peak_memory"]))
+    except SkippedBenchmark as error:
+        result["status"] = "skipped"
+        result["message"] = str(error)
+        log.warning("{} on {} {} is skipped: {}".format(name, scale, scale_unit, error))
+    return result
+
+
+def getEnvironment():
+    """
+    Return the description of the environment running the benchmarks.
+
+    :return: The versions of python and of the platform, the number of CPU and the versions of the optional dependencies.
+    :rtype: dict
+    """
+    environment = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "dependencies": dict()
+    }
+    for module_name in ["numpy", "sklearn", "pysam"]:
+        try:
+            module = __import__(module_name)
+            environment["dependencies"][module_name] = getattr(module, "__version__", "unknown")
+        except ImportError:
+            environment["dependencies"][module_name] = None
+    return environment
+
+
+########################################################################
+#
+# MAIN
+#
+########################################################################
+if __name__ == "__main__":
+    # Manage parameters
+    parser = argparse.ArgumentParser(description='Measure execution time and memory of the MIAmS hot paths on simulated datasets.')
+    parser.add_argument('-n', '--nb-repeats', default=3, type=int, help='The number of timed executions for each benchmark. [Default: %(default)s]')
+    parser.add_argument('-s', '--random-seed', default=42, type=int, help='The seed of the random generator used in simulations. [Default: %(default)s]')
+    parser.add_argument('-v', '--version', action='version', version=__version__)
+    group_reads = parser.add_argument_group('Reads benchmarks')  # Reads benchmarks
+    group_reads.add_argument('-d', '--depths', nargs='+', type=int, default=[100, 1000, 5000], help='The number of reads pairs by locus in each scale. [Default: %(default)s]')
+    group_reads.add_argument('-l', '--nb-loci', default=5, type=int, help='The number of loci in reads simulations. [Default: %(default)s]')
+    group_reads.add_argument('-r', '--read-length', default=150, type=int, help='The maximum length of the reads. [Default: %(default)s]')
+    group_reads.add_argument('-u', '--repeat-units', nargs='+', default=["A", "T", "CA"], help='The repeat units used in turn by the loci. [Default: %(default)s]')
+    group_reads.add_argument('-i', '--indels-distrib', default="-2:0.1,-3:0.2,-4:0.3,-5:0.2,-6:0.1,-8:0.1", help='The weight by shift in repeat units for the somatic alleles (format: shift:weight,shift:weight). [Default: %(default)s]')
+    group_reads.add_argument('-t', '--stutter-rate', default=0.1, type=float, help='The probability of a PCR slippage removing one unit. [Default: %(default)s]')
+    group_samples = parser.add_argument_group('Samples benchmarks')  # Samples benchmarks
+    group_samples.add_argument('-p', '--nb-samples', nargs='+', type=int, default=[20, 100, 500], help='The number of samples in each scale for reports, classifiers and consensus benchmarks. [Default: %(default)s]')
+    group_samples.add_argument('-k', '--nb-samples-loci', default=20, type=int, help='The number of loci by sample. [Default: %(default)s]')
+    group_input = parser.add_argument_group('Inputs')  # Inputs
+    group_input.add_argument('-w', '--work-folder', help='The directory used for the simulated datasets and the temporary outputs. [Default: temporary directory removed at the end]')
+    group_output = parser.add_argument_group('Outputs')  # Outputs
+    group_output.add_argument('-o', '--output-results', default="benchmarks.json", help='The path to the results (format: JSON). [Default: %(default)s]')
+    args = parser.parse_args()
+
+    # Logger
+    logging.basicConfig(format='%(asctime)s -- [%(filename)s][pid:%(process)d][%(levelname)s] -- %(message)s')
+    log = logging.getLogger("runBenchmarks")
+    log.setLevel(logging.INFO)
+    log.info("Command: " + " ".join(sys.argv))
+    log.info("Start")
+
+    # Process
+    work_folder = args.work_folder
+    if work_folder is None:
+        work_folder = tempfile.mkdtemp()
+    elif not os.path.exists(work_folder):
+        os.makedirs(work_folder)
+    results = list()
+    try:
+        # Scripts start
+        for script_path in STARTUP_SCRIPTS:
+            results.append(runBenchmark("startup[{}]".format(os.path.basename(script_path)), 1, "process", benchStartup, script_path, args.nb_repeats))
+        # Reads
+        for depth in args.depths:
+            scale = depth * args.nb_loci
+            paths, loci = simulate(
+                os.path.join(work_folder, "simulated_{}".format(depth)), args.nb_loci, depth, args.read_length, args.repeat_units,
+                parseDistrib(args.indels_distrib), stutter_rate=args.stutter_rate, random_seed=args.random_seed
+            )
+            results.append(runBenchmark("FastqIO.parse", scale, "reads", benchFastqParse, paths, args.nb_repeats))
+            results.append(runBenchmark("FastqIO.write", scale, "reads", benchFastqWrite, paths, args.nb_repeats, work_folder))
+            results.append(runBenchmark("combinePairs.process", scale, "pairs", benchCombinePairs, paths, args.nb_repeats, work_folder))
+            results.append(runBenchmark("bamAreasToFastq.getReadsFromBAM", scale, "pairs", benchGetReadsFromBAM, paths, args.nb_repeats))
+            results.append(runBenchmark("bamAreasToFastq.pickSeq", scale, "reads", benchPickSeq, paths, args.nb_repeats, work_folder))
+        # Samples
+        for nb_samples in args.nb_samples:
+            try:
+                samples = getMSISamples(nb_samples, args.nb_samples_loci, 300, args.random_seed, args.stutter_rate)
+            except ImportError as error:
+                samples = None
+            for name, function, function_args in [
+                ("MSIReport.write", benchMSIReportWrite, [args.nb_repeats, work_folder]),
+                ("MSIReport.parse", benchMSIReportParse, [args.nb_repeats, work_folder]),
+                ("LocusClassifier.fit", benchLocusClassifierFit, [args.nb_repeats]),
+                ("LocusClassifier.predict", benchLocusClassifierPredict, [args.nb_repeats]),
+                ("LocusClassifier.fit[Wasserstein]", benchLocusClassifierFit, [args.nb_repeats, "Wasserstein"]),
+                ("LocusClassifier.fit[compacted]", benchLocusClassifierFitCompacted, [args.nb_repeats]),
+                ("LocusClassifier.predict[Wasserstein]", benchLocusClassifierPredict, [args.nb_repeats, "Wasserstein"]),
+                ("MSISample.setStatusByInstabilityCount", benchConsensus, [args.nb_repeats, "count"]),
+                ("MSISample.setStatusByInstabilityRatio", benchConsensus, [args.nb_repeats, "ratio"]),
+                ("MSISample.setStatusByMajority", benchConsensus, [args.nb_repeats, "majority"])
+            ]:
+                if samples is None:
+                    benchmark_function = lambda *ignored: importMSI()  # Raise the missing dependency as SkippedBenchmark
+                    results.append(runBenchmark(name, nb_samples, "samples", benchmark_function))
+                else:
+                    results.append(runBenchmark(name, nb_samples, "samples", function, samples, *function_args))
+    finally:
+        if args.work_folder is None:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    # Write results
+    with open(args.output_results, "w") as FH_out:
+        json.dump(
+            {
+                "version": __version__,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "environment": getEnvironment(),
+                "parameters": vars(args),
+                "results": results
+            },
+            FH_out,
+            indent=2,
+            sort_keys=True
+        )
+    log.info("End of job")
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2019 IUCT-O
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__author__ = 'Frederic Escudie'
+__copyright__ = 'Copyright (C) 2019 IUCT-O'
+__license__ = 'GNU General Public License'
+__version__ = '1.0.0'
+__email__ = 'escudie.frederic@iuct-oncopole.fr'
+__status__ = 'prod'
+
+import os
+import random
+import logging
+import argparse
+
+
+########################################################################
+#
+# FUNCTIONS
+#
+########################################################################
+COMPLEMENT = {"A": "T", "T": "A", "G": "C", "C": "G", "N": "N"}
+
+
+def revCom(seq):
+    """
+    Return the reverse complement of the sequence.
+
+    :param seq: The nucleotids sequence.
+    :type seq: str
+    :return: The reverse complement.
+    :rtype: str
+    """
+    return "".join([COMPLEMENT[nt] for nt in reversed(seq)])
+
+
+def parseDistrib(distrib_str):
+    """
+    Return the probabilities by shift from a string with format "shift:weight,shift:weight". The weights are normalised.
+
+    :param distrib_str: The distribution (example: "-1:0.2,-2:0.5,-3:0.3").
+    :type distrib_str: str
+    :return: The probability by shift in repeat units.
+    :rtype: dict
+    """
+    weight_by_shift = dict()
+    for elt in distrib_str.split(","):
+        shift, weight = elt.split(":")
+        weight_by_shift[int(shift)] = float(weight)
+    total = sum(weight_by_shift.values())
+    return {shift: weight / total for shift, weight in weight_by_shift.items()}
+
+
+def getLoci(nb_loci, repeat_units, rand, flank_length=80, min_repeats=10, max_repeats=25, chrom="synth"):
+    """
+    Return microsatellites loci placed one after the other on a synthetic chromosome.
+
+    :param nb_loci: The number of loci.
+    :type nb_loci: int
+    :param repeat_units: The repeat units used in turn by the loci (example: ["A", "CA"]).
+    :type repeat_units: list
+    :param rand: The random generator.
+    :type rand: random.Random
+    :param flank_length: The length of the unique sequence on each side of the repeat in amplicon.
+    :type flank_length: int
+    :param min_repeats: The minimum number of repeat units in the reference.
+    :type min_repeats: int
+    :param max_repeats: The maximum number of repeat units in the reference.
+    :type max_repeats: int
+    :param chrom: The name of the chromosome.
+    :type chrom: str
+    :return: The loci. Each locus is a dict with name, chrom, unit, nb_repeats, upstream, downstream, start (0-based start of amplicon) and repeat_start (0-based start of repeat).
+    :rtype: list
+    """
+    loci = list()
+    curr_pos = 0
+    for locus_idx in range(nb_loci):
+        unit = repeat_units[locus_idx % len(repeat_units)]
+        upstream = getRandomSeq(flank_length, rand, unit[0])
+        downstream = getRandomSeq(flank_length, rand, unit[-1])
+        spacer = getRandomSeq(flank_length, rand)
+        locus = {
+            "name": "locus_{}".format(locus_idx + 1),
+            "chrom": chrom,
+            "unit": unit,
+            "nb_repeats": rand.randint(min_repeats, max_repeats),
+            "upstream": upstream,
+            "downstream": downstream,
+            "spacer": spacer,
+            "start": curr_pos + len(spacer),
+            "repeat_start": curr_pos + len(spacer) + len(upstream)
+        }
+        curr_pos = locus["start"] + getAmpliconLength(locus, 0)
+        loci.append(locus)
+    return loci
+
+
+def getRandomSeq(length, rand, excluded_nt=None):
+    """
+    Return a random nucleotids sequence.
+
+    :param length: The sequence length.
+    :type length: int
+    :param rand: The random generator.
+    :type rand: random.Random
+    :param excluded_nt: This nucleotid is not used at the end and at the start of the sequence to keep the repeat boundaries.
+    :type excluded_nt: str
+    :return: The sequence.
+    :rtype: str
+    """
+    seq = [rand.choice("ACGT") for idx in range(length)]
+    if excluded_nt is not None and length > 0:
+        allowed_nt = [nt for nt in "ACGT" if nt != excluded_nt]
+        seq[0] = rand.choice(allowed_nt)
+        seq[-1] = rand.choice(allowed_nt)
+    return "".join(seq)
+
+
+def getAmpliconLength(locus, shift):
+    """
+    Return the length of the amplicon for an allele of the locus.
+
+    :param locus: The locus (see getLoci).
+    :type locus: dict
+    :param shift: The difference in number of repeat units between the allele and the reference.
+    :type shift: int
+    :return: The length.
+    :rtype: int
+    """
+    return len(locus["upstream"]) + len(locus["unit"]) * (locus["nb_repeats"] + shift) + len(locus["downstream"])
+
+
+def getReference(loci):
+    """
+    Return the sequence of the synthetic chromosome containing the loci.
+
+    :param loci: The loci (see getLoci).
+    :type loci: list
+    :return: The chromosome sequence.
+    :rtype: str
+    """
+    return "".join([locus["spacer"] + getAmplicon(locus, 0) for locus in loci])
+
+
+def getAmplicon(locus, shift):
+    """
+    Return the sequence of the amplicon for an allele of the locus.
+
+    :param locus: The locus (see getLoci).
+    :type locus: dict
+    :param shift: The difference in number of repeat units between the allele and the reference.
+    :type shift: int
+    :return: The sequence.
+    :rtype: str
+    """
+    return locus["upstream"] + locus["unit"] * (locus["nb_repeats"] + shift) + locus["downstream"]
+
+
+def getAmpliconCigar(locus, shift):
+    """
+    Return the alignment of the amplicon for an allele of the locus on the reference. The indel is placed at the end of the repeat.
+
+    :param locus: The locus (see getLoci).
+    :type locus: dict
+    :param shift: The difference in number of repeat units between the allele and the reference.
+    :type shift: int
+    :return: The CIGAR operations [(operation, length), ...] with operation in M, I and D.
+    :rtype: list
+    """
+    unit_len = len(locus["unit"])
+    ref_repeat_len = unit_len * locus["nb_repeats"]
+    cigar = list()
+    if shift < 0:
+        cigar.append(["M", len(locus["upstream"]) + ref_repeat_len + shift * unit_len])
+        cigar.append(["D", -shift * unit_len])
+        cigar.append(["M", len(locus["downstream"])])
+    elif shift > 0:
+        cigar.append(["M", len(locus["upstream"]) + ref_repeat_len])
+        cigar.append(["I", shift * unit_len])
+        cigar.append(["M", len(locus["downstream"])])
+    else:
+        cigar.append(["M", len(locus["upstream"]) + ref_repeat_len + len(locus["downstream"])])
+    return [(operation, length) for operation, length in cigar if length > 0]
+
+
+def sliceCigar(cigar, query_start, query_end):
+    """
+    Return the alignment of a part of the query.
+
+    :param cigar: The CIGAR operations of the query (see getAmpliconCigar).
+    :type cigar: list
+    :param query_start: The start of the part on the query (0-based).
+    :type query_start: int
+    :param query_end: The end of the part on the query (0-based, excluded).
+    :type query_end: int
+    :return: The offset of the part on the reference from the start of the query alignment and the CIGAR operations of the part.
+    :rtype: (int, list)
+    """
+    query_pos = 0
+    ref_pos = 0
+    ref_offset = None
+    sliced = list()
+    for operation, length in cigar:
+        consumes_query = operation in ("M", "I")
+        consumes_ref = operation in ("M", "D")
+        if consumes_query:
+            op_start = max(query_pos, query_start)
+            op_end = min(query_pos + length, query_end)
+            if op_start < op_end:
+                if ref_offset is None:
+                    ref_offset = ref_pos + (op_start - query_pos if consumes_ref else 0)
+                sliced.append((operation, op_end - op_start))
+            query_pos += length
+        elif query_start < query_pos < query_end:  # Deletion inside the part
+            sliced.append((operation, length))
+        if consumes_ref:
+            ref_pos += length
+    return ref_offset, sliced
+
+
+def getAlleleShift(somatic_shift, rand, tumor_fraction, stutter_rate):
+    """
+    Return the shift in number of repeat units for one fragment.
+
+    :param somatic_shift: The shift of the somatic allele (0 for a stable locus).
+    :type somatic_shift: int
+    :param rand: The random generator.
+    :type rand: random.Random
+    :param tumor_fraction: The proportion of fragments coming from the somatic allele.
+    :type tumor_fraction: float
+    :param stutter_rate: The probability of a PCR slippage removing one unit. The addition of one unit has a probability five times lower.
+    :type stutter_rate: float
+    :return: The shift.
+    :rtype: int
+    """
+    shift = 0
+    if somatic_shift != 0 and rand.random() < tumor_fraction:
+        shift = somatic_shift
+    stutter_draw = rand.random()
+    if stutter_draw < stutter_rate:
+        shift -= 1
+    elif stutter_draw < stutter_rate * 1.2:
+        shift += 1
+    return shift
+
+
+def addErrors(seq, rand, error_rate):
+    """
+    Return the sequence with substitutions.
+
+    :param seq: The nucleotids sequence.
+    :type seq: str
+    :param rand: The random generator.
+    :type rand: random.Random
+    :param error_rate: The probability of substitution for each nucleotid.
+    :type error_rate: float
+    :return: The sequence with errors.
+    :rtype: str
+    """
+    if error_rate == 0:
+        return seq
+    seq = list(seq)
+    for idx in range(len(seq)):
+        if rand.random() < error_rate:
+            seq[idx] = rand.choice([nt for nt in "ACGT" if nt != seq[idx]])
+    return "".join(seq)
+
+
+def getFragments(loci, rand, depth, read_length, somatic_shifts=None, tumor_fraction=0.4, stutter_rate=0.1, error_rate=0.001):
+    """
+    Return the simulated reads pairs on the loci in random order.
+
+    :param loci: The loci (see getLoci).
+    :type loci: list
+    :param rand: The random generator.
+    :type rand: random.Random
+    :param depth: The number of reads pairs by locus.
+    :type depth: int
+    :param read_length: The maximum length of the reads.
+    :type read_length: int
+    :param somatic_shifts: By locus name the shift of the somatic allele in repeat units (absent for a stable locus).
+    :type somatic_shifts: dict
+    :param tumor_fraction: The proportion of fragments coming from the somatic allele.
+    :type tumor_fraction: float
+    :param stutter_rate: The probability of a PCR slippage removing one unit.
+    :type stutter_rate: float
+    :param error_rate: The probability of substitution for each nucleotid in reads.
+    :type error_rate: float
+    :return: The fragments. Each fragment is a dict with id, locus, shift, R1 and R2 (the R2 is reverse complemented), R1_cigar, R2_cigar, R1_ref_start and R2_ref_start.
+    :rtype: list
+    """
+    somatic_shifts = {} if somatic_shifts is None else somatic_shifts
+    fragments = list()
+    frag_idx = 0
+    for locus in loci:
+        for pair_idx in range(depth):
+            frag_idx += 1
+            shift = getAlleleShift(somatic_shifts.get(locus["name"], 0), rand, tumor_fraction, stutter_rate)
+            amplicon = getAmplicon(locus, shift)
+            cigar = getAmpliconCigar(locus, shift)
+            curr_read_len = min(read_length, len(amplicon))
+            R1_offset, R1_cigar = sliceCigar(cigar, 0, curr_read_len)
+            R2_offset, R2_cigar = sliceCigar(cigar, len(amplicon) - curr_read_len, len(amplicon))
+            fragments.append({
+                "id": "frag_{}".format(frag_idx),
+                "locus": locus["name"],
+                "shift": shift,
+                "R1": addErrors(amplicon[:curr_read_len], rand, error_rate),
+                "R2": revCom(addErrors(amplicon[-curr_read_len:], rand, error_rate)),
+                "R1_cigar": R1_cigar,
+                "R2_cigar": R2_cigar,
+                "R1_ref_start": locus["start"] + R1_offset,
+                "R2_ref_start": locus["start"] + R2_offset
+            })
+    rand.shuffle(fragments)
+    return fragments
+
+
+def writeFastq(fragments, out_R1, out_R2, quality="I"):
+    """
+    Write the reads pairs in fastq files.
+
+    :param fragments: The fragments (see getFragments).
+    :type fragments: list
+    :param out_R1: Path to the R1 file (format: fastq).
+    :type out_R1: str
+    :param out_R2: Path to the R2 file (format: fastq).
+    :type out_R2: str
+    :param quality: The quality character used for all the nucleotids.
+    :type quality: str
+    """
+    with open(out_R1, "w") as FH_R1:
+        with open(out_R2, "w") as FH_R2:
+            for frag in fragments:
+                FH_R1.write("@{}\n{}\n+\n{}\n".format(frag["id"], frag["R1"], quality * len(frag["R1"])))
+                FH_R2.write("@{}\n{}\n+\n{}\n".format(frag["id"], frag["R2"], quality * len(frag["R2"])))
+
+
+def writeTargets(loci, out_path):
+    """
+    Write the amplicons with the repeat as thick part (format: BED).
+
+    :param loci: The loci (see getLoci).
+    :type loci: list
+    :param out_path: Path to the output file (format: BED).
+    :type out_path: str
+    """
+    with open(out_path, "w") as FH_out:
+        for locus in loci:
+            repeat_end = locus["repeat_start"] + len(locus["unit"]) * locus["nb_repeats"]
+            FH_out.write("\t".join(map(str, [
+                locus["chrom"], locus["start"], locus["start"] + getAmpliconLength(locus, 0), locus["name"],
+                0, "+", locus["repeat_start"], repeat_end
+            ])) + "\n")
+
+
+def writeReference(loci, out_path):
+    """
+    Write the synthetic chromosome (format: fasta).
+
+    :param loci: The loci (see getLoci).
+    :type loci: list
+    :param out_path: Path to the output file (format: fasta).
+    :type out_path: str
+    """
+    reference = getReference(loci)
+    with open(out_path, "w") as FH_out:
+        FH_out.write(">{}\n".format(loci[0]["chrom"]))
+        for start in range(0, len(reference), 60):
+            FH_out.write(reference[start:start + 60] + "\n")
+
+
+def writeBAM(loci, fragments, out_path, quality="I"):
+    """
+    Write the alignments of the reads pairs in a sorted and indexed BAM. This function requires pysam.
+
+    :param loci: The loci (see getLoci).
+    :type loci: list
+    :param fragments: The fragments (see getFragments).
+    :type fragments: list
+    :param out_path: Path to the output file (format: BAM).
+    :type out_path: str
+    :param quality: The quality character used for all the nucleotids.
+    :type quality: str
+    """
+    import pysam
+    cigar_code = {"M": 0, "I": 1, "D": 2}
+    header = {"HD": {"VN": "1.0"}, "SQ": [{"SN": loci[0]["chrom"], "LN": len(getReference(loci))}]}
+    unsorted_path = out_path + ".unsorted"
+    with pysam.AlignmentFile(unsorted_path, "wb", header=header) as FH_out:
+        for frag in fragments:
+            R1_end = frag["R1_ref_start"] + sum([length for operation, length in frag["R1_cigar"] if operation != "I"])
+            R2_end = frag["R2_ref_start"] + sum([length for operation, length in frag["R2_cigar"] if operation != "I"])
+            for phase in ["R1", "R2"]:
+                read = pysam.AlignedSegment()
+                read.query_name = frag["id"]
+                if phase == "R1":
+                    read.flag = 0x1 | 0x2 | 0x20 | 0x40
+                    read.query_sequence = frag["R1"]
+                    read.reference_start = frag["R1_ref_start"]
+                    read.next_reference_start = frag["R2_ref_start"]
+                    read.template_length = R2_end - frag["R1_ref_start"]
+                else:
+                    read.flag = 0x1 | 0x2 | 0x10 | 0x80
+                    read.query_sequence = frag["R2"]
+                    read.reference_start = frag["R2_ref_start"]
+                    read.next_reference_start = frag["R1_ref_start"]
+                    read.template_length = frag["R1_ref_start"] - R2_end
+                read.reference_id = 0
+                read.next_reference_id = 0
+                read.mapping_quality = 60
+                read.cigartuples = [(cigar_code[operation], length) for operation, length in frag[phase + "_cigar"]]
+                read.query_qualities = pysam.qualitystring_to_array(quality * len(read.query_sequence))
+                FH_out.write(read)
+    pysam.sort("-o", out_path, unsorted_path)
+    pysam.index(out_path)
+    os.remove(unsorted_path)
+
+
+def simulate(out_prefix, nb_loci=5, depth=1000, read_length=150, repeat_units=None, somatic_shifts_distrib=None, instable_ratio=0.5, tumor_fraction=0.4, stutter_rate=0.1, error_rate=0.001, random_seed=42, with_bam=True):
+    """
+    Write a simulated amplicon sequencing of microsatellites: R1 and R2 (<out_prefix>_R1.fastq, <out_prefix>_R2.fastq), the targets (<out_prefix>.bed), the reference (<out_prefix>.fasta) and, if pysam is available, the alignments (<out_prefix>.bam).
+
+    :param out_prefix: The prefix of the output files.
+    :type out_prefix: str
+    :param nb_loci: The number of loci.
+    :type nb_loci: int
+    :param depth: The number of reads pairs by locus.
+    :type depth: int
+    :param read_length: The maximum length of the reads.
+    :type read_length: int
+    :param repeat_units: The repeat units used in turn by the loci. [Default: ["A", "T", "CA"]]
+    :type repeat_units: list
+    :param somatic_shifts_distrib: The probability by shift in repeat units for the somatic alleles (see parseDistrib). [Default: deletions of 2 to 8 units]
+    :type somatic_shifts_distrib: dict
+    :param instable_ratio: The proportion of loci with a somatic allele.
+    :type instable_ratio: float
+    :param tumor_fraction: The proportion of fragments coming from the somatic allele.
+    :type tumor_fraction: float
+    :param stutter_rate: The probability of a PCR slippage removing one unit.
+    :type stutter_rate: float
+    :param error_rate: The probability of substitution for each nucleotid in reads.
+    :type error_rate: float
+    :param random_seed: The seed of the random generator.
+    :type random_seed: int
+    :param with_bam: Write the alignments file if pysam is available.
+    :type with_bam: bool
+    :return: The paths to the outputs by type (R1, R2, targets, reference and bam) and the loci with their somatic shift.
+    :rtype: (dict, list)
+    """
+    rand = random.Random(random_seed)
+    repeat_units = ["A", "T", "CA"] if repeat_units is None else repeat_units
+    somatic_shifts_distrib = parseDistrib("-2:0.1,-3:0.2,-4:0.3,-5:0.2,-6:0.1,-8:0.1") if somatic_shifts_distrib is None else somatic_shifts_distrib
+    loci = getLoci(nb_loci, repeat_units, rand)
+    shifts = sorted(somatic_shifts_distrib)
+    somatic_shifts = dict()
+    for locus in loci:
+        locus["somatic_shift"] = 0
+        if rand.random() < instable_ratio:
+            locus["somatic_shift"] = rand.choices(shifts, [somatic_shifts_distrib[elt] for elt in shifts])[0]
+            locus["somatic_shift"] = max(locus["somatic_shift"], 1 - locus["nb_repeats"])
+            somatic_shifts[locus["name"]] = locus["somatic_shift"]
+    fragments = getFragments(loci, rand, depth, read_length, somatic_shifts, tumor_fraction, stutter_rate, error_rate)
+    paths = {
+        "R1": out_prefix + "_R1.fastq",
+        "R2": out_prefix + "_R2.fastq",
+        "targets": out_prefix + ".bed",
+        "reference": out_prefix + ".fasta",
+        "bam": None
+    }
+    writeFastq(fragments, paths["R1"], paths["R2"])
+    writeTargets(loci, paths["targets"])
+    writeReference(loci, paths["reference"])
+    if with_bam:
+        try:
+            writeBAM(loci, fragments, out_prefix + ".bam")
+            paths["bam"] = out_prefix + ".bam"
+        except ImportError:
+            pass
+    return paths, loci
+
+
+########################################################################
+#
+# MAIN
+#
+########################################################################
+if __name__ == "__main__":
+    # Manage parameters
+    parser = argparse.ArgumentParser(description='Simulate amplicon sequencing of microsatellites with stutters and somatic indels.')
+    parser.add_argument('-l', '--nb-loci', default=5, type=int, help='The number of loci. [Default: %(default)s]')
+    parser.add_argument('-d', '--depth', default=1000, type=int, help='The number of reads pairs by locus. [Default: %(default)s]')
+    parser.add_argument('-r', '--read-length', default=150, type=int, help='The maximum length of the reads. [Default: %(default)s]')
+    parser.add_argument('-u', '--repeat-units', nargs='+', default=["A", "T", "CA"], help='The repeat units used in turn by the loci. [Default: %(default)s]')
+    parser.add_argument('-i', '--indels-distrib', default="-2:0.1,-3:0.2,-4:0.3,-5:0.2,-6:0.1,-8:0.1", help='The weight by shift in repeat units for the somatic alleles (format: shift:weight,shift:weight). [Default: %(default)s]')
+    parser.add_argument('-n', '--instable-ratio', default=0.5, type=float, help='The proportion of loci with a somatic allele. [Default: %(default)s]')
+    parser.add_argument('-t', '--tumor-fraction', default=0.4, type=float, help='The proportion of fragments coming from the somatic allele. [Default: %(default)s]')
+    parser.add_argument('-s', '--stutter-rate', default=0.1, type=float, help='The probability of a PCR slippage removing one unit. The addition of one unit has a probability five times lower. [Default: %(default)s]')
+    parser.add_argument('-e', '--error-rate', default=0.001, type=float, help='The probability of substitution for each nucleotid in reads. [Default: %(default)s]')
+    parser.add_argument('--random-seed', default=42, type=int, help='The seed of the random generator. [Default: %(default)s]')
+    parser.add_argument('-v', '--version', action='version', version=__version__)
+    group_output = parser.add_argument_group('Outputs')  # Outputs
+    group_output.add_argument('-o', '--output-prefix', required=True, help='The prefix of the outputs: <prefix>_R1.fastq, <prefix>_R2.fastq, <prefix>.bed, <prefix>.fasta and <prefix>.bam (only if pysam is installed).')
+    args = parser.parse_args()
+
+    # Process
+    logging.basicConfig(format='%(asctime)s -- [%(filename)s][pid:%(process)d][%(levelname)s] -- %(message)s')
+    log = logging.getLogger("simulateAmplicons")
+    log.setLevel(logging.INFO)
+    log.info("Start")
+    paths, loci = simulate(
+        args.output_prefix, args.nb_loci, args.depth, args.read_length, args.repeat_units,
+        parseDistrib(args.indels_distrib), args.instable_ratio, args.tumor_fraction,
+        args.stutter_rate, args.error_rate, args.random_seed
+    )
+    for locus in loci:
+        log.info("Locus {}: {} x {} with somatic shift {}.".format(locus["name"], locus["unit"], locus["nb_repeats"], locus["somatic_shift"]))
+    if paths["bam"] is None:
+        log.warning("The alignments file is not written: pysam is not installed.")
+    log.info("End of job")
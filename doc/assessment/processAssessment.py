@@ -19,7 +19,7 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.5.0'
+__version__ = '1.6.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -220,6 +220,8 @@ def train(libraries, annotations_file, design_folder, out_baseline, out_models,
             "--R1-end-adapter", os.path.join(design_folder, "trimmed_R1.fasta"),
             "--R2-end-adapter", os.path.join(design_folder, "trimmed_R2.fasta")
         ])
+    if args.profiles_store is not None:
+        train_cmd.extend(["--profiles-store", args.profiles_store])
     for lib in libraries:
         train_cmd.extend([
             "--R1", lib["R1"],
@@ -272,6 +274,8 @@ def predict(libraries, design_folder, in_baseline, in_models, out_folder, args):
             "--R1-end-adapter", os.path.join(design_folder, "trimmed_R1.fasta"),
             "--R2-end-adapter", os.path.join(design_folder, "trimmed_R2.fasta")
         ])
+    if args.profiles_store is not None:
+        predict_cmd.extend(["--profiles-store", args.profiles_store])
     for lib in libraries:
         predict_cmd.extend([
             "--R1", lib["R1"],
@@ -621,6 +625,7 @@ if __name__ == "__main__":
     group_input = parser.add_argument_group('Inputs')
     group_input.add_argument('-d', '--data-folder', required=True, help="The folder containing data to process. It must contain design/, raw_by_run/ and status_by_spl.tsv.")
     group_input.add_argument('-w', '--work-folder', default=os.getcwd(), help="The working directory. [Default: %(default)s]")
+    group_input.add_argument('-p', '--profiles-store', help="The folder storing the samples profiles in MIAmS_learn and MIAmS_tag. With this folder each sample is processed only once for all the datasets.")
     # Outputs
     group_output = parser.add_argument_group('Outputs')
     group_output.add_argument('-r', '--results-path', default="results.tsv", help='Path to the output file containing the description of the results and expected value for each samples in each datasets (format: TSV). [Default: %(default)s]')
@@ -19,9 +19,14 @@
 # uncomment and set if not in the PATH, should be version >= 4.4.3
 #makeflow = ###APP_FOLDER###/envs/miniconda3/envs/###APP_ENV_NAME###/bin/makeflow
 # batch system type: local, condor, sge, moab, cluster, wq, hadoop, mpi-queue
+# or inprocess (local execution without makeflow, for small runs: the tasks
+# are limited by limit_submission and by the local CPU, the components CPU
+# are declared with "cpu=N" in their batch_options)
 batch_system_type = local
 # add these options to all batch submit files
 batch_options =
+# SGE parallel environment used for the components declaring their CPU
+#sge_parallel_environment = smp
 # add these options to limit the number of jobs sumitted in parallel
 limit_submission = 100
 # on which socket host should run the web server
@@ -32,6 +37,19 @@ server_socket_port = 8080
 date_format = %d/%m/%Y
 # debug
 debug = False
+# record the wall time, CPU time, max RSS and I/O of each task in the
+# run_profile.json of the workflow (see jflow_admin.py profile). Each task is
+# then executed through an additional python process.
+task_profiling = False
+# with the batch systems local and inprocess, execute the short python scripts
+# of the components (see Component.get_warm_exec_path) in workers forked from
+# a server started once on the node with the modules below already imported
+# (comma separated). The server stops after task_server_idle_timeout seconds
+# without task. The resources measured by task_profiling do not include the
+# workers.
+task_server = False
+task_server_preload = anacore.bed, anacore.msi, anacore.sequenceIO, anacore.sv, numpy, pysam
+task_server_idle_timeout = 600
 
 [email]
 # if you want an email to be sent at the end of the workflow execution
@@ -60,6 +78,11 @@ work_directory = /tmp/MIAmS/work
 tmp_directory = /tmp/MIAmS/tmp
 # Folder root for server browse files
 browse_root_dir = /tmp/MIAmS
+# Shared directory where the outputs of the components tasks are cached:
+# a task with the same command, inputs, executables and component version
+# as a previous one restores its outputs instead of running. Leave empty to
+# disable the cache.
+cache_directory =
 
 [softwares]
 # uncomment and set if not in the PATH
@@ -83,6 +106,18 @@ msings_venv = ###APP_FOLDER###/envs/msings/msings-env/bin/python
 # MSINGS.batch_options = -V -l h_vmem=10G -l mem=10G -q normal
 # MSINGSBaseline.batch_options = -V -l h_vmem=10G -l mem=10G -q normal
 # MSIMergeReports.batch_options = -V -l h_vmem=3G -l mem=3G -q normal
+# Declare the CPU and the memory used by each task of the component: the
+# local and inprocess executors pack the tasks on the machine with these
+# values, makeflow forwards them to condor and wq, and the SGE flags (-pe and
+# -l mem) are added to the batch options if they are not already present
+# BWAmem.cpu = 4
+# BWAmem.memory = 15G
+# Pack N tasks of the component in one submitted job (each task stays visible in status)
+# GatherLocusRes.group_size = 20
+# MSIFilter.group_size = 20
+# MSIMergeReports.group_size = 20
+# Exclude the component from the tasks outputs cache (see cache_directory)
+# MSINGS.cache = False
 
 # Set workflows group
 [workflows]
@@ -28,6 +28,7 @@ except ImportError:
 from jflow.workflows_manager import WorkflowsManager
 from jflow.workflow import Workflow
 import jflow.utils as utils
+from cctools.util import time_format
 from jflow.exceptions import RuleException, RuleIgnore
 
 
@@ -80,6 +81,19 @@ if __name__ == '__main__':
                             default=False, dest="display_errors")
     sub_parser.set_defaults(cmd_object="status")
 
+    # Add profile workflow availability
+    sub_parser = subparsers.add_parser("profile", help="Show the top resources consumers of a workflow")
+    sub_parser.add_argument("--workflow-id", type=str, help="Which workflow profile should be displayed",
+                            required=True, dest="workflow_id")
+    sub_parser.add_argument("--by", type=str, help="Aggregate the tasks by component or by sample",
+                            choices=["component", "sample"], default="component", dest="by")
+    sub_parser.add_argument("--sort", type=str, help="Metric used to rank the consumers",
+                            choices=["wall_time", "cpu_time", "max_rss", "read_bytes", "written_bytes"],
+                            default="wall_time", dest="sort")
+    sub_parser.add_argument("--top", type=int, help="Number of consumers to display",
+                            default=10, dest="top")
+    sub_parser.set_defaults(cmd_object="profile")
+
     # Add tools workflow availability
     sub_parser = subparsers.add_parser("tools", help="Show tools used in a workflow")
     sub_parser.add_argument("workflow_name", help="Name of the workflow")
@@ -136,6 +150,27 @@ if __name__ == '__main__':
                     if i<len(workflows)-1: status += "\n"
             else: status = "no workflow available"
             print(status)
+    elif args["cmd_object"] == "profile":
+        try:
+            workflow = wfmanager.get_workflow(args["workflow_id"])
+        except Exception as e:
+            utils.display_error_message(str(e))
+        profile = workflow.get_run_profile()
+        consumers = profile["components" if args["by"] == "component" else "samples"]
+        if len(consumers) == 0:
+            print("no task profile available (set task_profiling = True in the [global] section of application.properties)")
+        else:
+            ranking = sorted(consumers, key=lambda name: consumers[name][args["sort"]], reverse=True)
+            status = args["by"].upper() + "\tTASKS\tWALL_TIME\tCPU_TIME\tMAX_RSS\tREAD\tWRITTEN\n"
+            for name in ranking[:args["top"]]:
+                metrics = consumers[name]
+                status += "\t".join([name, str(metrics["tasks"]), time_format(metrics["wall_time"]),
+                                     time_format(metrics["cpu_time"]), utils.get_octet_string_representation(metrics["max_rss"]),
+                                     utils.get_octet_string_representation(metrics["read_bytes"]),
+                                     utils.get_octet_string_representation(metrics["written_bytes"])]) + "\n"
+            status += "Total: " + str(profile["total"]["tasks"]) + " tasks, wall time " + time_format(profile["total"]["wall_time"]) + \
+                      ", CPU time " + time_format(profile["total"]["cpu_time"])
+            print(status)
     elif args["cmd_object"] == "tools":
         workflow = wfmanager.get_workflow_by_name(args["workflow_name"])
         if workflow is not None:
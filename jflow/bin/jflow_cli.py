@@ -44,13 +44,26 @@ if __name__ == '__main__':
 
 
 
-    # Add available pipelines
-    wf_instances, wf_methodes = wfmanager.get_available_workflows()
+    # Add available pipelines: only the selected workflow is imported and built
+    manifest = wfmanager.get_workflows_manifest()
+    selected_name = next((arg for arg in sys.argv[1:] if not arg.startswith("-")), None)
     wf_classes = []
-    for instance in wf_instances:
-        wf_classes.append(instance.__class__.__name__)
+    selected_parser = None
+    for wf_desc in manifest:
+        wf_classes.append(wf_desc["class"])
+        if wf_desc["name"] != selected_name:
+            sub_parser = subparsers.add_parser(wf_desc["name"], help=wf_desc["description"])
+            sub_parser.set_defaults(cmd_object=wf_desc["class"])
+            continue
+        try:
+            instance = wfmanager.get_workflow_by_class(wf_desc["class"])
+        except Exception as e:
+            instance = None
+        if instance is None:
+            utils.display_error_message("the workflow " + wf_desc["name"] + " cannot be loaded (class " + wf_desc["class"] + " in module " + wf_desc["module"] + ").")
         # create the subparser for each applications
         sub_parser = subparsers.add_parser(instance.name, help=instance.description, fromfile_prefix_chars='@')
+        selected_parser = sub_parser
         sub_parser.convert_arg_line_to_args = instance.__class__.config_parser
         [parameters_groups, parameters_order] = instance.get_parameters_per_groups()
         for group in parameters_order:
@@ -83,7 +96,7 @@ if __name__ == '__main__':
             workflow = wfmanager.get_workflow_by_class(args["cmd_object"])
             workflow.check_parameters_rules(args)
         except RuleException as e:
-            sub_parser.error(e)
+            selected_parser.error(e)
         except RuleIgnore:
             pass
         wf = wfmanager.run_workflow(args["cmd_object"], args, is_synchro=True)
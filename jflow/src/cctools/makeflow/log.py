@@ -14,6 +14,7 @@ import collections
 import csv
 import json
 import operator
+import os
 import sys
 import time
 
@@ -49,18 +50,33 @@ class LogParserMixin(object):
     def parse(self):
         """ Parse the log stream.
 
+        Only the lines appended since the previous call are parsed: the
+        position of the last complete line is kept in `offset`. If the file
+        has been truncated or replaced, the log is parsed from the start.
+
         If a parsing error occurs, a :class:`LogParserError` is thrown.
         """
-        stream = open(self.path, 'r')
-        for line in stream:
-            line = line.strip()
-            key = line.split('\t')[0]
-            try:
-                LogParserMixin._PARSERS[key](self, line)
-            except KeyError:
-                if not line.startswith('#'):
-                    self._parse_event(line)
-        stream.close()
+        stream = open(self.path, 'rb')
+        try:
+            file_stat = os.fstat(stream.fileno())
+            if file_stat.st_size < self.offset or file_stat.st_ino != getattr(self, 'inode', file_stat.st_ino):
+                LogDataMixin.__init__(self)
+                self.offset = 0
+            self.inode = file_stat.st_ino
+            stream.seek(self.offset)
+            for raw_line in stream:
+                if not raw_line.endswith(b'\n'):  # The line is being written
+                    break
+                self.offset += len(raw_line)
+                line = raw_line.decode().strip()
+                key = line.split('\t')[0]
+                try:
+                    LogParserMixin._PARSERS[key](self, line)
+                except KeyError:
+                    if not line.startswith('#'):
+                        self._parse_event(line)
+        finally:
+            stream.close()
 
     @raise_parser_error(ValueError, 'node', LogParserError)
     def _parse_node(self, line):
@@ -27,6 +27,8 @@ from operator import attrgetter
 
 from jflow.workflows_manager import WorkflowsManager
 from jflow.config_reader import JFlowConfigReader
+from jflow.task_server import get_client_command
+from jflow.task_profile import get_sample_name
 from jflow.dataset import ArrayList
 from jflow.utils import which, display_error_message
 from jflow.parameter import *
@@ -60,6 +62,8 @@ class Component(object):
             self.version = self.version.decode()
         self.batch_options = self.config_reader.get_component_batch_options(self.__class__.__name__)
         self.modules = self.config_reader.get_component_modules(self.__class__.__name__)
+        self.group_size = self.config_reader.get_component_group_size(self.__class__.__name__)
+        self.use_cache = self.config_reader.get_component_cache(self.__class__.__name__)
         # in case of SGE, parse the cpu and memory parameter
         self.__cpu=None
         self.__memory=None
@@ -71,13 +75,27 @@ class Component(object):
             try:
                 self.__memory = re.match( r'.*-l\s+mem=(\d+\S+)\s?.*', self.batch_options).group(1)
             except: pass
-        elif type.lower() == "local" :
+        elif type.lower() in ["local", "inprocess"] :
             try:
                 self.__cpu = int(re.match( r'.*cpu=(\d+)\s?.*', self.batch_options).group(1))
             except: pass
             try:
                 self.__memory = re.match( r'.*\s?mem=(\d+\w)\s?.*', self.batch_options).group(1)
             except: pass
+        # the resources declared for the component replace the ones parsed
+        # from its batch options and are added to the batch options if needed
+        declared_cpu = self.config_reader.get_component_cpu(self.__class__.__name__)
+        declared_memory = self.config_reader.get_component_memory(self.__class__.__name__)
+        if declared_cpu is not None:
+            self.__cpu = declared_cpu
+        if declared_memory is not None:
+            self.__memory = declared_memory
+        if type.lower() == "sge" :
+            if declared_cpu is not None and not re.search(r'-pe\s', self.batch_options):
+                self.batch_options += " -pe " + self.config_reader.get_sge_parallel_environment() + " " + str(declared_cpu)
+            if declared_memory is not None and not re.search(r'mem=', self.batch_options):
+                self.batch_options += " -l h_vmem=" + declared_memory + " -l mem=" + declared_memory
+            self.batch_options = self.batch_options.strip()
 
     def get_prefix(self):
         return self.__prefix
@@ -94,6 +112,18 @@ class Component(object):
     def get_memory(self):
         return self.__memory
 
+    def get_memory_mb(self):
+        """
+        Return the memory of the component in MB (the memory is expressed
+        like in batch options: 500M, 5G, ...) or None if it is unknown
+        """
+        try:
+            value, unit = re.match(r'^(\d+(?:\.\d+)?)\s*([kKmMgGtT]?)[bB]?$', self.__memory.strip()).groups()
+            factor = {"k": 1.0/1024, "": 1.0/(1024*1024), "m": 1, "g": 1024, "t": 1024*1024}[unit.lower()]
+            return max(1, int(float(value) * factor))
+        except:
+            return None
+
     def is_dynamic(self):
         return len(self.get_dynamic_outputs()) != 0
 
@@ -484,6 +514,28 @@ class Component(object):
         """
         return None
     
+    def get_cache_salt(self):
+        """
+        Return the identifier of the component and of its versions added in
+        the keys of the tasks outputs cache
+        """
+        module = sys.modules.get(self.__class__.__module__)
+        return self.__class__.__name__ + " " + str(getattr(module, "__version__", None)) + " " + str(self.version)
+
+    def get_task_sample(self, inputs, outputs):
+        """
+        @summary: Returns the sample processed by a task. It is used to group
+                  the resources of the tasks by sample in the run profile
+                  (see jflow.task_profile). By default it is the name of the
+                  first data input: the components where this file is not
+                  specific to the sample (example: a targets file by locus)
+                  override this method.
+        @param inputs: [list] the paths to the inputs of the task.
+        @param outputs: [list] the paths to the outputs of the task.
+        @return: [str] the sample name or None if it cannot be determined.
+        """
+        return get_sample_name(inputs)
+
     def get_temporary_file(self, suffix=".txt"):
         # first check if tmp directory exists
         if not os.path.isdir(self.config_reader.get_tmp_directory()):
@@ -517,6 +569,22 @@ class Component(object):
             logging.getLogger("jflow").exception("'" + exec_path + "' set for '" + software + "' does not exists, please provide a valid path!")
             raise Exception("'" + exec_path + "' set for '" + software + "' does not exists, please provide a valid path!")
         return exec_path
+
+    def get_warm_exec_path(self, software):
+        """
+        @summary: Returns the command executing the python script in a warm
+                  worker of the task server (see jflow.task_server) when the
+                  server is enabled, otherwise the path to the script. It is
+                  used for the short scripts where the start of python and
+                  the imports are a large part of the execution time.
+        @param software: [str] the script name (see get_exec_path).
+        @return: [str] the command or the path.
+        """
+        exec_path = self.get_exec_path(software)
+        task_server = self.config_reader.get_task_server()
+        if task_server is not None and exec_path.endswith(".py"):
+            return get_client_command(task_server["socket"], os.path.abspath(exec_path))
+        return exec_path
     
     def get_nameid(self):
         return self.__class__.__name__ + "." + self.__prefix
@@ -24,6 +24,7 @@ import logging
 from configparser import RawConfigParser, NoOptionError
 
 from jflow.utils import which, display_error_message
+from jflow.task_server import get_socket_path
 
 class JFlowConfigReader(object):
     """
@@ -130,6 +131,36 @@ class JFlowConfigReader(object):
         except:
             return ""
 
+    def get_component_group_size(self, component_class):
+        try:
+            return int(self.reader.get("components", component_class+".group_size"))
+        except:
+            return 0
+
+    def get_component_cpu(self, component_class):
+        try:
+            return int(self.reader.get("components", component_class+".cpu"))
+        except:
+            return None
+
+    def get_component_memory(self, component_class):
+        try:
+            return self.reader.get("components", component_class+".memory").strip() or None
+        except:
+            return None
+
+    def get_sge_parallel_environment(self):
+        try:
+            return self.reader.get("global", "sge_parallel_environment")
+        except:
+            return "smp"
+
+    def get_component_cache(self, component_class):
+        try:
+            return self.reader.get("components", component_class+".cache").lower() not in ["false", "0", "no"]
+        except:
+            return True
+
     def get_component_modules(self, component_class):
         try:
             return self.reader.get("components", component_class+".modules").split(",")
@@ -142,9 +173,60 @@ class JFlowConfigReader(object):
         except:
             return ""
 
+    def get_cache_directory(self):
+        """
+        return the directory of the tasks outputs cache
+          @return: the path to the cache directory or None if the cache is disabled
+        """
+        try:
+            cache_dir = self.reader.get("storage", "cache_directory").strip()
+        except:
+            return None
+        if cache_dir == "":
+            return None
+        if self.USER_PATTERN.search(cache_dir) is not None:
+            cache_dir = cache_dir.replace("###USER###", os.getenv("USER"))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o751)
+        return cache_dir
+
     def get_browse_root_dir(self):
         return self.reader.get("storage", "browse_root_dir")
 
+    def get_task_profiling(self):
+        try:
+            return self.reader.get("global", "task_profiling").lower() in ["true", "1", "yes"]
+        except:
+            return False
+
+    def get_task_server(self):
+        """
+        return the options of the server executing the python scripts of the components in warm workers
+          @return: [dict] the socket path, the preloaded modules and the idle timeout or None if the server is
+                   disabled or if the tasks are not executed on the local node
+        """
+        try:
+            if self.reader.get("global", "task_server").lower() in ["false", "0", "no"]:
+                return None
+        except:
+            return None
+        batch = self.get_batch()
+        if batch is None or batch[0].lower() not in ["local", "inprocess"]:
+            return None
+        try:
+            preload = [elt.strip() for elt in self.reader.get("global", "task_server_preload").split(",") if elt.strip() != ""]
+        except:
+            preload = ["anacore.bed", "anacore.msi", "anacore.sequenceIO", "anacore.sv", "numpy", "pysam"]
+        try:
+            idle_timeout = int(self.reader.get("global", "task_server_idle_timeout"))
+        except:
+            idle_timeout = 600
+        return {
+            "socket": get_socket_path(os.path.abspath(os.path.join(os.path.dirname(inspect.getfile(self.__class__)), self.CONFIG_FILE_PATH))),
+            "preload": preload,
+            "idle_timeout": idle_timeout
+        }
+
     def get_debug(self):
         try:
             return self.reader.get("global", "debug") == "True"
@@ -0,0 +1,291 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import re
+import time
+import sys
+import shlex
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cctools.makeflow import MakeflowLog
+from cctools.makeflow.log import Node
+
+
+class DAGTask(object):
+    """
+    @summary: Rule of a makeflow DAG.
+    """
+
+    CPU_REGEXP = re.compile(r'.*cpu=(\d+)\s?.*')
+
+    def __init__(self, id, outputs, inputs):
+        """
+        @param id: [int] the position of the rule in the DAG.
+        @param outputs: [list] the paths to the files produced by the rule.
+        @param inputs: [list] the paths to the files used by the rule.
+        """
+        self.id = id
+        self.outputs = outputs
+        self.inputs = inputs
+        self.command = None
+        self.symbol = None
+        self.batch_options = ""
+        self.environment = dict()
+        self.cpu = None
+        self.memory = None
+        self.parents = set()
+        self.state = Node.WAITING
+        self.job_id = 0
+
+    def get_cpu(self):
+        """
+        @return: [int] the number of CPU declared for the task (CORES) or in
+                 its batch options (same syntax as the local batch system:
+                 "cpu=N").
+        """
+        try:
+            return max(1, int(self.cpu or self.CPU_REGEXP.match(self.batch_options).group(1)))
+        except:
+            return 1
+
+    def get_memory(self):
+        """
+        @return: [int] the memory in MB declared for the task (MEMORY) or 0.
+        """
+        try:
+            return int(self.memory)
+        except:
+            return 0
+
+
+class InProcessExecutor(object):
+    """
+    @summary: Runs a makeflow DAG on the local machine without makeflow. The
+              tasks are started as soon as their inputs are produced, within
+              the limit of jobs, of CPU and of memory. The execution is
+              written in a makeflow-compatible log next to the DAG.
+    """
+
+    LOG_EXTENSION = ".makeflowlog"
+    RESERVED_VARIABLES = ["SYMBOL", "BATCH_LOCAL", "BATCH_OPTIONS", "CORES", "MEMORY"]
+
+    def __init__(self, dag_path, work_dir=None, max_jobs=None, max_cpu=None, max_memory=None):
+        """
+        @param dag_path: [str] path to the DAG.
+        @param work_dir: [str] the directory where the commands are executed.
+        @param max_jobs: [int] the maximum number of tasks running in parallel.
+        @param max_cpu: [int] the number of CPU available for the tasks.
+        @param max_memory: [int] the memory in MB available for the tasks.
+        """
+        self.dag_path = os.path.abspath(dag_path)
+        self.work_dir = work_dir or os.path.dirname(self.dag_path)
+        self.log_path = self.dag_path + self.LOG_EXTENSION
+        self.max_cpu = int(max_cpu) if max_cpu else (os.cpu_count() or 1)
+        self.max_memory = int(max_memory) if max_memory else self.get_physical_memory()
+        self.max_jobs = int(max_jobs) if max_jobs else self.max_cpu
+        self.tasks, self.variables = self.parse_dag(self.dag_path)
+        self._job_id = 0
+
+    @staticmethod
+    def get_physical_memory():
+        """
+        @return: [int] the memory of the machine in MB.
+        """
+        try:
+            return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 * 1024))
+        except (ValueError, OSError, AttributeError):
+            return sys.maxsize
+
+    @staticmethod
+    def parse_dag(dag_path):
+        """
+        @summary: Returns the rules and the variables of a DAG written by weaver.
+        @param dag_path: [str] path to the DAG.
+        @return: [list] the DAGTask in file order and the dict of variables.
+        """
+        tasks, variables, exports = list(), dict(), set()
+        current_task = None
+        with open(dag_path) as FH_dag:
+            for line in FH_dag:
+                line = line.rstrip("\n")
+                if line.startswith("\t"):
+                    if current_task is not None and not line.startswith("\t# SYMBOL"):
+                        current_task.command = line[1:]
+                        tasks.append(current_task)
+                        current_task = None
+                elif line.strip() == "" or line.startswith("#"):
+                    continue
+                elif line.startswith("@"):
+                    key, value = line[1:].split("=", 1)
+                    key = key.rstrip("+")
+                    value = value[1:-1] if len(value) > 1 and value[0] == value[-1] == '"' else value
+                    if key == "SYMBOL":
+                        current_task.symbol = value
+                    elif key == "BATCH_OPTIONS":
+                        current_task.batch_options = value
+                    elif key == "CORES":
+                        current_task.cpu = value
+                    elif key == "MEMORY":
+                        current_task.memory = value
+                    elif key not in InProcessExecutor.RESERVED_VARIABLES and not key.startswith("_MAKEFLOW"):
+                        current_task.environment[key] = value
+                elif line.startswith("export "):
+                    exports.update(line.split()[1:])
+                elif re.match(r"^\w+=", line):
+                    key, value = line.split("=", 1)
+                    variables[key] = value
+                else:
+                    outputs, inputs = line.split(":", 1)
+                    current_task = DAGTask(len(tasks), outputs.split(), inputs.split())
+        # Link each task to the tasks producing its inputs
+        producers = dict()
+        for task in tasks:
+            for path in task.outputs:
+                producers[path] = task.id
+        for task in tasks:
+            task.parents = set(producers[path] for path in task.inputs if path in producers and producers[path] != task.id)
+        return tasks, {key: value for key, value in variables.items() if key in exports}
+
+    def _get_timestamp(self):
+        return str(int(time.time() * 1000000))
+
+    def _log_event(self, FH_log, task, state):
+        task.state = state
+        counts = {Node.WAITING: 0, Node.RUNNING: 0, Node.COMPLETED: 0, Node.FAILED: 0, Node.ABORTED: 0}
+        for current_task in self.tasks:
+            counts[current_task.state] += 1
+        FH_log.write(" ".join(map(str, [
+            self._get_timestamp(), task.id, state, task.job_id, counts[Node.WAITING], counts[Node.RUNNING],
+            counts[Node.COMPLETED], counts[Node.FAILED], counts[Node.ABORTED], len(self.tasks)
+        ])) + "\n")
+        FH_log.flush()
+
+    def _write_header(self, FH_log):
+        for task in self.tasks:
+            FH_log.write("# NODE\t{0}\t{1}\n".format(task.id, task.command))
+            if task.symbol:
+                FH_log.write("# SYMBOL\t{0}\t\"{1}\"\n".format(task.id, task.symbol))
+            FH_log.write("# PARENTS\t{0}\t{1}\n".format(task.id, "\t".join(map(str, sorted(task.parents)))))
+            FH_log.write("# SOURCES\t{0}\t{1}\n".format(task.id, "\t".join(task.inputs)))
+            FH_log.write("# TARGETS\t{0}\t{1}\n".format(task.id, "\t".join(task.outputs)))
+            FH_log.write("# COMMAND\t{0}\t{1}\n".format(task.id, task.command))
+
+    def _recover(self):
+        """
+        @summary: Marks as completed the tasks completed in a previous
+                  execution of the DAG whose outputs still exist.
+        """
+        log = MakeflowLog(self.log_path)
+        log.parse()
+        for node in log.nodes:
+            if node is not None and node.id < len(self.tasks) and node.state == Node.COMPLETED:
+                task = self.tasks[node.id]
+                if all(os.path.exists(os.path.join(self.work_dir, path)) for path in task.outputs):
+                    task.state = Node.COMPLETED
+
+    def _run_task(self, task):
+        """
+        @summary: Runs the command of the task. A task grouping several tasks
+                  (command "MAKEFLOW dag workdir wrapper") runs its sub-DAG
+                  sequentially.
+        @return: [bool] True if the task succeeds.
+        """
+        if task.command.startswith("MAKEFLOW "):
+            sub_dag_path, sub_work_dir = shlex.split(task.command)[1:3]
+            try:
+                InProcessExecutor(sub_dag_path, sub_work_dir, max_jobs=1, max_cpu=self.max_cpu, max_memory=self.max_memory).execute()
+                return True
+            except RuntimeError:
+                return False
+        environment = dict(os.environ)
+        environment.update(self.variables)
+        environment.update(task.environment)
+        return subprocess.call(task.command, shell=True, cwd=self.work_dir, env=environment) == 0
+
+    def _get_ready_tasks(self):
+        """
+        @summary: Returns the tasks whose parents are completed in the DAG
+                  order: the tasks are written by priority in the DAG. A task
+                  which does not fit in the free CPU and memory leaves them
+                  to the next ones.
+        """
+        return [task for task in self.tasks if task.state == Node.WAITING and
+                all(self.tasks[parent].state == Node.COMPLETED for parent in task.parents)]
+
+    def execute(self):
+        """
+        @summary: Runs the DAG. On the failure of one task no new task is
+                  started and the running ones are waited.
+        @raise RuntimeError: if a task fails.
+        """
+        new_log = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
+        if not new_log:
+            self._recover()
+        failed = False
+        with open(self.log_path, "a") as FH_log:
+            if new_log:
+                self._write_header(FH_log)
+            FH_log.write("# STARTED\t{0}\n".format(self._get_timestamp()))
+            for task in self.tasks:
+                if task.state == Node.WAITING:
+                    self._log_event(FH_log, task, Node.WAITING)
+            running, used_cpu, used_memory = dict(), 0, 0
+            with ThreadPoolExecutor(max_workers=self.max_jobs) as pool:
+                while True:
+                    if not failed:
+                        for task in self._get_ready_tasks():
+                            if len(running) >= self.max_jobs:
+                                break
+                            # a task larger than the machine runs alone
+                            task_cpu = min(task.get_cpu(), self.max_cpu)
+                            task_memory = min(task.get_memory(), self.max_memory)
+                            if used_cpu + task_cpu > self.max_cpu or used_memory + task_memory > self.max_memory:
+                                continue
+                            self._job_id += 1
+                            task.job_id = self._job_id
+                            self._log_event(FH_log, task, Node.RUNNING)
+                            running[pool.submit(self._run_task, task)] = (task, task_cpu, task_memory)
+                            used_cpu += task_cpu
+                            used_memory += task_memory
+                    if len(running) == 0:
+                        break
+                    done, not_done = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task, task_cpu, task_memory = running.pop(future)
+                        used_cpu -= task_cpu
+                        used_memory -= task_memory
+                        try:
+                            is_success = future.result()
+                        except Exception:
+                            is_success = False
+                        if is_success:
+                            self._log_event(FH_log, task, Node.COMPLETED)
+                        else:
+                            self._log_event(FH_log, task, Node.FAILED)
+                            failed = True
+            if failed:
+                FH_log.write("# FAILED\t{0}\n".format(self._get_timestamp()))
+            elif any(task.state != Node.COMPLETED for task in self.tasks):
+                FH_log.write("# ABORTED\t{0}\n".format(self._get_timestamp()))
+                failed = True
+            else:
+                FH_log.write("# COMPLETED\t{0}\n".format(self._get_timestamp()))
+        if failed:
+            raise RuntimeError('Failed to execute DAG {0} in process'.format(self.dag_path))
@@ -0,0 +1,70 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import json
+import time
+
+
+class WorkflowJournal(object):
+    """
+    @summary: Append-only journal of the workflow state (step, status,
+              timestamps, components). Each state is one JSON line: the
+              listing and the status of the workflow only need the last one
+              and do not have to load the workflow dump.
+    """
+
+    def __init__(self, path):
+        """
+        @param path: [str] path to the journal file.
+        """
+        self.path = path
+
+    def append(self, state):
+        """
+        @summary: Adds a state at the end of the journal.
+        @param state: [dict] the state of the workflow. It must be serializable
+                      in JSON.
+        """
+        record = dict(state)
+        record["journal_time"] = time.time()
+        line = json.dumps(record) + "\n"
+        # One write in append mode: concurrent readers see the whole line or nothing
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def get_last_state(self):
+        """
+        @summary: Returns the last complete state stored in the journal.
+        @return: [dict] the state or None if the journal does not exist or is
+                 empty.
+        """
+        last_state = None
+        try:
+            with open(self.path) as FH_journal:
+                for line in FH_journal:
+                    if line.endswith("\n"): # Skip line being written
+                        try:
+                            last_state = json.loads(line)
+                        except ValueError:
+                            pass
+        except IOError:
+            pass
+        return last_state
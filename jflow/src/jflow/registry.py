@@ -0,0 +1,163 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import pickle
+import sqlite3
+import logging
+
+from contextlib import contextmanager
+
+
+class WorkflowsRegistry(object):
+    """
+    @summary: Registry of the workflows shared by all the jflow processes
+              (CLI, server, workflows threads). The registry is stored in
+              SQLite in WAL mode: the readers never wait and the writers are
+              serialized by "BEGIN IMMEDIATE" transactions.
+    """
+
+    TIMEOUT = 600
+
+    def __init__(self, path, legacy_dump=None, legacy_ids=None):
+        """
+        @param path: [str] path to the registry database.
+        @param legacy_dump: [str] path to the pickled workflows dump used by
+                            previous versions. Its content is imported at the
+                            first opening of the registry.
+        @param legacy_ids: [str] path to the IDs file used by previous
+                           versions. The last ID is imported at the first
+                           opening of the registry.
+        """
+        self.path = path
+        with self.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS workflows (id TEXT PRIMARY KEY, dump_path TEXT, object BLOB)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS properties (name TEXT PRIMARY KEY, value TEXT)")
+            cursor.execute("SELECT value FROM properties WHERE name = 'migrated'")
+            if cursor.fetchone() is None:
+                self._migrate(cursor, legacy_dump, legacy_ids)
+                cursor.execute("INSERT INTO properties (name, value) VALUES ('migrated', '1')")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.TIMEOUT, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        @summary: Returns a cursor in a write transaction. The transaction is
+                  committed at the end of the block and rolled back on error.
+        """
+        connection = self._connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    def _migrate(self, cursor, legacy_dump, legacy_ids):
+        """
+        @summary: Imports the workflows and the last ID from the files used by
+                  previous versions.
+        """
+        if legacy_dump is not None and os.path.isfile(legacy_dump):
+            try:
+                with open(legacy_dump, "rb") as FH_dump:
+                    workflows_dump = pickle.load(FH_dump)
+                for workflow_id, workflow_dump in workflows_dump.items():
+                    cursor.execute("INSERT OR REPLACE INTO workflows (id, dump_path, object) VALUES (?, ?, ?)",
+                                   (workflow_id, workflow_dump["dump_path"], pickle.dumps(workflow_dump["object"])))
+            except Exception as e:
+                logging.getLogger("jflow").warning("The workflows dump '" + legacy_dump + "' cannot be imported: " + str(e))
+        if legacy_ids is not None and os.path.isfile(legacy_ids):
+            with open(legacy_ids) as FH_ids:
+                last_id = int(FH_ids.readline().strip())
+            cursor.execute("INSERT OR REPLACE INTO properties (name, value) VALUES ('last_id', ?)", (str(last_id),))
+
+    def _load_row(self, row):
+        return {"dump_path": row[1], "object": pickle.loads(row[2])}
+
+    def get_all(self):
+        """
+        @summary: Returns all the registered workflows.
+        @return: [dict] by workflow ID the path to the workflow dump
+                 ("dump_path") and the minimized workflow ("object").
+        """
+        workflows_dump = dict()
+        connection = self._connect()
+        try:
+            for row in connection.execute("SELECT id, dump_path, object FROM workflows"):
+                try:
+                    workflows_dump[row[0]] = self._load_row(row)
+                except:
+                    logging.getLogger("jflow").debug("Workflow #" + row[0] + " cannot be loaded from the registry!")
+        finally:
+            connection.close()
+        return workflows_dump
+
+    def get(self, workflow_id):
+        """
+        @summary: Returns one registered workflow.
+        @param workflow_id: [str] the workflow ID.
+        @return: [dict] the path to the workflow dump ("dump_path") and the
+                 minimized workflow ("object") or None if the workflow is not
+                 registered.
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT id, dump_path, object FROM workflows WHERE id = ?", (workflow_id,)).fetchone()
+        finally:
+            connection.close()
+        return None if row is None else self._load_row(row)
+
+    def set(self, cursor, workflow_id, dump_path, mini_workflow):
+        """
+        @summary: Adds or updates a workflow in the registry.
+        @param cursor: [sqlite3.Cursor] the cursor of the current transaction.
+        @param workflow_id: [str] the workflow ID.
+        @param dump_path: [str] the path to the workflow dump.
+        @param mini_workflow: [MINIWorkflow] the minimized workflow.
+        """
+        cursor.execute("INSERT OR REPLACE INTO workflows (id, dump_path, object) VALUES (?, ?, ?)",
+                       (workflow_id, dump_path, pickle.dumps(mini_workflow)))
+
+    def remove(self, cursor, workflow_id):
+        """
+        @summary: Removes a workflow from the registry.
+        @param cursor: [sqlite3.Cursor] the cursor of the current transaction.
+        @param workflow_id: [str] the workflow ID.
+        """
+        cursor.execute("DELETE FROM workflows WHERE id = ?", (workflow_id,))
+
+    def get_next_id(self):
+        """
+        @summary: Reserves and returns the next workflow ID.
+        @return: [int] the new ID.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT value FROM properties WHERE name = 'last_id'")
+            row = cursor.fetchone()
+            next_id = 1 if row is None else int(row[0]) + 1
+            cursor.execute("INSERT OR REPLACE INTO properties (name, value) VALUES ('last_id', ?)", (str(next_id),))
+        return next_id
@@ -0,0 +1,123 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import shlex
+import logging
+
+from pygraph.classes.digraph import digraph
+from pygraph.algorithms.critical import critical_path
+from pygraph.algorithms.sorting import topological_sorting
+
+from cctools.makeflow import MakeflowLog
+
+
+DEFAULT_RUNTIME = 1.0
+
+
+def get_components_runtimes(makeflow_logs):
+    """
+    @summary: Returns the mean runtime of the completed tasks by component
+              from makeflow logs. The tasks grouped in a sub DAG are read in
+              the log of this DAG.
+    @param makeflow_logs: [list] the paths to the makeflow logs.
+    @return: [dict] by component name id and by component class the mean
+             runtime in seconds.
+    """
+    runtimes = dict()
+    def add_runtime(symbol, runtime):
+        symbol = symbol.replace('"', '')
+        for key in (symbol, symbol.split(".")[0]):
+            if key not in runtimes:
+                runtimes[key] = [0.0, 0]
+            runtimes[key][0] += runtime
+            runtimes[key][1] += 1
+    def parse_log(log_path, symbol=None):
+        log = MakeflowLog(log_path)
+        log.parse()
+        for node in log.nodes:
+            if node is None or node.state != node.COMPLETED:
+                continue
+            node_symbol = node.symbol or symbol
+            if node.command.startswith("MAKEFLOW "):
+                sub_log_path = shlex.split(node.command)[1] + ".makeflowlog"
+                if os.path.exists(sub_log_path):
+                    parse_log(sub_log_path, node_symbol)
+            elif node_symbol:
+                add_runtime(node_symbol, node.goodput if node.goodput > 0 else node.elapsed_time)
+    for log_path in makeflow_logs:
+        try:
+            parse_log(log_path)
+        except:
+            logging.getLogger("jflow").debug("The makeflow log '" + log_path + "' cannot be used for the tasks runtimes!")
+    return {key: total / count for key, (total, count) in runtimes.items()}
+
+
+def get_task_runtime(task, runtimes):
+    """
+    @summary: Returns the expected runtime of a weaver task.
+    @param task: [tuple] the weaver task (abstraction, function, command,
+                 inputs, outputs, options, symbol).
+    @param runtimes: [dict] the mean runtime by component name id or class.
+    @return: [float] the runtime in seconds.
+    """
+    symbol = task[6]
+    if symbol is None:
+        return DEFAULT_RUNTIME
+    return runtimes.get(symbol, runtimes.get(symbol.split(".")[0], DEFAULT_RUNTIME))
+
+
+def get_tasks_sorter(runtimes):
+    """
+    @summary: Returns the function ordering the weaver tasks by priority: the
+              tasks with the longest remaining path to the end of the DAG
+              (weighted by the runtimes of the tasks) come first and, at equal
+              remaining time, the tasks of the critical path.
+    @param runtimes: [dict] the mean runtime by component name id or class.
+    @return: [function] the function taking and returning a list of tasks.
+    """
+    def sort_tasks(tasks):
+        if len(tasks) < 2:
+            return tasks
+        # Graph of the tasks: an edge from the producer of each input to its
+        # consumers, weighted by the runtime of the consumer. The virtual
+        # node "start" leads to all the tasks.
+        producers = dict()
+        for idx, task in enumerate(tasks):
+            for path in task[4]:
+                producers[str(path)] = idx
+        task_runtimes = [get_task_runtime(task, runtimes) for task in tasks]
+        graph = digraph()
+        graph.add_node("start")
+        graph.add_nodes(range(len(tasks)))
+        for idx, task in enumerate(tasks):
+            graph.add_edge(("start", idx), wt=task_runtimes[idx])
+            for path in task[3]:
+                parent_idx = producers.get(str(path))
+                if parent_idx is not None and parent_idx != idx and not graph.has_edge((parent_idx, idx)):
+                    graph.add_edge((parent_idx, idx), wt=task_runtimes[idx])
+        critical_tasks = set(critical_path(graph))
+        if len(critical_tasks) == 0: # the graph contains a cycle
+            return tasks
+        # Remaining time from the start of the task to the end of the DAG
+        remaining_times = dict()
+        for idx in reversed(topological_sorting(graph)):
+            if idx != "start":
+                remaining_times[idx] = task_runtimes[idx] + max([remaining_times[child] for child in graph.neighbors(idx)] + [0])
+        order = sorted(range(len(tasks)), key=lambda idx: (-remaining_times[idx], idx not in critical_tasks, idx))
+        return [tasks[idx] for idx in order]
+    return sort_tasks
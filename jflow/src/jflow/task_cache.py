@@ -0,0 +1,314 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Content-addressed cache of the components tasks outputs.
+
+The module is executed on the computing nodes as the wrapper of each cached
+task: it only depends on the standard library.
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+
+TASK_CACHE_LOG_FILE_NAME = "task_cache.log"
+
+
+class TaskCache(object):
+    """
+    @summary: Cache of the tasks outputs shared by the workflows. The key of a
+              task is the hash of its command, of the fingerprints of its
+              inputs and executables and of the version of its component.
+              The paths of the workflow directory, of the inputs and of the
+              outputs are replaced by placeholders in the command so that the
+              same task of two runs has the same key.
+    """
+
+    BUFFER_SIZE = 1024 * 1024
+    ENTRIES_DIRECTORY = "entries"
+    FINGERPRINTS_DIRECTORY = "fingerprints"
+    COMPLETE_FILE_NAME = "complete"
+
+    def __init__(self, directory, workflow_directory):
+        """
+        @param directory: [str] path to the cache directory.
+        @param workflow_directory: [str] path to the directory of the workflow
+                                   running the task.
+        """
+        self.directory = directory
+        self.workflow_directory = os.path.abspath(workflow_directory)
+        self.working_directory = os.path.join(self.workflow_directory, ".working")
+
+    def _normalize(self, text):
+        return text.replace(self.workflow_directory, "$WORKFLOW_DIR")
+
+    def _get_memo_path(self, path):
+        path_hash = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()
+        return os.path.join(self.directory, self.FINGERPRINTS_DIRECTORY, path_hash[:2], path_hash)
+
+    def _write_memo(self, path, digest):
+        """
+        @summary: Stores the fingerprint of a file. It is reused while the size
+                  and the modification time of the file are unchanged.
+        """
+        memo_path = self._get_memo_path(path)
+        stat = os.stat(path)
+        if not os.path.isdir(os.path.dirname(memo_path)):
+            os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+        tmp_memo_path = memo_path + "." + str(os.getpid())
+        with open(tmp_memo_path, "w") as FH_memo:
+            json.dump({"path": os.path.realpath(path), "size": stat.st_size, "mtime": stat.st_mtime, "digest": digest}, FH_memo)
+        os.rename(tmp_memo_path, memo_path)
+
+    def get_fingerprint(self, path):
+        """
+        @summary: Returns the fingerprint of a file. The scripts generated by
+                  the workflow are hashed with the workflow directory replaced.
+                  The other files use their memorized fingerprint (the cache
+                  key of the task producing them or a previous hash of their
+                  content) when they have not changed since.
+        @param path: [str] path to the file.
+        @return: [str] the fingerprint.
+        """
+        if not os.path.exists(path):
+            return "missing"
+        if os.path.isdir(path):
+            return "directory"
+        if os.path.abspath(path).startswith(self.working_directory + os.sep):
+            with open(path, "rb") as FH_in:
+                content = FH_in.read()
+            return hashlib.sha256(self._normalize(content.decode("utf-8", "replace")).encode()).hexdigest()
+        stat = os.stat(path)
+        try:
+            with open(self._get_memo_path(path)) as FH_memo:
+                memo = json.load(FH_memo)
+            if memo["path"] == os.path.realpath(path) and memo["size"] == stat.st_size and memo["mtime"] == stat.st_mtime:
+                return memo["digest"]
+        except (IOError, ValueError, KeyError):
+            pass
+        content_hash = hashlib.sha256()
+        with open(path, "rb") as FH_in:
+            chunk = FH_in.read(self.BUFFER_SIZE)
+            while chunk:
+                content_hash.update(chunk)
+                chunk = FH_in.read(self.BUFFER_SIZE)
+        digest = content_hash.hexdigest()
+        try:
+            self._write_memo(path, digest)
+        except OSError:
+            pass
+        return digest
+
+    def get_executables(self, texts):
+        """
+        @summary: Returns the executables called in the commands: the absolute
+                  paths to executable files and the programs found in PATH
+                  for the first word of each line.
+        @param texts: [list] the commands and the scripts contents.
+        @return: [list] the sorted paths to the executables.
+        """
+        executables = set()
+        for text in texts:
+            for line in text.split("\n"):
+                try:
+                    tokens = shlex.split(line, comments=True)
+                except ValueError:
+                    tokens = line.split()
+                for idx, token in enumerate(tokens):
+                    if os.path.isabs(token):
+                        if os.path.isfile(token) and os.access(token, os.X_OK):
+                            executables.add(token)
+                    elif idx == 0:
+                        path = shutil.which(token)
+                        if path is not None:
+                            executables.add(path)
+        return sorted(executables)
+
+    def get_key(self, command, inputs, outputs, salt=""):
+        """
+        @summary: Returns the cache key of a task.
+        @param command: [str] the command of the task.
+        @param inputs: [list] the paths to the inputs files.
+        @param outputs: [list] the paths to the outputs files.
+        @param salt: [str] the identifier of the component and its version.
+        @return: [str] the key.
+        """
+        normalized_command = command
+        paths = [(path, "$IN" + str(idx)) for idx, path in enumerate(inputs)]
+        paths += [(path, "$OUT" + str(idx)) for idx, path in enumerate(outputs)]
+        for path, placeholder in sorted(paths, key=lambda elt: len(elt[0]), reverse=True):
+            normalized_command = normalized_command.replace(path, placeholder)
+        normalized_command = self._normalize(normalized_command)
+        scripts = list()
+        for path in inputs:
+            if os.path.abspath(path).startswith(self.working_directory + os.sep) and os.path.isfile(path):
+                with open(path, errors="replace") as FH_script:
+                    scripts.append(FH_script.read())
+        key_data = {
+            "salt": salt,
+            "command": normalized_command,
+            "inputs": [self.get_fingerprint(path) for path in inputs],
+            "nb_outputs": len(outputs),
+            "executables": [self.get_fingerprint(path) for path in self.get_executables([command] + scripts)]
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.directory, self.ENTRIES_DIRECTORY, key[:2], key)
+
+    def restore(self, key, outputs):
+        """
+        @summary: Copies the outputs of the task from the cache.
+        @param key: [str] the task key.
+        @param outputs: [list] the paths to the outputs files.
+        @return: [bool] True if the outputs are in the cache.
+        """
+        entry_path = self._get_entry_path(key)
+        if not os.path.exists(os.path.join(entry_path, self.COMPLETE_FILE_NAME)):
+            return False
+        for idx, path in enumerate(outputs):
+            if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            shutil.copyfile(os.path.join(entry_path, str(idx)), path)
+            self._write_memo(path, key + ":" + str(idx))
+        return True
+
+    def store(self, key, outputs):
+        """
+        @summary: Adds the outputs of the task in the cache. The entry is
+                  written in a temporary directory and then renamed: a
+                  concurrent task never restores an incomplete entry.
+        @param key: [str] the task key.
+        @param outputs: [list] the paths to the outputs files.
+        """
+        entry_path = self._get_entry_path(key)
+        if os.path.exists(entry_path):
+            return
+        tmp_entry_path = entry_path + ".tmp." + str(os.getpid())
+        os.makedirs(tmp_entry_path)
+        try:
+            for idx, path in enumerate(outputs):
+                shutil.copyfile(path, os.path.join(tmp_entry_path, str(idx)))
+            open(os.path.join(tmp_entry_path, self.COMPLETE_FILE_NAME), "w").close()
+            os.rename(tmp_entry_path, entry_path)
+        except OSError:
+            shutil.rmtree(tmp_entry_path, ignore_errors=True)
+            if not os.path.exists(entry_path):
+                raise
+        for idx, path in enumerate(outputs):
+            self._write_memo(path, key + ":" + str(idx))
+
+
+def get_command_wrapper(cache_directory, workflow_directory, log_path, component_nameid, salt):
+    """
+    @summary: Returns the function used by the weaver engine to wrap the
+              commands of a component with the task cache.
+    @param cache_directory: [str] path to the cache directory.
+    @param workflow_directory: [str] path to the workflow directory.
+    @param log_path: [str] path to the log of the cache hits and misses.
+    @param component_nameid: [str] the component name id.
+    @param salt: [str] the identifier of the component and its version.
+    @return: [function] the wrapper taking the command, the inputs and the
+             outputs of the task and returning the new command.
+    """
+    def wrap_command(command, inputs, outputs):
+        wrapper = [sys.executable, os.path.abspath(__file__),
+                   "--cache-directory", cache_directory,
+                   "--workflow-directory", workflow_directory,
+                   "--log", log_path,
+                   "--component", component_nameid,
+                   "--salt", salt,
+                   "--inputs"] + [str(path) for path in inputs] + \
+                  ["--outputs"] + [str(path) for path in outputs] + \
+                  ["--command", command]
+        return " ".join(shlex.quote(elt) for elt in wrapper)
+    return wrap_command
+
+
+def get_cache_stats(log_path):
+    """
+    @summary: Returns the number of cache hits and misses by component from
+              the log written by the cached tasks.
+    @param log_path: [str] path to the task cache log.
+    @return: [dict] by component name id the number of "hits" and "misses".
+    """
+    stats = dict()
+    try:
+        with open(log_path) as FH_log:
+            for line in FH_log:
+                if line.endswith("\n"): # Skip line being written
+                    record = json.loads(line)
+                    if record["component"] not in stats:
+                        stats[record["component"]] = {"hits": 0, "misses": 0}
+                    stats[record["component"]]["hits" if record["hit"] else "misses"] += 1
+    except (IOError, ValueError):
+        pass
+    return stats
+
+
+def _log_task(log_path, component_nameid, key, is_hit):
+    line = json.dumps({"component": component_nameid, "key": key, "hit": is_hit, "time": time.time()}) + "\n"
+    # One write in append mode: concurrent readers see the whole line or nothing
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Restores the outputs of the task from the cache or runs the task and stores its outputs.")
+    parser.add_argument("--cache-directory", required=True)
+    parser.add_argument("--workflow-directory", required=True)
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--component", required=True)
+    parser.add_argument("--salt", default="")
+    parser.add_argument("--inputs", nargs="*", default=[])
+    parser.add_argument("--outputs", nargs="*", default=[])
+    parser.add_argument("--command", required=True)
+    args = parser.parse_args()
+
+    cache = TaskCache(args.cache_directory, args.workflow_directory)
+    try:
+        key = cache.get_key(args.command, args.inputs, args.outputs, args.salt)
+        is_hit = cache.restore(key, args.outputs)
+    except OSError as e:
+        sys.stderr.write("[jflow task cache] Lookup failed: " + str(e) + "\n")
+        key, is_hit = None, False
+    if is_hit:
+        _log_task(args.log, args.component, key, True)
+        return 0
+    return_code = subprocess.call(args.command, shell=True)
+    if return_code == 0 and key is not None:
+        try:
+            cache.store(key, args.outputs)
+        except OSError as e:
+            sys.stderr.write("[jflow task cache] Outputs cannot be stored: " + str(e) + "\n")
+        _log_task(args.log, args.component, key, False)
+    return return_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Resources consumption of the components tasks.
+
+The module is executed on the computing nodes as the wrapper of each
+profiled task: it only depends on the standard library.
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import resource
+import argparse
+import subprocess
+
+
+TASK_PROFILE_LOG_FILE_NAME = "task_profile.log"
+PROFILE_METRICS = ["wall_time", "cpu_time", "max_rss", "read_bytes", "written_bytes"]
+
+
+def get_sample_name(inputs):
+    """
+    @summary: Returns the name of the sample processed by a task: the name of
+              its first data file (the scripts generated by weaver are skipped)
+              without extensions.
+    @param inputs: [list] the paths to the inputs of the task.
+    @return: [str] the sample name or None if the task has no data file.
+    """
+    for path in inputs:
+        path = str(path)
+        if os.sep + "_Stash" + os.sep not in path:
+            return os.path.basename(path).split(".")[0]
+    return None
+
+
+def get_command_wrapper(log_path, component_nameid, inner_wrapper=None, get_sample=None):
+    """
+    @summary: Returns the function used by the weaver engine to wrap the
+              commands of a component with the resources measurement.
+    @param log_path: [str] path to the log of the tasks profiles.
+    @param component_nameid: [str] the component name id.
+    @param inner_wrapper: [function] the wrapper applied to the command before
+                          the measurement.
+    @param get_sample: [function] returns the sample of the task from its
+                       inputs and its outputs (see
+                       jflow.component.Component.get_task_sample). By
+                       default the sample is determined by get_sample_name.
+    @return: [function] the wrapper taking the command, the inputs and the
+             outputs of the task and returning the new command.
+    """
+    def wrap_command(command, inputs, outputs):
+        if inner_wrapper is not None:
+            command = inner_wrapper(command, inputs, outputs)
+        wrapper = [sys.executable, os.path.abspath(__file__),
+                   "--log", log_path,
+                   "--component", component_nameid,
+                   "--command", command]
+        sample = get_sample_name(inputs) if get_sample is None else get_sample(inputs, outputs)
+        if sample is not None:
+            wrapper.extend(["--sample", sample])
+        return " ".join(shlex.quote(elt) for elt in wrapper)
+    return wrap_command
+
+
+def get_run_profile(log_paths):
+    """
+    @summary: Returns the resources consumed by the tasks summed by component
+              and by sample. The max_rss is the maximum of the tasks.
+    @param log_paths: [list] paths to the logs of the tasks profiles.
+    @return: [dict] the profile: "components" and "samples" give the
+             metrics by name, "total" the metrics of the run.
+    """
+    def new_metrics():
+        metrics = {metric: 0 for metric in PROFILE_METRICS}
+        metrics["tasks"] = 0
+        return metrics
+    def add_task(metrics, task):
+        metrics["tasks"] += 1
+        for metric in PROFILE_METRICS:
+            if metric == "max_rss":
+                metrics[metric] = max(metrics[metric], task[metric])
+            else:
+                metrics[metric] += task[metric]
+    profile = {"components": dict(), "samples": dict(), "total": new_metrics()}
+    for log_path in log_paths:
+        try:
+            with open(log_path) as FH_log:
+                for line in FH_log:
+                    if line.endswith("\n"): # Skip line being written
+                        task = json.loads(line)
+                        if task["component"] not in profile["components"]:
+                            profile["components"][task["component"]] = new_metrics()
+                        add_task(profile["components"][task["component"]], task)
+                        if task["sample"] is not None:
+                            if task["sample"] not in profile["samples"]:
+                                profile["samples"][task["sample"]] = new_metrics()
+                            add_task(profile["samples"][task["sample"]], task)
+                        add_task(profile["total"], task)
+        except (IOError, ValueError):
+            pass
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the task and logs its wall time, CPU time, max RSS and I/O.")
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--component", required=True)
+    parser.add_argument("--sample", default=None)
+    parser.add_argument("--command", required=True)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    return_code = subprocess.call(args.command, shell=True)
+    end_time = time.time()
+    # The usage of the children covers all the processes of the command
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    rss_unit = 1 if sys.platform == "darwin" else 1024 # ru_maxrss is in kB on Linux
+    task = {
+        "component": args.component,
+        "sample": args.sample,
+        "start_time": start_time,
+        "return_code": return_code,
+        "wall_time": end_time - start_time,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "max_rss": usage.ru_maxrss * rss_unit,
+        "read_bytes": usage.ru_inblock * 512,
+        "written_bytes": usage.ru_oublock * 512
+    }
+    line = json.dumps(task) + "\n"
+    try:
+        # One write in append mode: concurrent readers see the whole line or nothing
+        fd = os.open(args.log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+    except OSError as e:
+        sys.stderr.write("[jflow task profile] The profile cannot be written: " + str(e) + "\n")
+    return return_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
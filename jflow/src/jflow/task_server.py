@@ -0,0 +1,323 @@
+#
+# Copyright (C) 2015 INRA
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Warm workers for the short python scripts of the components.
+
+The server is started once on the node executing the tasks: it imports the
+heavy modules once and forks a worker for each task. The command of the
+task is a thin client which sends the script, its arguments, its working
+directory, its environment and its stdin, stdout and stderr to the server
+through a UNIX socket. The worker acknowledges the request with its pid
+before executing the script: the client forwards SIGTERM and SIGINT to
+the worker and exits with the return code of the script. When the server
+is not reachable or does not acknowledge the request the client executes
+the script itself.
+
+The module is executed on the computing nodes: it only depends on the
+standard library.
+"""
+
+import os
+import sys
+import json
+import array
+import fcntl
+import runpy
+import shlex
+import signal
+import socket
+import struct
+import hashlib
+import argparse
+import tempfile
+import importlib
+import traceback
+import subprocess
+
+
+HEADER_FORMAT = "!Q" # Length of the request
+STD_FDS = [0, 1, 2]
+FORWARDED_SIGNALS = [signal.SIGTERM, signal.SIGINT]
+ACK_TIMEOUT = 30 # Seconds waited by the client for the acknowledgement of the worker
+
+
+def get_socket_path(key=""):
+    """
+    @summary: Returns the path to the socket of the server on the current node.
+              There is one server by user, by python and by key.
+    @param key: [str] the key separating the servers (example: the
+                application directory).
+    @return: [str] the path to the socket in the local temporary directory.
+    """
+    server_id = hashlib.md5((sys.executable + "\t" + key).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), "jflow_task_server_{0}_{1}.sock".format(os.getuid(), server_id))
+
+
+def get_client_command(socket_path, script_path):
+    """
+    @summary: Returns the command executing a python script in a worker of the
+              server. It replaces the script path in the component command.
+    @param socket_path: [str] path to the socket of the server.
+    @param script_path: [str] path to the python script.
+    @return: [str] the command.
+    """
+    return " ".join(shlex.quote(elt) for elt in [sys.executable, os.path.abspath(__file__), "run", socket_path, script_path])
+
+
+def start_server(socket_path, preload=None, idle_timeout=600):
+    """
+    @summary: Starts the server in background if it is not already running.
+    @param socket_path: [str] path to the socket of the server.
+    @param preload: [list] the modules imported by the server before the
+                    first task.
+    @param idle_timeout: [int] the server stops after this number of seconds
+                         without task.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "serve", socket_path, "--idle-timeout", str(idle_timeout)]
+    if preload:
+        command.extend(["--preload"] + list(preload))
+    with open(os.devnull, "r+") as FH_null:
+        subprocess.Popen(command, stdin=FH_null, stdout=FH_null, stderr=FH_null, close_fds=True, start_new_session=True)
+
+
+def _recv_all(connection, size):
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise EOFError("The connection is closed before the end of the message.")
+        data += chunk
+    return data
+
+
+def _recv_request(connection):
+    """
+    @summary: Returns the request sent by the client and the file descriptors
+              of its stdin, stdout and stderr.
+    """
+    fds = array.array("i")
+    header, ancillary, flags, address = connection.recvmsg(struct.calcsize(HEADER_FORMAT), socket.CMSG_LEN(len(STD_FDS) * fds.itemsize))
+    for level, type, data in ancillary:
+        if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    if len(header) < struct.calcsize(HEADER_FORMAT):
+        header += _recv_all(connection, struct.calcsize(HEADER_FORMAT) - len(header))
+    request_size = struct.unpack(HEADER_FORMAT, header)[0]
+    return json.loads(_recv_all(connection, request_size).decode()), list(fds)
+
+
+def _send_message(connection, message):
+    connection.sendall((json.dumps(message) + "\n").encode())
+
+
+def _recv_message(connection, buffer):
+    """
+    @summary: Returns the next message sent by the worker and the remaining
+              received data. The messages are JSON lines.
+    @param connection: [socket] the connection to the worker.
+    @param buffer: [bytes] the data received and not yet decoded.
+    @return: [list] the message (None if the connection is closed before
+             the end of the message) and the remaining data.
+    """
+    while b"\n" not in buffer:
+        chunk = connection.recv(4096)
+        if not chunk:
+            return None, buffer
+        buffer += chunk
+    message, buffer = buffer.split(b"\n", 1)
+    return json.loads(message.decode()), buffer
+
+
+def _run_task(connection):
+    """
+    @summary: Acknowledges the request with the pid of the current process
+              (the forked worker), executes the script of the request and
+              sends its return code to the client. The script is not
+              executed if the client does not receive the acknowledgement.
+    """
+    request, fds = _recv_request(connection)
+    if len(fds) != len(STD_FDS):
+        raise Exception("The client must send its stdin, stdout and stderr.")
+    _send_message(connection, {"pid": os.getpid()})
+    for std_fd, fd in zip(STD_FDS, fds):
+        os.dup2(fd, std_fd)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # Same module path as "python script"
+    script_path = request["argv"][0]
+    python_path = [elt for elt in os.environ.get("PYTHONPATH", "").split(os.pathsep) if elt != ""]
+    sys.path[0:0] = [os.path.dirname(os.path.abspath(script_path))] + [elt for elt in python_path if elt not in sys.path]
+    sys.argv = list(request["argv"])
+    return_code = 0
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            return_code = 0
+        elif isinstance(e.code, int):
+            return_code = e.code
+        else:
+            sys.stderr.write(str(e.code) + "\n")
+            return_code = 1
+    except BaseException:
+        traceback.print_exc()
+        return_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    _send_message(connection, {"return_code": return_code})
+
+
+def serve(socket_path, preload=None, idle_timeout=600):
+    """
+    @summary: Runs the server: imports the preloaded modules then forks a
+              worker for each connection. Only one server runs on a socket
+              path (lock on socket_path + ".lock"). The lock file is never
+              removed: an other server can have it opened.
+    @param socket_path: [str] path to the socket of the server.
+    @param preload: [list] the modules imported before the first task. The
+                    missing modules are skipped.
+    @param idle_timeout: [int] the server stops after this number of seconds
+                         without task.
+    """
+    FH_lock = open(socket_path + ".lock", "w")
+    try:
+        fcntl.flock(FH_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError: # An other server is running
+        FH_lock.close()
+        return
+    for module_name in (preload or []):
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        server.listen(128)
+        server.settimeout(idle_timeout)
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN) # The workers are reaped by the system
+        while True:
+            try:
+                connection, address = server.accept()
+            except socket.timeout:
+                break
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0: # Worker
+                return_code = 1
+                try:
+                    server.close()
+                    FH_lock.close() # The lock stays held by the server only
+                    for signum in FORWARDED_SIGNALS:
+                        signal.signal(signum, signal.SIG_DFL)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    connection.settimeout(None)
+                    _run_task(connection)
+                    return_code = 0
+                except BaseException:
+                    traceback.print_exc()
+                finally:
+                    os._exit(return_code)
+            connection.close()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        FH_lock.close()
+
+
+def run(socket_path, argv):
+    """
+    @summary: Executes the script in a worker of the server or, if the
+              server is not reachable or does not acknowledge the request,
+              in the current process. SIGTERM and SIGINT received by the
+              client are forwarded to the worker.
+    @param socket_path: [str] path to the socket of the server.
+    @param argv: [list] the script path and its arguments.
+    @return: [int] the return code of the script.
+    """
+    request = json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}).encode()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendmsg(
+            [struct.pack(HEADER_FORMAT, len(request))],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", STD_FDS))]
+        )
+        client.sendall(request)
+        client.settimeout(ACK_TIMEOUT)
+        ack, buffer = _recv_message(client, b"")
+        if ack is None:
+            raise ConnectionResetError("The server is stopped before the acknowledgement.")
+        client.settimeout(None)
+    except OSError: # The server is not reachable (socket.timeout is an OSError): the script is executed without it
+        client.close()
+        os.execv(sys.executable, [sys.executable] + argv)
+    # Forward signals to the worker
+    received_signals = []
+    def forward_signal(signum, frame):
+        received_signals.append(signum)
+        try:
+            os.kill(ack["pid"], signum)
+        except ProcessLookupError:
+            pass
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward_signal)
+    # Wait the end of the script
+    try:
+        response, buffer = _recv_message(client, buffer)
+    except OSError:
+        response = None
+    client.close()
+    if response is None:
+        if received_signals:
+            return 128 + received_signals[-1]
+        sys.stderr.write("[jflow task server] The worker executing " + argv[0] + " has been interrupted.\n")
+        return 1
+    return response["return_code"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executes python scripts in workers forked from a server with preloaded modules.")
+    subparsers = parser.add_subparsers(dest="action")
+    parser_serve = subparsers.add_parser("serve", help="Starts the server.")
+    parser_serve.add_argument("socket")
+    parser_serve.add_argument("--idle-timeout", type=int, default=600)
+    parser_serve.add_argument("--preload", nargs="*", default=[])
+    parser_run = subparsers.add_parser("run", help="Executes the script in a worker of the server.")
+    parser_run.add_argument("socket")
+    parser_run.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.action == "serve":
+        serve(args.socket, args.preload, args.idle_timeout)
+        return 0
+    elif args.action == "run":
+        return run(args.socket, args.command)
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
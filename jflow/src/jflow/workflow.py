@@ -26,6 +26,8 @@ import pickle
 import time
 import threading
 import types
+import shlex
+import json
 import datetime
 import logging
 import traceback
@@ -40,6 +42,13 @@ from jflow.utils import validate_email
 from pygraph.classes.digraph import digraph
 from jflow.workflows_manager import WorkflowsManager
 from jflow.config_reader import JFlowConfigReader
+from jflow.journal import WorkflowJournal
+from jflow.executor import InProcessExecutor
+from jflow.scheduling import get_components_runtimes, get_tasks_sorter
+from jflow.task_cache import get_command_wrapper, get_cache_stats, TASK_CACHE_LOG_FILE_NAME
+from jflow.task_profile import get_command_wrapper as get_profile_command_wrapper
+from jflow.task_profile import get_run_profile, TASK_PROFILE_LOG_FILE_NAME
+from jflow.task_server import start_server
 from jflow.utils import get_octet_string_representation, get_nb_octet
 from jflow.parameter import *
 from jflow.exceptions import RuleException
@@ -61,10 +70,78 @@ from cctools.makeflow.log import Node
 from workflows import rules as wf_rules
 
 
+MAKEFLOW_LOGS_CACHE_SIZE = 200
+MAKEFLOW_LOG_STATE_EXTENSION = ".parsed"
+_makeflow_logs_cache = OrderedDict()
+_makeflow_logs_lock = threading.Lock()
+
+
+def _load_makeflow_log_state(log_path):
+    """
+    @summary: Returns the parsed log saved next to the makeflow log by a previous
+              process.
+    @param log_path: [str] path to the makeflow log.
+    @return: [MakeflowLog] the saved log or None if it does not exist or it cannot be read.
+    """
+    try:
+        with open(log_path + MAKEFLOW_LOG_STATE_EXTENSION, "rb") as FH_state:
+            log = pickle.load(FH_state)
+    except Exception:  # The state is only an optimisation: any problem restarts the parsing from scratch
+        return None
+    if not isinstance(log, MakeflowLog) or log.path != log_path:
+        return None
+    return log
+
+
+def _save_makeflow_log_state(log):
+    """
+    @summary: Saves the parsed log next to the makeflow log to allow the next
+              processes to resume the parsing from its offset.
+    @param log: [MakeflowLog] the parsed log.
+    """
+    state_path = log.path + MAKEFLOW_LOG_STATE_EXTENSION
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(state_path), prefix=".makeflowlog_")
+        try:
+            with os.fdopen(fd, "wb") as FH_state:
+                pickle.dump(log, FH_state)
+            os.replace(tmp_path, state_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    except (OSError, pickle.PicklingError):  # The state is optional
+        pass
+
+
+def get_parsed_makeflow_log(log_path):
+    """
+    @summary: Returns the makeflow log up to date. The parsed log is kept in
+              memory by the process and it is saved next to the log file
+              (<log>.parsed): each call, even from a new process, only parses
+              the lines appended since the previous call on the same file.
+    @param log_path: [str] path to the makeflow log.
+    @return: [MakeflowLog] the parsed log.
+    """
+    with _makeflow_logs_lock:
+        log = _makeflow_logs_cache.pop(log_path, None)
+        if log is None:
+            log = _load_makeflow_log_state(log_path)
+        if log is None:
+            log = MakeflowLog(log_path)
+        previous_offset = log.offset
+        log.parse()  # On error the log is dropped from the cache and the next call restarts from the saved state
+        if log.offset != previous_offset:
+            _save_makeflow_log_state(log)
+        _makeflow_logs_cache[log_path] = log
+        if len(_makeflow_logs_cache) > MAKEFLOW_LOGS_CACHE_SIZE:
+            _makeflow_logs_cache.popitem(last=False)
+    return log
+
+
 class MINIWorkflow(object):
 
     def __init__(self, id, name, description, status, start_time, end_time, metadata,
-                 component_nameids, compts_status, errors):
+                 component_nameids, compts_status, errors, dump_path=None):
         self.id = id
         self.name = name
         self.description = description
@@ -75,6 +152,10 @@ class MINIWorkflow(object):
         self.component_nameids = component_nameids
         self.compts_status = compts_status
         self.errors = errors
+        self.dump_path = dump_path
+
+    def minimize(self):
+        return self
 
     def get_components_nameid(self):
         return self.component_nameids
@@ -94,7 +175,10 @@ class MINIWorkflow(object):
 class Workflow(threading.Thread):
 
     MAKEFLOW_LOG_FILE_NAME = "Makeflow.makeflowlog"
+    RUNTIMES_HISTORY_SIZE = 10
+    RUN_PROFILE_FILE_NAME = "run_profile.json"
     DUMP_FILE_NAME = ".workflow.dump"
+    JOURNAL_FILE_NAME = ".workflow.journal"
     STDERR_FILE_NAME = "wf_stderr.txt"
     WORKING = ".working"
     OLD_EXTENSION = ".old"
@@ -167,6 +251,7 @@ class Workflow(threading.Thread):
                 os.makedirs(self.directory, 0o751)
             if self.stderr is None:
                 self.stderr = self._set_stderr()
+            # The dump is written at creation: a workflow failing before its first step can be retrieved, rerun and deleted
             self._serialize()
 
         self.internal_components = self._import_internal_components()
@@ -577,9 +662,12 @@ class Workflow(threading.Thread):
                     if components_errors == "":
                         components_errors = "Failed Commands :\n"
                     components_errors += "  - " + component + " :\n    " + "\n    ".join(status_info["failed_commands"]) + "\n"
+                cache = ""
+                if status_info.get("cache_hits", 0) + status_info.get("cache_misses", 0) > 0:
+                    cache = ", cache hits:" + str(status_info["cache_hits"]) + ", cache misses:" + str(status_info["cache_misses"])
                 status += "  - " + component + ", time elapsed " + time_format(status_info["time"]) + \
                     " (total:" + str(status_info["tasks"]) + ", " + waiting + ", " + running + ", " + failed + \
-                    ", " + aborted + ", " + completed + ")"
+                    ", " + aborted + ", " + completed + cache + ")"
                 if i<len(workflow.get_components_nameid())-1: status += "\n"
             # Format str
             pretty_str = title
@@ -606,14 +694,18 @@ class Workflow(threading.Thread):
             return pretty_str
 
     def get_errors(self):
-        if os.path.isfile(self.stderr):
+        return Workflow._get_errors_from_file(self.stderr)
+
+    @staticmethod
+    def _get_errors_from_file(stderr):
+        if stderr is not None and os.path.isfile(stderr):
             error = {
                 "title"     : "",
                 "msg"       : list(),
                 "traceback" : list()
             }
             line_idx = 0
-            FH_stderr = open( self.stderr )
+            FH_stderr = open( stderr )
             lines = FH_stderr.readlines()
             while line_idx < len(lines):
                 if lines[line_idx].strip().startswith("##"):
@@ -983,7 +1075,7 @@ class Workflow(threading.Thread):
                 self.components = []
                 self._status = self.STATUS_STARTED
                 self._postprocess_status = self.STATUS_PENDING
-                self._serialize()
+                self._journal()
                 self.wf_execution_wrapper()
                 self.component_nameids_is_init = True
                 if self.dynamic_component_present:
@@ -998,7 +1090,7 @@ class Workflow(threading.Thread):
                 self.components = []
                 self._status = self.STATUS_STARTED
                 self._postprocess_status = self.STATUS_PENDING
-                self._serialize()
+                self._journal()
                 self.wf_execution_wrapper()
                 if len(self.components_to_exec) > 0:
                     self._execute_weaver()
@@ -1008,6 +1100,7 @@ class Workflow(threading.Thread):
             if self.__step == 3:
                 try:
                     self._postprocess_status = self.STATUS_STARTED
+                    self._journal()
                     self.post_process()
                     self._postprocess_status = self.STATUS_COMPLETED
                     self._status = self.STATUS_COMPLETED
@@ -1052,24 +1145,36 @@ class Workflow(threading.Thread):
         @summary: Updates and returns self._status.
         @return: [STATUS] the workflow status.
         """
+        self._status = Workflow._get_status_from_logs(self.directory, self._status, self._postprocess_status, self.reseted_components)
+        return self._status
+
+    @staticmethod
+    def _get_status_from_logs(directory, status, postprocess_status, reseted_components):
+        """
+        @summary: Returns the workflow status updated with the states of its makeflows.
+        @param directory: [str] the workflow directory.
+        @param status: [STATUS] the last status set by the workflow.
+        @param postprocess_status: [STATUS] the status of the post_process step.
+        @param reseted_components: [list] the nameids of the reseted components.
+        @return: [STATUS] the workflow status.
+        """
         try:
-            working_directory = os.path.join(self.directory, self.WORKING)
+            working_directory = os.path.join(directory, Workflow.WORKING)
             make_states = []
             for wdir in os.listdir(working_directory):
-                log_path = os.path.join(working_directory, wdir, self.MAKEFLOW_LOG_FILE_NAME)
-                log = MakeflowLog(log_path)
-                log.parse()
+                log_path = os.path.join(working_directory, wdir, Workflow.MAKEFLOW_LOG_FILE_NAME)
+                log = get_parsed_makeflow_log(log_path)
                 make_states.append(log.state)
-            if len(self.reseted_components) > 0:
-                self._status = self.STATUS_RESETED
-            elif self.STATUS_ABORTED in make_states: # Error in component execution
-                self._status = self.STATUS_ABORTED
-            elif self.STATUS_FAILED in make_states: # Error in component execution
-                self._status = self.STATUS_FAILED
-            elif self._postprocess_status == self.STATUS_FAILED: # Error in postprocess
-                self._status = self.STATUS_FAILED
+            if len(reseted_components) > 0:
+                status = Workflow.STATUS_RESETED
+            elif Workflow.STATUS_ABORTED in make_states: # Error in component execution
+                status = Workflow.STATUS_ABORTED
+            elif Workflow.STATUS_FAILED in make_states: # Error in component execution
+                status = Workflow.STATUS_FAILED
+            elif postprocess_status == Workflow.STATUS_FAILED: # Error in postprocess
+                status = Workflow.STATUS_FAILED
         except: pass
-        return self._status
+        return status
 
     def get_resource(self, resource):
         return self.jflow_config_reader.get_resource(resource)
@@ -1079,9 +1184,19 @@ class Workflow(threading.Thread):
         @summary: Returns the components status for all components.
         @return: [dict] The components status by component name id.
         """
+        return Workflow._get_components_status_from_logs(self.component_nameids, self.reseted_components)
+
+    @staticmethod
+    def _get_components_status_from_logs(component_nameids, reseted_components):
+        """
+        @summary: Returns the components status for all components.
+        @param component_nameids: [dict] the path to the makeflow log by component name id.
+        @param reseted_components: [list] the nameids of the reseted components.
+        @return: [dict] The components status by component name id.
+        """
         status = dict()
         makeflows_logs = list() # Workflows with dynamic component(s) have several makeflows_logs
-        for cmpt_nameid in self.get_components_nameid():
+        for cmpt_nameid in component_nameids:
             status[cmpt_nameid] = {"time": 0.0,
                   "tasks": 0,
                   "waiting": 0,
@@ -1089,36 +1204,65 @@ class Workflow(threading.Thread):
                   "failed": 0,
                   "aborted": 0,
                   "completed": 0,
+                  "cache_hits": 0,
+                  "cache_misses": 0,
                   "failed_commands": list() }
-            if cmpt_nameid not in self.reseted_components:
-                if self.component_nameids[cmpt_nameid] not in makeflows_logs:
-                    makeflows_logs.append(self.component_nameids[cmpt_nameid])
+            if cmpt_nameid not in reseted_components:
+                if component_nameids[cmpt_nameid] not in makeflows_logs:
+                    makeflows_logs.append(component_nameids[cmpt_nameid])
         for current_makeflow_log in makeflows_logs:
             try:
-                log = MakeflowLog(current_makeflow_log)
-                log.parse()
+                log = get_parsed_makeflow_log(current_makeflow_log)
                 symbols = set(n.symbol for n in log.nodes if n.symbol)
                 if not symbols: return None
                 for n in log.nodes:
                     if not n.symbol: continue
                     cmpt_nameid = n.symbol.replace('"', '')
-                    if cmpt_nameid in self.component_nameids and cmpt_nameid not in self.reseted_components:
-                        status[cmpt_nameid]["tasks"] += 1
-                        status[cmpt_nameid]["time"]  += n.elapsed_time
-                        if n.state == Node.WAITING:
-                            status[cmpt_nameid]["waiting"] += 1
-                        elif n.state == Node.RUNNING:
-                            status[cmpt_nameid]["running"] += 1
-                        elif n.state == Node.FAILED:
-                            status[cmpt_nameid]["failed"] += 1
-                            status[cmpt_nameid]["failed_commands"].append( n.command )
-                        elif n.state == Node.ABORTED:
-                            status[cmpt_nameid]["aborted"] += 1
-                        elif n.state == Node.COMPLETED:
-                            status[cmpt_nameid]["completed"] += 1
+                    if cmpt_nameid in component_nameids and cmpt_nameid not in reseted_components:
+                        for task_state, task_time, task_command in Workflow._get_node_tasks(n):
+                            status[cmpt_nameid]["tasks"] += 1
+                            status[cmpt_nameid]["time"]  += task_time
+                            if task_state == Node.WAITING:
+                                status[cmpt_nameid]["waiting"] += 1
+                            elif task_state == Node.RUNNING:
+                                status[cmpt_nameid]["running"] += 1
+                            elif task_state == Node.FAILED:
+                                status[cmpt_nameid]["failed"] += 1
+                                status[cmpt_nameid]["failed_commands"].append( task_command )
+                            elif task_state == Node.ABORTED:
+                                status[cmpt_nameid]["aborted"] += 1
+                            elif task_state == Node.COMPLETED:
+                                status[cmpt_nameid]["completed"] += 1
+                cache_stats = get_cache_stats(os.path.join(os.path.dirname(current_makeflow_log), TASK_CACHE_LOG_FILE_NAME))
+                for cmpt_nameid in cache_stats:
+                    if cmpt_nameid in component_nameids and cmpt_nameid not in reseted_components:
+                        status[cmpt_nameid]["cache_hits"] += cache_stats[cmpt_nameid]["hits"]
+                        status[cmpt_nameid]["cache_misses"] += cache_stats[cmpt_nameid]["misses"]
             except: pass
         return status
 
+    @staticmethod
+    def _get_node_tasks(node):
+        """
+        @summary: Returns the state, the elapsed time and the command of each
+                  task executed by the makeflow node. A node running a sub DAG
+                  (tasks packed with the component group_size) is expanded in
+                  the tasks of this DAG.
+        @param node: [cctools.makeflow.log.Node] the node.
+        @return: [list] the tuples (state, elapsed time, command).
+        """
+        if node.command.startswith("MAKEFLOW "):
+            sub_dag_path = shlex.split(node.command)[1]
+            sub_log_path = sub_dag_path + ".makeflowlog"
+            if os.path.exists(sub_log_path):
+                sub_log = get_parsed_makeflow_log(sub_log_path)
+                return [(sub_node.state, sub_node.elapsed_time, sub_node.command) for sub_node in sub_log.nodes if sub_node is not None]
+            else: # the sub DAG is not started
+                with open(sub_dag_path) as FH_dag:
+                    nb_tasks = len([line for line in FH_dag if line.startswith("@SYMBOL=")])
+                return [(node.state, 0, node.command) for idx in range(nb_tasks)]
+        return [(node.state, node.elapsed_time, node.command)]
+
     def get_component_status(self, component_nameid):
         return self.get_components_status()[component_nameid]
 
@@ -1140,7 +1284,25 @@ class Workflow(threading.Thread):
         compts_status = self.get_components_status()
         return MINIWorkflow(self.id, self.name, self.description, self.get_status(), self.start_time,
                             self.end_time, self.metadata, self.get_components_nameid(), compts_status,
-                            self.get_errors())
+                            self.get_errors(), self.dump_path)
+
+    @staticmethod
+    def minimize_from_journal(journal_path):
+        """
+        @summary: Returns the MINIWorkflow corresponding to the last state stored
+                  in the workflow journal. The status is updated with the
+                  makeflow logs without loading the workflow dump.
+        @param journal_path: [str] path to the workflow journal.
+        @return: [MINIWorkflow] the workflow or None if the journal is empty.
+        """
+        state = WorkflowJournal(journal_path).get_last_state()
+        if state is None:
+            return None
+        status = Workflow._get_status_from_logs(state["directory"], state["status"], state["postprocess_status"], state["reseted_components"])
+        compts_status = Workflow._get_components_status_from_logs(state["component_nameids"], state["reseted_components"])
+        return MINIWorkflow(state["id"], state["name"], state["description"], status, state["start_time"],
+                            state["end_time"], state["metadata"], list(state["component_nameids"].keys()), compts_status,
+                            Workflow._get_errors_from_file(state["stderr"]), state["dump_path"])
 
     def makeflow_pretty_print_node(self, dag, node):
         sys.stdout.write('{0:>10} {1} {2}\n'.format('NODE', node.id, node.symbol))
@@ -1192,13 +1354,38 @@ class Workflow(threading.Thread):
         self._import('stack', STACKS)
 
         # Execute nest
+        cache_directory = self.jflow_config_reader.get_cache_directory()
+        task_profiling = self.jflow_config_reader.get_task_profiling()
+        task_server = self.jflow_config_reader.get_task_server()
+        if task_server is not None:
+            # the server is started once on the node: the tasks submitted before it listens run without it
+            start_server(task_server["socket"], task_server["preload"], task_server["idle_timeout"])
         with Nest(current_working_directory, wrapper=engine_wrapper, path=self.jflow_config_reader.get_makeflow_path()) as nest:
             with self.options:
                 if new_make:
                     try:
+                        # the tasks on the longest remaining path are submitted first
+                        nest.tasks_sorter = get_tasks_sorter(get_components_runtimes(self._get_history_makeflow_logs()))
                         for component in self.components_to_exec:
                             nest.symbol = component.get_nameid()
                             nest.batch = component.batch_options
+                            nest.group = component.group_size
+                            nest.cpu = component.get_cpu()
+                            nest.memory = component.get_memory_mb()
+                            command_wrapper = None
+                            if cache_directory is not None and component.use_cache:
+                                command_wrapper = get_command_wrapper(
+                                    cache_directory, self.directory,
+                                    os.path.join(current_working_directory, TASK_CACHE_LOG_FILE_NAME),
+                                    component.get_nameid(), component.get_cache_salt()
+                                )
+                            if task_profiling:
+                                command_wrapper = get_profile_command_wrapper(
+                                    os.path.join(current_working_directory, TASK_PROFILE_LOG_FILE_NAME),
+                                    component.get_nameid(), command_wrapper, component.get_task_sample
+                                )
+                            if command_wrapper is not None:
+                                nest.command_wrappers[component.get_nameid()] = command_wrapper
                             self.component_nameids[component.get_nameid()] = os.path.join(current_working_directory, self.MAKEFLOW_LOG_FILE_NAME)
                             component.execute()
                         # create the DAG
@@ -1206,20 +1393,75 @@ class Workflow(threading.Thread):
                     except Exception as e:
                         self._status = self.STATUS_FAILED
                         self.end_time = time.time()
-                        self._serialize()
                         raise
                 self.components_to_exec = []
                 # Once a weaver script is compiled, serialize the workflow
                 self._serialize()
                 try:
-                    nest.execute(self.engine_arguments, exit_on_failure=True)
+                    batch = self.jflow_config_reader.get_batch()
+                    if batch is not None and batch[0].lower() == "inprocess":
+                        nest.dag_file.flush()
+                        InProcessExecutor(nest.dag_path, nest.work_dir, max_jobs=batch[2]).execute()
+                    else:
+                        nest.execute(self.engine_arguments, exit_on_failure=True)
                     # close dag_file after execution to avoid nfs troubles
                     nest.dag_file.close()
                 except:
                     self._status = self.STATUS_FAILED
                     self.end_time = time.time()
-                    self._serialize()
                     raise
+                finally:
+                    if task_profiling:
+                        self._write_run_profile()
+
+    def get_run_profile(self):
+        """
+        @summary: Returns the resources consumed by the tasks of the workflow
+                  (wall time, CPU time, max RSS, bytes read and written) by
+                  component and by sample.
+        @return: [dict] the profile (see jflow.task_profile.get_run_profile).
+        """
+        log_paths = list()
+        working_directory = os.path.join(self.directory, self.WORKING)
+        if os.path.isdir(working_directory):
+            for make_directory in os.listdir(working_directory):
+                log_path = os.path.join(working_directory, make_directory, TASK_PROFILE_LOG_FILE_NAME)
+                if os.path.exists(log_path):
+                    log_paths.append(log_path)
+        return get_run_profile(log_paths)
+
+    def _write_run_profile(self):
+        try:
+            with open(os.path.join(self.directory, self.RUN_PROFILE_FILE_NAME), "w") as FH_profile:
+                json.dump(self.get_run_profile(), FH_profile, indent=2)
+        except:
+            logging.getLogger("jflow").debug("The run profile of the workflow #" + utils.get_nb_string(self.id) + " cannot be written!")
+
+    def _get_history_makeflow_logs(self):
+        """
+        @summary: Returns the makeflow logs of the last executions of this
+                  workflow and of the previous makeflows of the current one.
+        @return: [list] the paths to the makeflow logs.
+        """
+        workflows_directories = list()
+        try:
+            parent_directory = os.path.dirname(self.directory)
+            for wdir in os.listdir(parent_directory):
+                wdir_path = os.path.join(parent_directory, wdir)
+                if wdir.startswith(WorkflowsManager.WF_DIRECTORY_PREFIX) and wdir_path != self.directory and os.path.isdir(wdir_path):
+                    workflows_directories.append(wdir_path)
+        except OSError: pass
+        workflows_directories = sorted(workflows_directories, key=os.path.getmtime)[-self.RUNTIMES_HISTORY_SIZE:]
+        workflows_directories.append(self.directory)
+        makeflow_logs = list()
+        for wdir_path in workflows_directories:
+            working_directory = os.path.join(wdir_path, self.WORKING)
+            if os.path.isdir(working_directory):
+                for make_directory in os.listdir(working_directory):
+                    log_path = os.path.join(working_directory, make_directory, self.MAKEFLOW_LOG_FILE_NAME)
+                    if os.path.exists(log_path):
+                        makeflow_logs.append(log_path)
+        return makeflow_logs
 
     def _get_current_make(self):
         current_component, make_directory, new_make = [], None, False
@@ -1236,10 +1478,41 @@ class Workflow(threading.Thread):
         return [make_directory, new_make]
 
     def _serialize(self):
+        """
+        @summary: Writes the workflow dump used to restart the workflow and
+                  adds its state in the journal. This method must only be
+                  called at the creation of the workflow and when the
+                  information needed by a restart changes (step, compiled
+                  makeflow, end of execution), otherwise use
+                  _journal().
+        """
         self.dump_path = os.path.join(self.directory, self.DUMP_FILE_NAME)
         workflow_dump = open(self.dump_path, "wb")
         pickle.dump(self, workflow_dump)
         workflow_dump.close()
+        self._journal()
+
+    def _journal(self):
+        """
+        @summary: Adds the current state of the workflow in its journal. This
+                  state is used to list the workflows and their status.
+        """
+        WorkflowJournal(os.path.join(self.directory, self.JOURNAL_FILE_NAME)).append({
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "directory": self.directory,
+            "dump_path": os.path.join(self.directory, self.DUMP_FILE_NAME),
+            "stderr": self.stderr,
+            "step": self.__step,
+            "status": self._status,
+            "postprocess_status": self._postprocess_status,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "metadata": self.metadata,
+            "component_nameids": self.component_nameids,
+            "reseted_components": self.reseted_components
+        })
 
     def _component_is_duplicated(self, component):
         if component.get_nameid() in list(self.component_nameids.keys()):
@@ -22,19 +22,22 @@ import jflow
 import sys
 import imp
 import os
+import json
 import pickle
 import threading
 import logging
 
 import jflow.utils as utils
-import jflow.concurrent_access as concurrent
 from jflow.config_reader import JFlowConfigReader
+from jflow.registry import WorkflowsRegistry
 
 
 class WorkflowsManager(object):
 
     IDS_FILE_NAME = "jflowIDs.txt"
     WORKFLOWS_DUMP_FILE_NAME = ".workflows.dump"
+    WORKFLOWS_REGISTRY_FILE_NAME = ".workflows.sqlite"
+    WORKFLOWS_MANIFEST_FILE_NAME = "jflow_workflows_manifest.json"
     WF_DIRECTORY_PREFIX = "wf"
 
     def __init__(self):
@@ -43,26 +46,23 @@ class WorkflowsManager(object):
             os.makedirs(self.get_output_directory(), 0o751)
         self.dump_file = os.path.join(self.get_output_directory(), self.WORKFLOWS_DUMP_FILE_NAME)
         self.ids_file = os.path.join(self.get_output_directory(), self.IDS_FILE_NAME)
+        self.registry_file = os.path.join(self.get_output_directory(), self.WORKFLOWS_REGISTRY_FILE_NAME)
+        self._registry = None
+
+    @property
+    def registry(self):
+        # opened on first use: a manager is created by each workflow instance
+        if self._registry is None:
+            self._registry = WorkflowsRegistry(self.registry_file, self.dump_file, self.ids_file)
+        return self._registry
 
     def _dump_workflows(self, workflows):
-        def dump_func():
-            # first load the existing workflows
-            try:
-                wdfh = open(self.dump_file, "rb")
-                workflows_dump = pickle.load(wdfh)
-                wdfh.close()
-            except:
-                workflows_dump = {}
-            # then add the new ones
-            for workflow in workflows:
-                workflows_dump[utils.get_nb_string(workflow.id)] = {"dump_path": workflow.dump_path,
-                                                                    "object": workflow.minimize()}
-            # and save them
-            wdfh = open(self.dump_file, "wb")
-            pickle.dump(workflows_dump, wdfh)
-            wdfh.close()
-        workflows_ids = [wf.id for wf in workflows]
-        concurrent.exec_on_shared( dump_func, self.dump_file, self.config_reader.get_tmp_directory(), 1, 200, {"action": "Add wf", "wf_id": workflows_ids} )
+        # minimize outside the transaction to keep the lock short
+        minimized = [(utils.get_nb_string(workflow.id), workflow.dump_path, workflow.minimize()) for workflow in workflows]
+        if len(minimized) > 0:
+            with self.registry.transaction() as cursor:
+                for workflow_id, dump_path, mini_workflow in minimized:
+                    self.registry.set(cursor, workflow_id, dump_path, mini_workflow)
 
     def get_available_workflows(self, function="process", filter_groups = [], select = False ):
         if function.__class__.__name__ == "str":
@@ -97,6 +97,94 @@ class WorkflowsManager(object):
                                 except: pass
         return [wf_instances, wf_methodes]
 
+    def _get_workflows_modules_mtimes(self):
+        """
+        @summary: Returns the last modification time of each module of the
+                  workflows package and of jflow. For a package the value is
+                  the most recent modification of its python files.
+        @return: [dict] by module name the modification time.
+        """
+        def get_package_mtime(package_path):
+            last_mtime = 0
+            for dirpath, dirnames, filenames in os.walk(package_path):
+                dirnames[:] = [elt for elt in dirnames if elt != "__pycache__"]
+                for filename in filenames:
+                    if filename.endswith(".py"):
+                        last_mtime = max(last_mtime, os.path.getmtime(os.path.join(dirpath, filename)))
+            return last_mtime
+        mtimes = dict()
+        for importer, modname, ispkg in pkgutil.iter_modules(workflows.__path__, workflows.__name__ + "."):
+            module_path = os.path.join(importer.path, modname.split(".")[-1])
+            if ispkg:
+                mtimes[modname] = get_package_mtime(module_path)
+            else:
+                mtimes[modname] = os.path.getmtime(module_path + ".py")
+        # the workflows are built by jflow
+        mtimes[jflow.__name__] = get_package_mtime(os.path.dirname(jflow.__file__))
+        return mtimes
+
+    def get_workflows_manifest(self, function="process"):
+        """
+        @summary: Returns the name, the description, the class and the module
+                  of the available workflows. The manifest is cached in the
+                  tmp directory and rebuilt only when a module of the
+                  workflows package changes: this avoids to import and build
+                  all the workflows to find the selected one.
+        @param function: [str] the method required in workflows.
+        @return: [list] the description of each available workflow (keys:
+                 name, description, class and module).
+        """
+        manifest_path = os.path.join(self.config_reader.get_tmp_directory(), self.WORKFLOWS_MANIFEST_FILE_NAME)
+        mtimes = self._get_workflows_modules_mtimes()
+        try:
+            with open(manifest_path) as FH_manifest:
+                manifest = json.load(FH_manifest)
+            if manifest["function"] == function and manifest["mtimes"] == mtimes:
+                return manifest["workflows"]
+        except: pass
+        wf_instances, wf_methodes = self.get_available_workflows(function)
+        manifest = {
+            "function": function,
+            "mtimes": mtimes,
+            "workflows": [{"name": inst.name,
+                           "description": inst.description,
+                           "class": inst.__class__.__name__,
+                           "module": inst.__class__.__module__} for inst in wf_instances]
+        }
+        try:
+            tmp_manifest_path = manifest_path + "." + str(os.getpid())
+            with open(tmp_manifest_path, "w") as FH_manifest:
+                json.dump(manifest, FH_manifest)
+            os.rename(tmp_manifest_path, manifest_path)
+        except:
+            logging.getLogger("jflow").debug("The workflows manifest cannot be written in " + manifest_path + "!")
+        return manifest["workflows"]
+
+    def get_workflow_class(self, workflow_class):
+        """
+        @summary: Returns the class of the workflow. Only the module declared
+                  for this class in the manifest is imported.
+        @param workflow_class: [str] the class name.
+        @return: [class] the workflow class or None if it does not exist.
+        """
+        for workflow in self.get_workflows_manifest():
+            if workflow["class"] == workflow_class:
+                try:
+                    __import__(workflow["module"])
+                    return getattr(sys.modules[workflow["module"]], workflow_class)
+                except: pass
+        # Load all modules within the workflow module
+        for importer, modname, ispkg in pkgutil.iter_modules(workflows.__path__, workflows.__name__ + "."):
+            try:
+                __import__(modname)
+            except Exception: # a broken workflow does not prevent the use of the others
+                continue
+            # Search for Workflow classes
+            for class_name, obj in inspect.getmembers(sys.modules[modname], inspect.isclass):
+                if class_name == workflow_class:
+                    return obj
+        return None
+
     def rerun_workflow(self, workflow_id, is_synchro=False):
         workflow = self.get_workflow(workflow_id)
         workflow.restart()
@@ -115,12 +203,7 @@ class WorkflowsManager(object):
         return workflow
 
     def run_workflow(self, workflow_class, args, function="process", is_synchro=False):
-        # Load all modules within the workflow module
-        for importer, modname, ispkg in pkgutil.iter_modules(workflows.__path__, workflows.__name__ + "."):
-            __import__(modname)
-            # Search for Workflow classes
-            for class_name, obj in inspect.getmembers(sys.modules[modname], inspect.isclass):
-                if class_name == workflow_class: workflow = obj(args, self.get_next_id(), function)
+        workflow = self.get_workflow_class(workflow_class)(args, self.get_next_id(), function)
         workflow.start()
         # Add the workflow dump path to the workflows dump
         self._dump_workflows([workflow])
@@ -131,30 +214,24 @@ class WorkflowsManager(object):
 
     def delete_workflow(self, workflow_id):
         from jflow.workflow import Workflow
-        def delete_func():
-            try:
-                awfh = open(self.dump_file, "rb")
-                all_workflows_dump = pickle.load(awfh)
-                awfh.close()
-            except:
-                all_workflows_dump = {}
-            rworkflow_id = utils.get_nb_string(workflow_id)
-            try:
-                workflow_dump = open(all_workflows_dump[rworkflow_id]["dump_path"], "rb")
-                workflow = pickle.load(workflow_dump)
-                workflow_dump.close()
-                # if workflow is not in a running status
-                if workflow.get_status() in [Workflow.STATUS_COMPLETED, Workflow.STATUS_FAILED, Workflow.STATUS_ABORTED]:
-                    workflow.delete()
-                    del all_workflows_dump[rworkflow_id]
-            except:
-                logging.getLogger("jflow").debug("Workflow #" + rworkflow_id + " connot be retrieved in the available workflows!")
-                raise Exception("Workflow #" + rworkflow_id + " connot be retrieved in the available workflows!")
-            # and save them
-            awfh = open(self.dump_file, "wb")
-            pickle.dump(all_workflows_dump, awfh)
-            awfh.close()
-        concurrent.exec_on_shared( delete_func, self.dump_file, self.config_reader.get_tmp_directory(), 1, 200, {"action": "Delete wf", "wf_id": str(workflow_id)} )
+        rworkflow_id = utils.get_nb_string(workflow_id)
+        # the files are deleted outside of the registry transaction: the other
+        # jflow processes must not wait the end of a large deletion
+        registered = self.registry.get(rworkflow_id)
+        try:
+            if registered is None:
+                raise KeyError(rworkflow_id)
+            workflow_dump = open(registered["dump_path"], "rb")
+            workflow = pickle.load(workflow_dump)
+            workflow_dump.close()
+        except (KeyError, OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            logging.getLogger("jflow").debug("Workflow #" + rworkflow_id + " connot be retrieved in the available workflows!")
+            raise Exception("Workflow #" + rworkflow_id + " connot be retrieved in the available workflows!")
+        # if workflow is not in a running status
+        if workflow.get_status() in [Workflow.STATUS_COMPLETED, Workflow.STATUS_FAILED, Workflow.STATUS_ABORTED]:
+            workflow.delete()
+            with self.registry.transaction() as cursor:
+                self.registry.remove(cursor, rworkflow_id)
 
     def get_workflow_errors(self, workflow_id):
         workflow = self.get_workflow(workflow_id)
@@ -170,12 +247,7 @@ class WorkflowsManager(object):
     def get_workflows(self, use_cache=False):
         from jflow.workflow import Workflow
         workflows = []
-        try:
-            awfh = open(self.dump_file, "rb")
-            workflows_dump = pickle.load(awfh)
-            awfh.close()
-        except:
-            workflows_dump = {}
+        workflows_dump = self.registry.get_all()
         updated_workflows = []
         for workflow_id in workflows_dump:
             # is the workflow completed, failed or aborted use the miniworkflow cached
@@ -183,24 +255,22 @@ class WorkflowsManager(object):
                 workflows.append(workflows_dump[workflow_id]["object"])
             else:
                 try:
-                    workflow_dump = open(workflows_dump[workflow_id]["dump_path"], "rb")
-                    workflow = pickle.load(workflow_dump)
+                    # the journal gives the state without loading the whole workflow
+                    journal_path = os.path.join(os.path.dirname(workflows_dump[workflow_id]["dump_path"]), Workflow.JOURNAL_FILE_NAME)
+                    workflow = Workflow.minimize_from_journal(journal_path)
+                    if workflow is None: # workflow created before journaling
+                        workflow_dump = open(workflows_dump[workflow_id]["dump_path"], "rb")
+                        workflow = pickle.load(workflow_dump)
+                        workflow_dump.close()
                     workflows.append(workflow)
                     updated_workflows.append(workflow)
-                    workflow_dump.close()
                 except: pass
         self._dump_workflows(updated_workflows)
         return workflows
 
     def get_workflow_by_class(self, workflow_class):
-        # Load all modules within the workflow module
-        for importer, modname, ispkg in pkgutil.iter_modules(workflows.__path__, workflows.__name__ + "."):
-            __import__(modname)
-            # Search for Workflow classes
-            for class_name, obj in inspect.getmembers(sys.modules[modname], inspect.isclass):
-                if class_name == workflow_class:
-                    return obj()
-        return None
+        obj = self.get_workflow_class(workflow_class)
+        return None if obj is None else obj()
 
     def get_workflow_by_name(self, workflow_name):
         """
@@ -218,14 +288,9 @@ class WorkflowsManager(object):
 
     def get_workflow(self, workflow_id):
         rworkflow_id = utils.get_nb_string(workflow_id)
-        try:
-            wdfh = open(self.dump_file, "rb")
-            workflows_dump = pickle.load(wdfh)
-            wdfh.close()
-        except:
-            workflows_dump = {}
-        if rworkflow_id in workflows_dump:
-            workflow_dump = open(workflows_dump[rworkflow_id]["dump_path"], "rb")
+        registered = self.registry.get(rworkflow_id)
+        if registered is not None:
+            workflow_dump = open(registered["dump_path"], "rb")
             workflow = pickle.load(workflow_dump)
             workflow_dump.close()
         else:
@@ -238,18 +303,4 @@ class WorkflowsManager(object):
                                          self.WF_DIRECTORY_PREFIX + utils.get_nb_string(wid))
 
     def get_next_id(self):
-        def next_id_func():
-            if os.path.isfile(self.ids_file):
-                ifh = open(self.ids_file)
-                cid = int(ifh.readline().strip())
-                ifh.close()
-                ifh = open(self.ids_file, "w")
-                ifh.write(str(cid+1))
-                ifh.close()
-                return cid+1
-            else:
-                ifh = open(self.ids_file, "w")
-                ifh.write("1")
-                ifh.close()
-                return 1
-        return concurrent.exec_on_shared( next_id_func, self.ids_file, self.config_reader.get_tmp_directory(), metadata={"action": "Get wf ID"} )
+        return self.registry.get_next_id()
@@ -64,7 +64,7 @@ def depth_first_search(graph, root=None, filter=null()):
         pre.append(node)
         # Explore recursively the connected component
         for each in graph[node]:
-            if (each not in visited and list(filter(each, node))):
+            if (each not in visited and filter(each, node)):
                 spanning_tree[each] = node
                 dfs(each)
         post.append(node)
@@ -77,7 +77,7 @@ def depth_first_search(graph, root=None, filter=null()):
 
     # DFS from one node only
     if (root is not None):
-        if list(filter(root, None)):
+        if filter(root, None):
             spanning_tree[root] = None
             dfs(root)
         setrecursionlimit(recursionlimit)
@@ -86,7 +86,7 @@ def depth_first_search(graph, root=None, filter=null()):
     # Algorithm loop
     for each in graph:
         # Select a non-visited node
-        if (each not in visited and list(filter(each, None))):
+        if (each not in visited and filter(each, None)):
             spanning_tree[each] = None
             # Explore node's connected component
             dfs(each)
@@ -122,7 +122,7 @@ def breadth_first_search(graph, root=None, filter=null()):
             node = queue.pop(0)
             
             for other in graph[node]:
-                if (other not in spanning_tree and list(filter(other, node))):
+                if (other not in spanning_tree and filter(other, node)):
                     queue.append(other)
                     ordering.append(other)
                     spanning_tree[other] = node
@@ -134,7 +134,7 @@ def breadth_first_search(graph, root=None, filter=null()):
     
     # BFS from one node only
     if (root is not None):
-        if list(filter(root, None)):
+        if filter(root, None):
             queue.append(root)
             ordering.append(root)
             spanning_tree[root] = None
@@ -144,7 +144,7 @@ def breadth_first_search(graph, root=None, filter=null()):
     # Algorithm
     for each in graph:
         if (each not in spanning_tree):
-            if list(filter(each, None)):
+            if filter(each, None):
                 queue.append(each)
                 ordering.append(each)
                 spanning_tree[each] = None
@@ -61,6 +61,9 @@ class Abstraction(Dataset):
         Dataset.__init__(self)
         self.symbol     = self.nest.symbol
         self.batch      = self.nest.batch
+        self.cpu        = self.nest.cpu
+        self.memory     = self.nest.memory
+        self.group      = self.group or self.nest.group
         
         if collect:
             self.collect = parse_input_list(self.inputs)
@@ -74,6 +77,8 @@ class Abstraction(Dataset):
     def compile(self):
         self.nest.symbol = self.symbol
         self.nest.batch = self.batch
+        self.nest.cpu = self.cpu
+        self.nest.memory = self.memory
         """ Compile Abstraction to produce scheduled tasks. """
         debug(D_ABSTRACTION, 'Compiling Abstraction {0}'.format(self))
         for _ in self:
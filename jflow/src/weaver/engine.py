@@ -47,6 +47,8 @@ class Makeflow(Engine):
         self.wrapper     = wrapper or ''
         self.exports     = set()
         self.variables   = {}
+        # Functions wrapping the commands of the tasks by symbol
+        self.command_wrappers = {}
 
         # Keep track of inputs and outputs.
         self.track_imports = track_imports
@@ -78,6 +80,10 @@ class Makeflow(Engine):
             command, ', '.join(map(str, inputs)), ', '.join(map(str, outputs)),
             options))
 
+        # Wrap task command (a sub DAG wraps the commands of its own tasks)
+        if symbol in self.command_wrappers and not command.startswith('MAKEFLOW '):
+            command = self.command_wrappers[symbol](command, inputs, outputs)
+
         # Write task outputs and inputs
         self.dag_file.write('{0}: {1}\n'.format(
             ' '.join(map(str, outputs)), ' '.join(map(str, inputs))))
@@ -98,6 +104,11 @@ class Makeflow(Engine):
             self.dag_file.write('@BATCH_LOCAL=1\n')
         if options.batch:
             self.dag_file.write('@BATCH_OPTIONS={0}\n'.format(options.batch))
+        # Resources of the task (cores and memory in MB) used by makeflow
+        if options.cpu:
+            self.dag_file.write('@CORES={0}\n'.format(options.cpu))
+        if options.memory:
+            self.dag_file.write('@MEMORY={0}\n'.format(options.memory))
         if options.collect:
             self.dag_file.write('@_MAKEFLOW_COLLECT_LIST+={0}\n'.format(
                 ' '.join(map(str, options.collect))))
@@ -89,6 +89,12 @@ class Function(object):
         if nest.batch:
             options.batch = nest.batch
 
+        if nest.cpu:
+            options.cpu = nest.cpu
+
+        if nest.memory:
+            options.memory = nest.memory
+
         nest.schedule(abstraction, self, command,
             list(inputs) + list(includes), outputs, options, nest.symbol)
 
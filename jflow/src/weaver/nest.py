@@ -45,6 +45,11 @@ class Nest(Makeflow):
         self.parent   = CurrentNest()
         self.symbol   = None
         self.batch    = ""
+        self.group    = 0
+        self.cpu      = None
+        self.memory   = None
+        # Function ordering the tasks before their emission
+        self.tasks_sorter = None
         
         if self.parent:
             self.work_dir = os.path.join(self.parent.work_dir, self.work_dir)
@@ -127,7 +132,8 @@ class Nest(Makeflow):
         """ Group tasks by abstraction and function and then break them into
         sub-groups and schedule the sub-groups has sub DAGs.
         """
-        if CurrentScript().inline_tasks <= 1:
+        if CurrentScript().inline_tasks <= 1 and \
+            not any(task[0].group > 1 for task in self.tasks):
             return
 
         debug(D_NEST, 'Inlining tasks for {0}'.format(self))
@@ -144,18 +150,39 @@ class Nest(Makeflow):
         self.tasks = []
         for (abstraction, function), tasks in list(task_dict.items()):
             inline_tasks = max(CurrentScript().inline_tasks, abstraction.group)
-            if inline_tasks < len(tasks):
-                for group in groups(tasks, inline_tasks):
-                    with InlineNest() as inline_nest:
-                        for task in group:
-                            inline_nest.schedule(*task)
-                        inline_nest.compile()
-                    with abstraction.options:
-                        inline_nest()
+            if 1 < inline_tasks < len(tasks):
+                # The task running the sub DAG keeps the symbol, the batch
+                # options and the resources of the grouped tasks. They are
+                # read from the current Nest when the sub DAG is scheduled,
+                # so the values of the Nest are restored after the group.
+                nest_settings = (self.symbol, self.batch, self.cpu, self.memory)
+                self.symbol = tasks[0][6]
+                self.batch  = tasks[0][5].batch
+                self.cpu    = tasks[0][5].cpu
+                self.memory = tasks[0][5].memory
+                try:
+                    for group in groups(tasks, inline_tasks):
+                        with InlineNest() as inline_nest:
+                            for task in group:
+                                inline_nest.schedule(*task)
+                            inline_nest.compile()
+                        with abstraction.options:
+                            inline_nest()
+                finally:
+                    self.symbol, self.batch, self.cpu, self.memory = nest_settings
             else:
                 for task in tasks:
                     self.tasks.append(task)
 
+    def _sort_tasks(self):
+        """ Order tasks with the tasks sorter of the Nest (the grouped tasks
+        are taken in this order and the engine submits the first ready tasks
+        first).
+        """
+        if self.tasks_sorter is not None:
+            debug(D_NEST, 'Sorting tasks for {0}'.format(self))
+            self.tasks = self.tasks_sorter(self.tasks)
+
     def compile(self):
         """ Compile Abstractions to generate tasks and output file lists. """
         # Compile Abstractions and SubNests to ensure they have generated
@@ -172,7 +199,9 @@ class Nest(Makeflow):
         # Perform optimizations.
         debug(D_NEST, 'Optimizing tasks for {0}'.format(self))
         self._optimize_nested_abstractions()
+        self._sort_tasks()
         self._optimize_inline_tasks()
+        self._sort_tasks()
 
         # Emit stored tasks to workflow DAG using engine.
         debug(D_NEST, 'Emitting tasks for {0}'.format(self))
@@ -216,7 +245,8 @@ class InlineNest(Nest):
     """ Weaver InlineNest class. """
     def __init__(self):
         Nest.__init__(self, work_dir='.', dag_path=next(CurrentNest().stash),
-            stash=CurrentNest().stash)
+            stash=CurrentNest().stash, path=CurrentNest().path)
+        self.command_wrappers = CurrentNest().command_wrappers
 
 
 # Define and export functions
@@ -18,7 +18,7 @@
 __author__ = 'Charles Van Goethem and Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.1.0'
+__version__ = '1.4.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -30,13 +30,26 @@ import argparse
 import subprocess
 
 from workflows.src.miamsWorkflows import MIAmSWf
+from workflows.src.profilesStore import ProfilesStore, getFileStat, getFingerprint
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 LIB_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "lib")
 sys.path.insert(0, LIB_DIR)
 
 from anacore.msiannot import MSIAnnot
-from anacore.msi import getIncompleteModels
+from anacore.msi import getIncompleteModels, MSIReport
+
+
+def getAnalyzersFolder(baseline):
+    """
+    Return the path to the folder containing the MSI analyzer results of the samples used in the mSINGS baseline. This folder is written next to the baseline and it allows to update the baseline without processing the samples again.
+
+    :param baseline: Path to the mSINGS baseline.
+    :type baseline: str
+    :return: Path to the folder.
+    :rtype: str
+    """
+    return os.path.splitext(baseline)[0] + "_analyzers"
 
 
 class MIAmSLearn (MIAmSWf):
@@ -50,6 +63,7 @@ class MIAmSLearn (MIAmSWf):
     def define_parameters(self, parameters_section=None):
         self.add_parameter("min_support_reads", "Minimum number of reads in size distribution to keep the locus result of a sample in reference distributions.", default=300, type=int)
         self.add_parameter("min_support_samples", "Minimum number of samples in MSS models and in MSI models.", default=10, type=int)
+        self.add_parameter("compaction_size", "The maximum number of references by locus and by status in the training samples. Above this number the references are merged in weighted prototypes (identical distributions then k-medoids). It bounds the fit time of the classifiers in MIAmS_tag. By default the references are not compacted.", type=int)
 
         # Combine reads method
         self.add_parameter("max_mismatch_ratio", "Maximum allowed ratio between the number of mismatched base pairs and the overlap length. Two reads will not be combined with a given overlap if that overlap results in a mismatched base density higher than this value.", default=0.25, type=float, group="Combine reads method")
@@ -73,6 +87,13 @@ class MIAmSLearn (MIAmSWf):
         self.add_input_file("intervals", "MSI intervals file (format: TSV). See mSINGS create_intervals script.", required=True, group="Inputs design")
         self.add_input_file("genome_seq", "Path to the reference used to generate alignment files (format: fasta). This genome must be indexed (fai) and chromosomes names must not be prefixed by chr.", required=True, file_format="fasta", group="Inputs design")
 
+        # Inputs base model
+        self.add_input_file("base_training", "Path to the training samples file produced by a previous execution (format: JSON). Only the samples provided in R1 and R2 are processed and they are added to these training samples. The previous samples with the same name are replaced.", rules="ToBeRequired=base_baseline", group="Inputs base model")
+        self.add_input_file("base_baseline", "Path to the mSINGS model file produced by the previous execution (format: TSV). The MSI analyzer results of its samples are read in the folder <baseline_without_extension>_analyzers written next to this file since MIAmS_learn 1.3.0. The loci of these samples without the status MSS in annotations are filtered again but the loci filtered in the previous execution are not restored.", rules="ToBeRequired=base_training", group="Inputs base model")
+
+        # Profiles store
+        self.add_parameter("profiles_store", "Path to the folder storing the profiles of the samples (lengths distributions of the combined pairs). The profiles are identified by the content of the reads files, the design files and the reads processing parameters. The reads of the samples already stored are only aligned for the mSINGS baseline (MSS samples) and the new samples are added in store.", group="Profiles store")
+
         # Outputs data
         self.add_parameter("output_baseline", "Path to the mSINGS model file (format: TSV).", required=True, group="Output data")
         self.add_parameter("output_training", "Path to the training samples file (format: JSON).", required=True, group="Output data")
@@ -130,30 +151,95 @@ class MIAmSLearn (MIAmSWf):
             self.samples_names.append(selected_name)
             del(unordered_spl_names[selected_idx])
 
+        # Get MSI analyzer results of the base samples
+        self.base_analyzers = []
+        if self.base_baseline != None:
+            base_analyzers_folder = getAnalyzersFolder(self.base_baseline)
+            if not os.path.isdir(base_analyzers_folder):
+                raise Exception('The folder "{}" containing the MSI analyzer results of the base samples cannot be found. The baseline "{}" cannot be updated.'.format(base_analyzers_folder, self.base_baseline))
+            for filename in sorted(os.listdir(base_analyzers_folder)):
+                if filename.endswith(".msi.txt") and filename[:-len(".msi.txt")] not in self.samples_names:
+                    self.base_analyzers.append(os.path.join(base_analyzers_folder, filename))
+
+        # Get samples profiles from store
+        self.loaded_reports = [None for spl_name in self.samples_names]
+        if self.profiles_store is not None:
+            self.loadStoredProfiles()
+
+    def getProfilesFingerprints(self):
+        """
+        Return the key of the profiles of each sample in the profiles store.
+
+        :return: The fingerprint of each sample in samples_names order.
+        :rtype: list
+        """
+        params = {
+            "workflow": "MIAmS_learn",
+            "cleaning": [0.01, 10],
+            "genome_seq": getFileStat(self.genome_seq),
+            "max_mismatch_ratio": self.max_mismatch_ratio,
+            "min_pair_overlap": self.min_pair_overlap,
+            "min_zoi_overlap": self.min_zoi_overlap
+        }
+        design_files = [self.R1_end_adapter, self.R2_end_adapter, self.targets]
+        return [getFingerprint([curr_R1, curr_R2] + design_files, params) for curr_R1, curr_R2 in zip(self.R1, self.R2)]
+
+    def loadStoredProfiles(self):
+        """
+        Set the profiles of the samples already present in the profiles store.
+        """
+        store = ProfilesStore(self.profiles_store)
+        self.profiles_keys = self.getProfilesFingerprints()
+        loaded_folder = os.path.join(self.directory, "loaded_pairs")
+        for spl_idx, (spl_name, key) in enumerate(zip(self.samples_names, self.profiles_keys)):
+            stored_pairs = store.get(key, "pairs")
+            if stored_pairs is not None:
+                if not os.path.exists(loaded_folder):
+                    os.mkdir(loaded_folder)
+                spl = MSIReport.parse(stored_pairs)[0]
+                spl.name = spl_name
+                self.loaded_reports[spl_idx] = os.path.join(loaded_folder, spl_name + "_report.json")
+                MSIReport.write([spl], self.loaded_reports[spl_idx])
+
     def process(self):
+        # The profiles are produced for the samples not already loaded and the reads of the MSS samples are aligned for the baseline
+        self.processed_idx = [spl_idx for spl_idx, curr_report in enumerate(self.loaded_reports) if curr_report is None]
+        aligned_idx = [spl_idx for spl_idx, spl_name in enumerate(self.samples_names) if self.loaded_reports[spl_idx] is None or spl_name in self.with_MSS]
+        aligned_names = [self.samples_names[spl_idx] for spl_idx in aligned_idx]
+
         # Clean reads
-        cleaned_R1 = self.R1
+        cleaned_R1 = [self.R1[spl_idx] for spl_idx in aligned_idx]
         if self.R1_end_adapter != None:
-            clean_R1 = self.add_component("Cutadapt", ["a", self.R1_end_adapter, self.R1, None, 0.01, 10], component_prefix="R1")
+            clean_R1 = self.add_component("Cutadapt", ["a", self.R1_end_adapter, cleaned_R1, None, 0.01, 10], component_prefix="R1")
             cleaned_R1 = clean_R1.out_R1
-        cleaned_R2 = self.R2
+        cleaned_R2 = [self.R2[spl_idx] for spl_idx in aligned_idx]
         if self.R2_end_adapter != None:
-            clean_R2 = self.add_component("Cutadapt", ["a", self.R2_end_adapter, self.R2, None, 0.01, 10], component_prefix="R2")
+            clean_R2 = self.add_component("Cutadapt", ["a", self.R2_end_adapter, cleaned_R2, None, 0.01, 10], component_prefix="R2")
             cleaned_R2 = clean_R2.out_R1
 
         # Align reads
-        bwa = self.add_component("BWAmem", [self.genome_seq, cleaned_R1, cleaned_R2, self.samples_names])
+        bwa = self.add_component("BWAmem", [self.genome_seq, cleaned_R1, cleaned_R2, aligned_names])
         idx_aln = self.add_component("BAMIndex", [bwa.aln_files])
 
         # Create baseline for mSINGS with create_baseline.py
-        MSS_aln = [idx_aln.out_aln[spl_idx] for spl_idx, spl_name in enumerate(self.samples_names) if spl_name in self.with_MSS]
-        self.baseline_cmpt = self.add_component("MSINGSBaseline", [MSS_aln, self.targets, self.intervals, self.genome_seq, self.converted_annotations])
+        MSS_aln = [idx_aln.out_aln[aln_idx] for aln_idx, spl_name in enumerate(aligned_names) if spl_name in self.with_MSS]
+        self.baseline_cmpt = self.add_component("MSINGSBaseline", [MSS_aln, self.targets, self.intervals, self.genome_seq, self.converted_annotations, self.base_analyzers])
 
         # Create models from pairs combination
-        on_targets = self.add_component("BamAreasToFastq", [idx_aln.out_aln, self.targets, self.min_zoi_overlap, True, cleaned_R1, cleaned_R2])
-        combine = self.add_component("CombinePairs", [on_targets.out_R1, on_targets.out_R2, None, self.max_mismatch_ratio, self.min_pair_overlap])
-        gather_locus = self.add_component("GatherLocusRes", [combine.out_report, self.targets, self.samples_names, "model", "LocusResPairsCombi"])
-        self.training_cmpt = self.add_component("CreateMSIRef", [gather_locus.out_report, self.targets, self.converted_annotations, self.min_support_reads / 2])
+        self.pairs_reports = list(self.loaded_reports)
+        if len(self.processed_idx) != 0:
+            processed_aln_idx = [aligned_idx.index(spl_idx) for spl_idx in self.processed_idx]
+            processed_R1 = [cleaned_R1[aln_idx] for aln_idx in processed_aln_idx]
+            processed_R2 = [cleaned_R2[aln_idx] for aln_idx in processed_aln_idx]
+            processed_aln = [idx_aln.out_aln[aln_idx] for aln_idx in processed_aln_idx]
+            idx_R1 = self.add_component("IndexFastq", [processed_R1], component_prefix="R1")
+            idx_R2 = self.add_component("IndexFastq", [processed_R2], component_prefix="R2")
+            on_targets = self.add_component("BamAreasToFastq", [processed_aln, self.targets, self.min_zoi_overlap, True, idx_R1.out_reads, idx_R2.out_reads, idx_R1.out_index, idx_R2.out_index])
+            combine = self.add_component("CombinePairs", [on_targets.out_R1, on_targets.out_R2, None, self.max_mismatch_ratio, self.min_pair_overlap, None, None, None, on_targets.repeated_targets, on_targets.samples])
+            gather_locus = self.add_component("GatherLocusRes", [combine.out_report, self.targets, [self.samples_names[spl_idx] for spl_idx in self.processed_idx], "model", "LocusResPairsCombi"])
+            for spl_idx, curr_report in zip(self.processed_idx, gather_locus.out_report):
+                self.pairs_reports[spl_idx] = curr_report
+        self.training_cmpt = self.add_component("CreateMSIRef", [self.pairs_reports, self.targets, self.converted_annotations, self.min_support_reads / 2, self.base_training, self.compaction_size])
 
     def post_process(self):
         # Check number of samples supporting all models
@@ -166,3 +252,18 @@ class MIAmSLearn (MIAmSWf):
         # Copy final results
         shutil.copy(self.baseline_cmpt.baseline, self.output_baseline)
         shutil.copy(self.training_cmpt.out_references, self.output_training)
+        analyzers_folder = getAnalyzersFolder(self.output_baseline)
+        tmp_analyzers_folder = analyzers_folder + "_tmp"  # The base analyzers can be in analyzers_folder
+        if os.path.exists(tmp_analyzers_folder):
+            shutil.rmtree(tmp_analyzers_folder)
+        os.mkdir(tmp_analyzers_folder)
+        for curr_analyzer in self.base_analyzers + list(self.baseline_cmpt.analyzers):
+            shutil.copy(curr_analyzer, os.path.join(tmp_analyzers_folder, os.path.basename(curr_analyzer)))
+        if os.path.exists(analyzers_folder):
+            shutil.rmtree(analyzers_folder)
+        os.rename(tmp_analyzers_folder, analyzers_folder)
+        # Add new profiles in store
+        if self.profiles_store is not None:
+            store = ProfilesStore(self.profiles_store)
+            for spl_idx in self.processed_idx:
+                store.add(self.profiles_keys[spl_idx], "pairs", self.pairs_reports[spl_idx])
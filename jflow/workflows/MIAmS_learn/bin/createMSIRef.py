@@ -19,7 +19,7 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.0.0'
+__version__ = '1.3.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -74,7 +74,7 @@ def writeStatusMetrics(msi_samples, result_id, out_summary):
                 status_by_locus[locus_id] = {status: 0 for status in authorized_status}  # init each status for the current locus
             if result_id in locus.results:
                 status = locus.results[result_id].status
-                status_by_locus[locus_id][status] += 1
+                status_by_locus[locus_id][status] += locus.results[result_id].getWeight()
     # Write results
     with open(out_summary, "w") as FH_out:
         FH_out.write("Nb retained samples: {}\n".format(len(msi_samples)))
@@ -140,6 +140,191 @@ def pruneResults(msi_samples, result_id, min_support_fragments):
         del(msi_samples[spl_idx])
 
 
+def getRepresentedSamples(spl, locus_res):
+    """
+    Return the names of the samples represented by the result: the samples merged in the prototype for the compacted references (see compactReferences) otherwise the sample of the result.
+
+    :param spl: The sample containing the result.
+    :type spl: MSISample
+    :param locus_res: The result.
+    :type locus_res: LocusRes
+    :return: The names of the represented samples.
+    :rtype: list
+    """
+    if "samples" in locus_res.data:
+        return locus_res.data["samples"]
+    if locus_res.getWeight() != 1:
+        raise ValueError('The result of the locus in "{}" represents {} samples but their names are missing. These references have been compacted by an older version of {}.'.format(spl.name, locus_res.getWeight(), __file__))
+    return [spl.name]
+
+
+def getBaseSamples(in_base_references, new_samples):
+    """
+    Return the samples of the previous references without the samples present in the new samples (comparison on names). In the prototypes of compacted references, only the replaced samples are removed from the represented samples and from the weight. The prototype keeps its lengths distribution even if its medoid is replaced and it is removed when all its samples are replaced.
+
+    :param in_base_references: Path to the references produced by a previous execution (format: MSIReport).
+    :type in_base_references: str
+    :param new_samples: The new samples.
+    :type new_samples: list of MSISample
+    :return: List of MSISample.
+    :rtype: list
+    """
+    new_names = {spl.name for spl in new_samples}
+    base_samples = []
+    for spl in MSIReport.parse(in_base_references):
+        nb_results = 0
+        for locus in spl.loci.values():
+            for result_id, locus_res in list(locus.results.items()):
+                represented_samples = getRepresentedSamples(spl, locus_res)
+                kept_samples = [name for name in represented_samples if name not in new_names]
+                if len(kept_samples) == 0:
+                    locus.delResult(result_id)
+                else:
+                    nb_results += 1
+                    if len(kept_samples) != len(represented_samples):
+                        locus_res.data["samples"] = kept_samples
+                        locus_res.data["weight"] = len(kept_samples)
+        if nb_results != 0:
+            base_samples.append(spl)
+    return base_samples
+
+
+def getWassersteinDistances(profiles):
+    """
+    Return the Wasserstein distances (sum of the absolute differences between the cumulative distributions) between the lengths distributions.
+
+    :param profiles: The lengths distributions on the same lengths. Rows are samples, columns are lengths and values are percentages.
+    :type profiles: np.array
+    :return: The distances between each couple of distributions.
+    :rtype: np.array
+    """
+    import numpy as np
+    cdf = np.cumsum(profiles, axis=1) / 100
+    distances = np.empty((cdf.shape[0], cdf.shape[0]))
+    for row_idx in range(cdf.shape[0]):  # By row to limit memory consumption
+        distances[row_idx] = np.abs(cdf - cdf[row_idx]).sum(axis=1)
+    return distances
+
+
+def getMedoids(distances, weights, nb_medoids, max_iter=100):
+    """
+    Return the medoids of the weighted k-medoids clustering and the medoid of each element. The medoids are initialized by the greedy BUILD step of PAM then they are updated by alternating the assignment of the elements to the nearest medoid and the selection of the medoid of each cluster.
+
+    :param distances: The distances between each couple of elements.
+    :type distances: np.array
+    :param weights: The weight of each element.
+    :type weights: np.array
+    :param nb_medoids: The number of medoids.
+    :type nb_medoids: int
+    :param max_iter: The maximum number of update iterations.
+    :type max_iter: int
+    :return: The indexes of the medoids and for each element the index of its medoid in medoids.
+    :rtype: (list, np.array)
+    """
+    import numpy as np
+    # Initialization
+    medoids = [int(np.argmin(distances.dot(weights)))]
+    nearest_distances = distances[:, medoids[0]]
+    while len(medoids) < nb_medoids:
+        gains = np.maximum(nearest_distances[:, np.newaxis] - distances, 0).T.dot(weights)
+        gains[medoids] = -1
+        medoids.append(int(np.argmax(gains)))
+        nearest_distances = np.minimum(nearest_distances, distances[:, medoids[-1]])
+    # Update
+    for iteration in range(max_iter):
+        assignments = np.argmin(distances[:, medoids], axis=1)
+        new_medoids = []
+        for cluster_idx in range(len(medoids)):
+            members = np.where(assignments == cluster_idx)[0]
+            if len(members) == 0:  # Medoid at distance 0 of an other medoid
+                continue
+            members_costs = distances[np.ix_(members, members)].dot(weights[members])
+            new_medoids.append(int(members[np.argmin(members_costs)]))
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+    assignments = np.argmin(distances[:, medoids], axis=1)
+    medoids = [medoids[cluster_idx] for cluster_idx in sorted(set(assignments.tolist()))]  # Remove the empty clusters
+    return medoids, np.argmin(distances[:, medoids], axis=1)
+
+
+def compactLocusResults(locus_results, max_size):
+    """
+    Return the prototypes representing the results. The results with the same lengths distribution (in percentage) are merged and if their number is still upper than max_size the distributions are grouped by weighted k-medoids on their Wasserstein distances. Each prototype is the result of the medoid.
+
+    :param locus_results: The results of one locus with the same status.
+    :type locus_results: list of LocusResDistrib
+    :param max_size: The maximum number of prototypes.
+    :type max_size: int
+    :return: For each prototype the index of its result in locus_results and the indexes of the results it represents.
+    :rtype: list
+    """
+    import numpy as np
+    min_len = min(res.getMinLength() for res in locus_results)
+    max_len = max(res.getMaxLength() for res in locus_results)
+    # Merge identical distributions
+    uniq_idx_by_profile = {}
+    uniq_idx = []
+    uniq_members = []
+    uniq_weights = []
+    uniq_profiles = []
+    for res_idx, res in enumerate(locus_results):
+        profile = tuple(round(elt, 9) for elt in res.getDensePrct(min_len, max_len))
+        if profile in uniq_idx_by_profile:
+            uniq_members[uniq_idx_by_profile[profile]].append(res_idx)
+            uniq_weights[uniq_idx_by_profile[profile]] += res.getWeight()
+        else:
+            uniq_idx_by_profile[profile] = len(uniq_idx)
+            uniq_idx.append(res_idx)
+            uniq_members.append([res_idx])
+            uniq_weights.append(res.getWeight())
+            uniq_profiles.append(profile)
+    if len(uniq_idx) <= max_size:
+        return list(zip(uniq_idx, uniq_members))
+    # Group near distributions
+    medoids, assignments = getMedoids(getWassersteinDistances(np.array(uniq_profiles)), np.array(uniq_weights), max_size)
+    prototypes = []
+    for cluster_idx, medoid in enumerate(medoids):
+        members = []
+        for uniq_pos in np.where(assignments == cluster_idx)[0]:
+            members.extend(uniq_members[uniq_pos])
+        prototypes.append((uniq_idx[medoid], members))
+    return prototypes
+
+
+def compactReferences(msi_samples, result_id, max_size):
+    """
+    Replace the results of each locus and status by at most max_size weighted prototypes (see compactLocusResults). The weight of a prototype is stored in data["weight"] of its result with the names of the represented samples in data["samples"] (see getBaseSamples) and the results merged in the prototype are removed. The samples without result are removed.
+
+    :param msi_samples: The compacted samples.
+    :type msi_samples: list of MSISample
+    :param result_id: The method on which the compaction is applied.
+    :type result_id: str
+    :param max_size: The maximum number of references by locus and by status.
+    :type max_size: int
+    """
+    loci_ids = set()
+    for spl in msi_samples:
+        loci_ids |= set(spl.loci.keys())
+    for locus_id in sorted(loci_ids):
+        for status in [Status.stable, Status.unstable]:
+            selected_spl = [spl for spl in msi_samples if locus_id in spl.loci and result_id in spl.loci[locus_id].results and spl.loci[locus_id].results[result_id].status == status]
+            if len(selected_spl) > max_size:
+                selected_res = [spl.loci[locus_id].results[result_id] for spl in selected_spl]
+                represented_samples = [getRepresentedSamples(spl, res) for spl, res in zip(selected_spl, selected_res)]
+                members_by_spl_idx = dict(compactLocusResults(selected_res, max_size))
+                for spl_idx, spl in enumerate(selected_spl):
+                    if spl_idx in members_by_spl_idx:
+                        members = members_by_spl_idx[spl_idx]
+                        selected_res[spl_idx].data["weight"] = sum(selected_res[member_idx].getWeight() for member_idx in members)
+                        selected_res[spl_idx].data["samples"] = [name for member_idx in members for name in represented_samples[member_idx]]
+                    else:
+                        spl.loci[locus_id].delResult(result_id)
+    removed_spl_idx = [spl_idx for spl_idx, spl in enumerate(msi_samples) if all(result_id not in locus.results for locus in spl.loci.values())]
+    for spl_idx in sorted(removed_spl_idx)[::-1]:
+        del(msi_samples[spl_idx])
+
+
 def process(args):
     """
     Create training data for MSI classifiers. These references are stored in
@@ -173,7 +358,14 @@ def process(args):
         addLociResToSpl(curr_spl, data_by_spl[curr_spl.name], LocusResPairsCombi)
     # Filter locus results
     populateLoci(msi_samples, ref_loci)
+    base_samples = [] if args.input_base_references is None else getBaseSamples(args.input_base_references, msi_samples)
     pruneResults(msi_samples, result_id, args.min_support_fragments)
+    # Add previous references
+    populateLoci(base_samples, ref_loci)
+    msi_samples = base_samples + msi_samples
+    # Merge similar references
+    if args.compaction_size is not None:
+        compactReferences(msi_samples, result_id, args.compaction_size)
     # Display metrics
     writeStatusMetrics(msi_samples, result_id, args.output_info)
     # Write output
@@ -189,10 +381,12 @@ if __name__ == "__main__":
     # Manage parameters
     parser = argparse.ArgumentParser(description='Create training data for MSI classifiers. These references are stored in MSIReport format. All the loci are represented in all samples but all the loci does not have a result (if the data does not fit filters criteria).')
     parser.add_argument('-s', '--min-support-fragments', type=int, default=200, help='Minimum number of fragment in size distribution to keep the result. The distribution must contains a sufficient amount of data to be representative of length distribution profile for the current locus. [Default: %(default)s]')
+    parser.add_argument('-c', '--compaction-size', type=int, help='The maximum number of references by locus and by status. Above this number the references are merged in weighted prototypes: the identical lengths distributions are merged then the distributions are grouped by k-medoids on their Wasserstein distances. The weight of each prototype is stored in its result and it is used in the fit of the classifiers. This option bounds the fit time of the classifiers in MIAmS_tag. [Default: no compaction]')
     parser.add_argument('-v', '--version', action='version', version=__version__)
     group_input = parser.add_argument_group('Inputs')  # Inputs
     group_input.add_argument('-r', '--inputs-report', required=True, nargs='+', help='Path(es) to the file(s) evaluated in references creation process (format: MSIReport).')
     group_input.add_argument('-l', '--input-loci-annot', required=True, help='Path to the file containing for each sample for each targeted locus the stability status (format: MSIAnnot). First line must be: sample<tab>locus_position<tab>method_id<tab>key<tab>value<tab>type. The method_id should be "model" and an example of line content is: H2291-1_S15<tab>4:55598140-55598290<tab>model<tab>status<tab>MSS<tab>str.')
+    group_input.add_argument('-b', '--input-base-references', help='The path to the references produced by a previous execution (format: MSIReport). Its samples are added in the new references except those with the same name as an input sample.')
     group_input.add_argument('-t', '--input-targets', required=True, help='The locations of the microsatellite of interest (format: BED).')
     group_output = parser.add_argument_group('Outputs')  # Outputs
     group_output.add_argument('-o', '--output-references', required=True, help='The path to the file containing the references distribution for each locus (format: MSIReport).')
@@ -20,7 +20,7 @@
 __author__ = 'Charles Van Goethem and Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018'
 __license__ = 'Academic License Agreement'
-__version__ = '1.2.0'
+__version__ = '1.3.1'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -75,6 +75,25 @@ def invalidateLoci(filtered_loci, in_analyzer, out_anlyzer):
                 writer.writerow(row)
 
 
+def filterAnalyzer(sample_name, analyzer_path, in_annot, working_directory, log):
+    """
+    @summary: Invalidates in the MSI analyzer file the loci of the sample without the status MSS in annotations.
+    @param sample_name: [str] The name of the sample selected in annotations file.
+    @param analyzer_path: [str] The path of the mSINGS analyze file. It is replaced by the filtered file.
+    @param in_annot: [str] Path to the MSIAnnot file containing for each sample for each targeted locus the stability status (format: TSV).
+    @param working_directory: [str] The folder of the temporary files.
+    @param log: [Logger] The logger of the script.
+    """
+    log.info("[{}] Start filter targets".format(sample_name))
+    invalid_loci = getLociWithoutStatus(sample_name, in_annot, "MSS")
+    if len(invalid_loci) > 0:
+        log.info("[{}] Loci filtered in sample: {}".format(sample_name, sorted(invalid_loci)))
+        filter_output = os.path.join(working_directory, sample_name + ".filtered.txt")
+        invalidateLoci(invalid_loci, analyzer_path, filter_output)
+        copyfile(filter_output, analyzer_path)
+    log.info("[{}] End filter targets".format(sample_name))
+
+
 def getSoftwarePath(software, expected_folder):
     """
     @summary: Returns the path to the software from the expected_folder if it is present or from the PATH environment variable.
@@ -121,6 +140,15 @@ def process(args, log):
     if not os.path.exists(working_directory):
         os.makedirs(working_directory)
 
+    # Samples previously processed
+    for curr_analyzer_path in args.inputs_base_analyzer:
+        sample_name = os.path.basename(curr_analyzer_path)[:-len(".msi.txt")]
+        log.info("[{}] Use previous MSI analyzer".format(sample_name))
+        base_analyzer = os.path.join(working_directory, os.path.basename(curr_analyzer_path))
+        copyfile(curr_analyzer_path, base_analyzer)
+        if args.input_annotations is not None:  # The annotations of the sample can have changed since the previous execution
+            filterAnalyzer(sample_name, base_analyzer, args.input_annotations, working_directory, log)
+
     for curr_aln_path in args.inputs_aln:
         sample_name = os.path.basename(curr_aln_path).rsplit(".", 1)[0]
 
@@ -184,14 +212,7 @@ def process(args, log):
 
         # Filter targets
         if args.input_annotations is not None:
-            log.info("[{}] Start filter targets".format(sample_name))
-            invalid_loci = getLociWithoutStatus(sample_name, args.input_annotations, "MSS")
-            if len(invalid_loci) > 0:
-                log.info("[{}] Loci filtered in sample: {}".format(sample_name, sorted(invalid_loci)))
-                filter_output = os.path.join(working_directory, sample_name + ".filtered.txt")
-                invalidateLoci(invalid_loci, analyzer_output, filter_output)
-                copyfile(filter_output, analyzer_output)
-            log.info("[{}] End filter targets".format(sample_name))
+            filterAnalyzer(sample_name, analyzer_output, args.input_annotations, working_directory, log)
 
     # MSI call
     log.info("Start MSI create baseline")
@@ -205,6 +226,14 @@ def process(args, log):
     subprocess.check_call(cmd)
     log.info("End MSI create baseline")
 
+    # Keep analyzer results of the processed samples
+    if args.output_analyzers_dir is not None:
+        if not os.path.exists(args.output_analyzers_dir):
+            os.makedirs(args.output_analyzers_dir)
+        for curr_aln_path in args.inputs_aln:
+            analyzer_filename = os.path.basename(curr_aln_path).rsplit(".", 1)[0] + ".msi.txt"
+            copyfile(os.path.join(working_directory, analyzer_filename), os.path.join(args.output_analyzers_dir, analyzer_filename))
+
     # Clean temporaries
     for tmp_file in os.listdir(working_directory):
         os.remove(os.path.join(working_directory, tmp_file))
@@ -247,12 +276,14 @@ if __name__ == "__main__":
     group_input_exclusive = group_input.add_mutually_exclusive_group(required=True)
     group_input_exclusive.add_argument('-a', '--inputs-aln', nargs='+', help="The pathes of alignment file to evaluate (format: BAM). All BAMs must be ordered by coordinates and indexed.")
     group_input_exclusive.add_argument('-f', '--input-list', help="The path of the file listing the alignment files pathes (format: txt). All BAMs must be ordered by coordinates and indexed.")
+    group_input.add_argument('-b', '--input-base-list', help="The path of the file listing the MSI analyzer files of samples processed in a previous execution (format: txt). These files are named <sample>.msi.txt (see output-analyzers-dir). These samples are added in baseline without the processing of their alignment file. If input-annotations is used, the loci of these samples without the status MSS in annotations are filtered again. The loci filtered in the previous execution cannot be restored.")
     group_input.add_argument('-g', '--input-genome', required=True, help="Reference used to generate alignment file.(format: fasta). This genome must be indexed (fai) and chromosomes names must not be prefixed by chr.")
     group_input.add_argument('-i', '--input-intervals', required=True, help="MSI interval file (format: TSV). See mSINGS create_intervals script.")
     group_input.add_argument('-t', '--input-targets', required=True, help="The locations of the microsatellite tracts of interest (format: BED). This file must be sorted numerically and must not have a header line.")
     group_input.add_argument('-n', '--input-annotations', help='Path to the MSIAnnot file containing for each sample for each targeted locus the stability status (format: TSV). This file allows to filter loci used in each samples. First line must be: sample<tab>locus_position<tab>method_id<tab>key<tab>value<tab>type. An example of line content is: H2291-1_S15<tab>4:55598140-55598290<tab>model<tab>status<tab>MSS<tab>str.')
     group_output = parser.add_argument_group('Outputs')  # Outputs
     group_output.add_argument('-o', '--output-baseline', required=True, help="MSI baseline file generated for your analytic process on data generated using the same protocols (format: TSV). This file describes the average and standard deviation of the number of expected signal peaks at each locus, as calculated from an MSI negative population (blood samples or MSI negative tumors). See mSINGS create_baseline script.")
+    group_output.add_argument('-r', '--output-analyzers-dir', help="The folder where the MSI analyzer files of the processed samples are kept (format: TSV). Each file is named <sample>.msi.txt and it can be used in input-base-list in a next execution.")
     args = parser.parse_args()
 
     # Process
@@ -263,6 +294,10 @@ if __name__ == "__main__":
     log.info("Command: " + " ".join(sys.argv))
     if args.input_list is not None:
         with open(args.input_list) as FH_in:
-            args.inputs_aln = [elt.strip() for elt in FH_in.readlines() if elt != ""]
+            args.inputs_aln = [elt.strip() for elt in FH_in.readlines() if elt.strip() != ""]
+    args.inputs_base_analyzer = []
+    if args.input_base_list is not None:
+        with open(args.input_base_list) as FH_in:
+            args.inputs_base_analyzer = [elt.strip() for elt in FH_in.readlines() if elt.strip() != ""]
     process(args, log)
     log.info("End mSINGS")
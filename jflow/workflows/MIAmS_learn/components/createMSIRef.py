@@ -27,7 +27,7 @@ from jflow.component import Component
 from weaver.function import PythonFunction
 
 
-def createMSIRef_wrapper(exec_path, min_support_fragments, in_report_list, in_targets, in_annot, out_references, out_info, out_stderr):
+def createMSIRef_wrapper(exec_path, min_support_fragments, compaction_size, in_report_list, in_targets, in_annot, out_references, out_info, out_stderr, in_base_references=None):
     """This wrapper is used to prevent the limit of command line length."""
     import subprocess
     # Init command
@@ -40,6 +40,10 @@ def createMSIRef_wrapper(exec_path, min_support_fragments, in_report_list, in_ta
         "--input-loci-annot", in_annot,
         "--inputs-report"
     ]
+    if int(compaction_size) > 0:
+        cmd[-1:-1] = ["--compaction-size", compaction_size]
+    if in_base_references is not None:
+        cmd[-1:-1] = ["--input-base-references", in_base_references]
     # Add list of reports
     in_reports = []
     with open(in_report_list) as FH_in:
@@ -53,15 +57,18 @@ def createMSIRef_wrapper(exec_path, min_support_fragments, in_report_list, in_ta
 
 class CreateMSIRef (Component):
 
-    def define_parameters(self, msi_reports, msi_targets, expected_status, min_support_fragments=200):
+    def define_parameters(self, msi_reports, msi_targets, expected_status, min_support_fragments=200, base_references=None, compaction_size=None):
         # Parameters
         self.add_parameter("min_support_fragments", "Minimum number of fragment in size distribution to keep the locus result of a sample in reference distributions.", default=min_support_fragments, type=int)
+        self.add_parameter("compaction_size", "The maximum number of references by locus and by status. Above this number the references are merged in weighted prototypes. By default the references are not compacted.", default=compaction_size, type=int)
 
         # Input Files
         self.add_input_file_list("msi_reports", "Pathes to the files evaluated in references creation process (format: MSIReport).", default=msi_reports, required=True)
         self.add_input_file("msi_targets", "Locations of the microsatellite of interest (format: BED).", default=msi_targets, required=True)
         self.add_input_file("expected_status", 'Path to the file containing for each sample for each targeted locus the stability status (format: MSIAnnot). First line must be: sample<tab>locus_position<tab>method_id<tab>key<tab>value<tab>type. The method_id should be "model" and an example of line content is: H2291-1_S15<tab>4:55598140-55598290<tab>model<tab>status<tab>MSS<tab>str', default=expected_status, required=True)
 
+        self.add_input_file("base_references", "Path to the references produced by a previous execution (format: MSIReport). Its samples are added in the new references except those with the same name as an evaluated sample.", default=base_references)
+
         # Output Files
         self.add_output_file("out_references", "Path to the file containing the references distribution for each locus (format: MSIReport).", filename='msiRef_references.json')
         self.add_output_file("out_info", "Path to the file describing the number of references by status for each locus (format: TSV).", filename='msiRef_info.tsv')
@@ -77,8 +84,10 @@ class CreateMSIRef (Component):
         cmd = "{EXE}" + \
             " " + self.get_exec_path("createMSIRef.py") + \
             " " + str(self.min_support_fragments) + \
+            " " + str(0 if self.compaction_size == None else self.compaction_size) + \
             " {IN}" + \
-            " {OUT}"
+            " {OUT}" + \
+            ("" if self.base_references == None else " " + self.base_references)
         add_fct = PythonFunction(
             createMSIRef_wrapper,
             cmd_format=cmd
@@ -86,5 +95,5 @@ class CreateMSIRef (Component):
         add_fct(
             inputs=[msi_reports_list, self.msi_targets, self.expected_status],
             outputs=[self.out_references, self.out_info, self.stderr],
-            includes=[self.msi_reports]
+            includes=[self.msi_reports] + ([] if self.base_references == None else [self.base_references])
         )
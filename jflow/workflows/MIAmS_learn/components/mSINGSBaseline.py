@@ -18,7 +18,7 @@
 __author__ = 'Charles Van Goethem and Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018'
 __license__ = 'GNU General Public License'
-__version__ = '1.1.0'
+__version__ = '1.2.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -29,7 +29,7 @@ from weaver.function import ShellFunction
 
 class MSINGSBaseline (Component):
 
-    def define_parameters(self, aln, targets, intervals, genome, status_annotations, java_mem=4):
+    def define_parameters(self, aln, targets, intervals, genome, status_annotations, base_analyzers=None, java_mem=4):
         # Parameters
         self.add_parameter("java_mem", "", default=java_mem, type=int)
 
@@ -39,9 +39,11 @@ class MSINGSBaseline (Component):
         self.add_input_file("intervals", "Path to the MSI intervals file (format: TSV). See mSINGS create_intervals script.", default=intervals, required=True)
         self.add_input_file("status_annotations", 'Path to the MSIAnnot file containing for each sample for each targeted locus the stability status (format: TSV). This file allows to filter loci used in each samples. First line must be: sample<tab>locus_position<tab>method_id<tab>key<tab>value<tab>type. An example of line content is: H2291-1_S15<tab>4:55598140-55598290<tab>model<tab>status<tab>MSS<tab>str.', default=status_annotations)
         self.add_input_file("targets", "The locations of the microsatellite of interest (format: BED). This file must be sorted numerically and must not have a header line.", default=targets, required=True)
+        self.add_input_file_list("base_analyzers", "Pathes to the MSI analyzer files of the samples processed in a previous baseline creation (format: TSV). These samples are added in baseline without the processing of their alignment file.", default=base_analyzers)
 
         # Output Files
         self.add_output_file("baseline", "Path to the file describing the distribution model of MSI negative samples (format: TSV). It contains the average and standard deviation of the number of expected signal peaks at each locus, as calculated from an MSI negative population (blood samples or MSI negative tumors).", filename='baseline.tsv')
+        self.add_output_file_list("analyzers", "Pathes to the MSI analyzer files of the processed samples (format: TSV). They can be used as base_analyzers in a next baseline creation.", pattern='{basename_woext}.msi.txt', items=self.aln)
         self.add_output_file("stderr", "Pathes to the stderr files (format: txt).", filename='baseline.stderr')
 
     def process(self):
@@ -50,12 +52,22 @@ class MSINGSBaseline (Component):
         with open(list_filepath, "w") as FH_out:
             for curr_aln in self.aln:
                 FH_out.write(curr_aln + "\n")
+        inputs = [self.genome, self.intervals, self.targets, list_filepath]
+        if len(self.base_analyzers) != 0:
+            base_list_filepath = os.path.join(self.output_directory, "base_analyzers_list.txt")
+            with open(base_list_filepath, "w") as FH_out:
+                for curr_analyzer in self.base_analyzers:
+                    FH_out.write(curr_analyzer + "\n")
+            inputs.append(base_list_filepath)
+        if self.status_annotations != None:
+            inputs.insert(0, self.status_annotations)
         # Set commands
         start_idx = 1
-        inputs = [self.genome, self.intervals, self.targets, list_filepath]
         if self.status_annotations != None:
             start_idx = 2
-            inputs.insert(0, self.status_annotations)
+        end_inputs_idx = start_idx + 3
+        if len(self.base_analyzers) != 0:
+            end_inputs_idx += 1
         cmd = self.get_exec_path("msings_venv") + " " + self.get_exec_path("create_baseline.py") + \
             " --java-path " + self.get_exec_path("java") + \
             " --java-mem " + str(self.java_mem) + \
@@ -64,11 +76,13 @@ class MSINGSBaseline (Component):
             " --input-intervals ${}".format(start_idx + 1) + \
             " --input-targets ${}".format(start_idx + 2) + \
             " --input-list ${}".format(start_idx + 3) + \
-            " --output-baseline ${}".format(start_idx + 4) + \
-            " 2> ${}".format(start_idx + 5)
+            ("" if len(self.base_analyzers) == 0 else " --input-base-list ${}".format(end_inputs_idx)) + \
+            " --output-analyzers-dir " + self.output_directory + \
+            " --output-baseline ${}".format(end_inputs_idx + 1) + \
+            " 2> ${}".format(end_inputs_idx + 2)
         baseline_fct = ShellFunction(cmd, cmd_format='{EXE} {IN} {OUT}')
         baseline_fct(
             inputs=inputs,
-            outputs=[self.baseline, self.stderr],
-            includes=self.aln
+            outputs=[self.baseline, self.stderr, self.analyzers],
+            includes=self.aln + self.base_analyzers
         )
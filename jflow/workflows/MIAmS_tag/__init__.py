@@ -18,7 +18,7 @@
 __author__ = 'Charles Van Goethem and Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.1.0'
+__version__ = '1.4.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -30,13 +30,14 @@ import fnmatch
 import argparse
 
 from workflows.src.miamsWorkflows import MIAmSWf
+from workflows.src.profilesStore import ProfilesStore, getFileStat, getFingerprint
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 LIB_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "lib")
 sys.path.insert(0, LIB_DIR)
 
 from anacore.illumina import getLibNameFromReadsPath
-from anacore.msi import MSIReport, Status
+from anacore.msi import LocusResPairsCombi, MSILocus, MSIReport, MSISample, Status
 
 
 def getHigherPeakByLocus(models, min_support_reads):
@@ -64,10 +65,126 @@ def getHigherPeakByLocus(models, min_support_reads):
                         if count >= max_count:  # "=" for select the tallest
                             max_count = count
                             max_peak = int(length)
-                    higher_by_locus[locus_id].append(max_peak)
+                    higher_by_locus[locus_id].extend([max_peak] * curr_locus.results["model"].getWeight())  # A prototype of compacted models counts for each represented sample
     return higher_by_locus
 
 
+def getCachedHigherPeakByLocus(models, min_support_reads, cache_path):
+    """
+    Return length of the higher peak of each model by locus. The result is cached in cache_path and it is reused while the models file and min_support_reads are unchanged.
+
+    :param models: The list of MSIReport representing the models (status known and stored in Expected result).
+    :type models: list
+    :param min_support_reads: The minimum number of reads on locus to use the stability status of the current model.
+    :type min_support_reads: int
+    :param cache_path: Path to the cache file (format: JSON).
+    :type cache_path: str
+    :return: By locus the list of higher peak length.
+    :rtype: dict
+    """
+    models_stat = os.stat(models)
+    cache_key = {"format": 2, "models": os.path.realpath(models), "models_size": models_stat.st_size, "models_mtime": models_stat.st_mtime, "min_support_reads": min_support_reads}  # Change format invalidates the cached peaks
+    try:
+        with open(cache_path) as FH_cache:
+            cache = json.load(FH_cache)
+        if cache["key"] == cache_key:
+            return cache["higher_peak_by_locus"]
+    except (IOError, ValueError, KeyError):
+        pass
+    higher_peak_by_locus = getHigherPeakByLocus(models, min_support_reads)
+    try:
+        tmp_path = cache_path + "." + str(os.getpid())
+        with open(tmp_path, "w") as FH_cache:
+            json.dump({"key": cache_key, "higher_peak_by_locus": higher_peak_by_locus}, FH_cache)
+        os.replace(tmp_path, cache_path)
+    except OSError:  # The cache is optional
+        pass
+    return higher_peak_by_locus
+
+
+def splitSampleProfiles(spl, pairs_method_name):
+    """
+    Return the lengths distributions of the combined pairs and the mSINGS results of the sample in two new samples. The results of the previous classification of the pairs are removed.
+
+    :param spl: The sample from a previous output (merged report or raw profile).
+    :type spl: anacore.msi.MSISample
+    :param pairs_method_name: The name of the method storing the lengths distributions of the combined pairs in the new sample.
+    :type pairs_method_name: str
+    :return: The sample with the pairs profiles and the sample with the mSINGS results.
+    :rtype: (anacore.msi.MSISample, anacore.msi.MSISample)
+    """
+    pairs_spl = MSISample(spl.name)
+    msings_spl = MSISample(spl.name)
+    if "MSINGS" in spl.results:
+        msings_spl.results["MSINGS"] = spl.results["MSINGS"]
+    for locus_id, locus in spl.loci.items():
+        pairs_locus = MSILocus(locus.position, locus.name)
+        msings_locus = MSILocus(locus.position, locus.name)
+        for method_name, res in locus.results.items():
+            if isinstance(res, LocusResPairsCombi):
+                pairs_locus.results[pairs_method_name] = LocusResPairsCombi(Status.none, None, res.data)
+            elif method_name == "MSINGS":
+                msings_locus.results["MSINGS"] = res
+        if len(pairs_locus.results) != 0:
+            pairs_spl.loci[locus_id] = pairs_locus
+        if len(msings_locus.results) != 0:
+            msings_spl.loci[locus_id] = msings_locus
+    return pairs_spl, msings_spl
+
+
+def getPreviousSamples(previous_output, pairs_method_name):
+    """
+    Return the samples profiles of a previous output of the workflow. The raw profiles (folder profiles) are used if they exist, otherwise the profiles are extracted from the merged reports (folder data).
+
+    :param previous_output: Path to the output folder of a previous execution of the workflow.
+    :type previous_output: str
+    :param pairs_method_name: The name of the method storing the lengths distributions of the combined pairs in the returned samples.
+    :type pairs_method_name: str
+    :return: The samples with the pairs profiles, the samples with the mSINGS results and True if the profiles come from the merged reports.
+    :rtype: (list, list, bool)
+    """
+    pairs_samples = []
+    msings_samples = []
+    profiles_folder = os.path.join(previous_output, "profiles")
+    from_merged = not os.path.isdir(profiles_folder)
+    if not from_merged:
+        for filename in sorted(os.listdir(profiles_folder)):
+            if filename.endswith("_pairs.json"):
+                msings_path = os.path.join(profiles_folder, filename[:-len("_pairs.json")] + "_MSINGS.json")
+                for spl in MSIReport.parse(os.path.join(profiles_folder, filename)):
+                    pairs_samples.append(splitSampleProfiles(spl, pairs_method_name)[0])
+                for spl in MSIReport.parse(msings_path):
+                    msings_samples.append(splitSampleProfiles(spl, pairs_method_name)[1])
+    else:
+        data_folder = os.path.join(previous_output, "data")
+        if not os.path.isdir(data_folder):
+            raise Exception('The folder "{}" is not an output of MIAmS_tag.'.format(previous_output))
+        for filename in sorted(os.listdir(data_folder)):
+            if filename.endswith(".json"):
+                for spl in MSIReport.parse(os.path.join(data_folder, filename)):
+                    pairs_spl, msings_spl = splitSampleProfiles(spl, pairs_method_name)
+                    pairs_samples.append(pairs_spl)
+                    msings_samples.append(msings_spl)
+    if len(pairs_samples) == 0:
+        raise Exception('No sample can be found in the previous output "{}".'.format(previous_output))
+    return pairs_samples, msings_samples, from_merged
+
+
+def linkOrCopy(src, dst):
+    """
+    Create a hard link dst on src or copy src to dst if the link cannot be created (example: different file systems).
+
+    :param src: Path to the source file.
+    :type src: str
+    :param dst: Path to the destination file.
+    :type dst: str
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
 def commonSubStr(str_a, str_b):
     """
     Return the longer common substring from the left of the two strings.
@@ -135,13 +252,14 @@ class MIAmSTag (MIAmSWf):
 
         # Locus classifier
         self.add_parameter("min_support_reads", "The minimum number of reads on locus for analyse the stability status of this locus in this sample.", default=300, type=int, group="Locus classification parameters")
-        self.add_parameter("classifier", "The classifier used to predict loci status.", choices=["DecisionTree", "KNeighbors", "LogisticRegression", "RandomForest", "SVC"], default="SVC", group="Locus classification parameters")
+        self.add_parameter("classifier", "The classifier used to predict loci status.", choices=["DecisionTree", "KNeighbors", "LogisticRegression", "RandomForest", "SVC", "Wasserstein"], default="SVC", group="Locus classification parameters")
         self.add_parameter("classifier_params", 'By default the MIAmSClassifier is used with these default parameters defined in scikit-learn. If you want change these parameters you use this option to provide them as json string. Example: {"n_estimators": 1000, "criterion": "entropy"} for RandmForest.', group="Locus classification parameters")
         self.add_parameter("random_seed", "The seed used by the random number generator in MIAmSClassifier.", type=int, group="Locus classification parameters")
 
         # Combine reads method
         self.add_parameter("max_mismatch_ratio", "Maximum allowed ratio between the number of mismatched base pairs and the overlap length. Two reads will not be combined with a given overlap if that overlap results in a mismatched base density higher than this value.", default=0.25, type=float, group="Combine reads method")
         self.add_parameter("min_pair_overlap", "The minimum required overlap length between two reads in pair to provide a confident overlap.", default=20, type=int, group="Combine reads method")
+        self.add_parameter("max_pairs_by_locus", "The maximum number of reads pairs by locus used to build the lengths distribution. On deeper loci a reproducible subsample based on the hash of the reads IDs is selected. This value must be higher than or equal to min_support_reads. By default all the pairs are used.", type=int, group="Combine reads method")
         self.add_parameter("min_zoi_overlap", "A reads pair is selected for combine method only if this number of nucleotides of the target are covered by the each read.", default=12, type=int, group="Combine reads method")
 
         # Cleaning
@@ -149,18 +267,24 @@ class MIAmSTag (MIAmSWf):
         self.add_input_file("R2_end_adapter", "Path to sequence file containing the start of reverse complemented Illumina P5 adapter ((format: fasta). This sequence is trimmed from the end of R2 of the amplicons with a size lower than read length.", file_format="fasta", required=False, group="Cleaning")
 
         # Inputs data
-        self.add_input_file_list("R1", "Pathes to R1 (format: fastq).", rules="Exclude=R1_pattern,R2_pattern,exclusion_pattern;ToBeRequired=R2;RequiredIf?ALL[R1_pattern=None]", group="Inputs data")
-        self.add_input_file_list("R2", "Pathes to R2 (format: fastq).", rules="Exclude=R1_pattern,R2_pattern,exclusion_pattern;ToBeRequired=R1;RequiredIf?ALL[R1_pattern=None]", group="Inputs data")
-        self.add_input_file_list("R1_pattern", "Pattern to find R1 files (format: fastq). This pattern use Unix shell-style wildcards (see https://docs.python.org/3/library/fnmatch.html).", type="regexpfiles", rules="Exclude=R1,R2;ToBeRequired=R2_pattern;RequiredIf?ALL[R1=None]", group="Inputs data by pattern")
-        self.add_input_file_list("R2_pattern", "Pattern to find R2 files (format: fastq). This pattern use Unix shell-style wildcards (see https://docs.python.org/3/library/fnmatch.html).", type="regexpfiles", rules="Exclude=R1,R2;ToBeRequired=R1_pattern;RequiredIf?ALL[R1=None]", group="Inputs data by pattern")
+        self.add_input_file_list("R1", "Pathes to R1 (format: fastq).", rules="Exclude=R1_pattern,R2_pattern,exclusion_pattern,previous_output;ToBeRequired=R2;RequiredIf?ALL[R1_pattern=None,previous_output=None]", group="Inputs data")
+        self.add_input_file_list("R2", "Pathes to R2 (format: fastq).", rules="Exclude=R1_pattern,R2_pattern,exclusion_pattern,previous_output;ToBeRequired=R1;RequiredIf?ALL[R1_pattern=None,previous_output=None]", group="Inputs data")
+        self.add_input_file_list("R1_pattern", "Pattern to find R1 files (format: fastq). This pattern use Unix shell-style wildcards (see https://docs.python.org/3/library/fnmatch.html).", type="regexpfiles", rules="Exclude=R1,R2,previous_output;ToBeRequired=R2_pattern;RequiredIf?ALL[R1=None,previous_output=None]", group="Inputs data by pattern")
+        self.add_input_file_list("R2_pattern", "Pattern to find R2 files (format: fastq). This pattern use Unix shell-style wildcards (see https://docs.python.org/3/library/fnmatch.html).", type="regexpfiles", rules="Exclude=R1,R2,previous_output;ToBeRequired=R1_pattern;RequiredIf?ALL[R1=None,previous_output=None]", group="Inputs data by pattern")
         self.add_parameter("exclusion_pattern", "Pattern to exclude files from files retrieved by R1_pattern and R2_pattern. This pattern use Unix shell-style wildcards (see https://docs.python.org/3/library/fnmatch.html).", rules="Exclude=R1,R2", group="Inputs data by pattern")
 
+        # Inputs data from a previous analysis
+        self.add_parameter("previous_output", "Path to the output folder of a previous execution of MIAmS_tag. The lengths distributions and the mSINGS results of its samples are classified again with the current models and parameters without the reads processing. With an output produced before the version 1.3.0 the mSINGS loci set to undetermined by the previous min_support_reads cannot be restored.", rules="Exclude=R1,R2,R1_pattern,R2_pattern,exclusion_pattern,profiles_store", group="Inputs data from previous output")
+
+        # Profiles store
+        self.add_parameter("profiles_store", "Path to the folder storing the profiles of the samples (lengths distributions of the combined pairs and mSINGS results). The profiles are identified by the content of the reads files, the design files and the reads processing parameters. The samples already stored are not processed again and the new samples are added in store.", rules="Exclude=previous_output", group="Profiles store")
+
         # Inputs design
-        self.add_input_file("targets", "The locations of the microsatellite of interest (format: BED). This file must be sorted numerically and must not have a header line.", required=True, group="Inputs design")
-        self.add_input_file("intervals", "MSI intervals file (format: TSV). See mSINGS create_intervals script.", required=True, group="Inputs design")
-        self.add_input_file("baseline", "Path to the MSI baseline file generated for your analytic process on data generated using the same protocols (format: TSV). This file describes the average and standard deviation of the number of expected signal peaks at each locus, as calculated from an MSI negative population (blood samples or MSI negative tumors). See mSINGS create_baseline script.", required=True, group="Inputs design")
+        self.add_input_file("targets", "The locations of the microsatellite of interest (format: BED). This file must be sorted numerically and must not have a header line.", rules="RequiredIf?ALL[previous_output=None]", group="Inputs design")
+        self.add_input_file("intervals", "MSI intervals file (format: TSV). See mSINGS create_intervals script.", rules="RequiredIf?ALL[previous_output=None]", group="Inputs design")
+        self.add_input_file("baseline", "Path to the MSI baseline file generated for your analytic process on data generated using the same protocols (format: TSV). This file describes the average and standard deviation of the number of expected signal peaks at each locus, as calculated from an MSI negative population (blood samples or MSI negative tumors). See mSINGS create_baseline script.", rules="RequiredIf?ALL[previous_output=None]", group="Inputs design")
         self.add_input_file("models", "Path to the file generated for your analytic process on data generated using the same protocols (format: JSON). This file describes the lengths distribution for each locus for samples tagged as MSI and samples tagged as MSS. See MIAmSLearn.", required=True, group="Inputs design")
-        self.add_input_file("genome_seq", "Path to the reference used to generate alignment files (format: fasta). This genome must be indexed (fai) and chromosomes names must not be prefixed by chr.", required=True, file_format="fasta", group="Inputs design")
+        self.add_input_file("genome_seq", "Path to the reference used to generate alignment files (format: fasta). This genome must be indexed (fai) and chromosomes names must not be prefixed by chr.", rules="RequiredIf?ALL[previous_output=None]", file_format="fasta", group="Inputs design")
 
         # Outputs data
         self.add_parameter("output_dir", "Path to the output folder.", required=True, group="Output data")
@@ -169,6 +293,11 @@ class MIAmSTag (MIAmSWf):
     def pre_process(self):
         super().pre_process()
 
+        # Get samples profiles from previous output
+        if self.previous_output is not None:
+            self.loadPreviousProfiles()
+            return
+
         # Get R1 and R2
         if len(self.R1) == 0 and len(self.R1_pattern) == 0:
             raise argparse.ArgumentTypeError("the following arguments are required: --R1, --R2 or --R1-pattern --R2-pattern")
@@ -179,32 +308,120 @@ class MIAmSTag (MIAmSWf):
                 self.R1 = [path for path in self.R1 if not fnmatch.fnmatch(path, self.exclusion_pattern)]
                 self.R2 = [path for path in self.R2 if not fnmatch.fnmatch(path, self.exclusion_pattern)]
 
+        # Check subsampling
+        if self.max_pairs_by_locus is not None and self.max_pairs_by_locus < self.min_support_reads:
+            raise argparse.ArgumentTypeError("max-pairs-by-locus must be higher than or equal to min-support-reads.")
+
         # Get samples names
         try:
             self.samples_names = [getLibNameFromReadsPath(str(elt)) for elt in self.R1]
         except:
             self.samples_names = commonSubPathes(self.R1, self.R2, True)
 
+        # Get samples profiles from store
+        self.loaded_pairs_reports = [None for spl_name in self.samples_names]
+        self.loaded_msings_reports = [None for spl_name in self.samples_names]
+        if self.profiles_store is not None:
+            self.loadStoredProfiles()
+
+
+    def getProfilesFingerprints(self):
+        """
+        Return the key of the profiles of each sample in the profiles store.
+
+        :return: The fingerprint of each sample in samples_names order.
+        :rtype: list
+        """
+        params = {
+            "workflow": "MIAmS_tag",
+            "cleaning": [0.1, 11],
+            "genome_seq": getFileStat(self.genome_seq),
+            "max_mismatch_ratio": self.max_mismatch_ratio,
+            "max_pairs_by_locus": self.max_pairs_by_locus,
+            "min_pair_overlap": self.min_pair_overlap,
+            "min_zoi_overlap": self.min_zoi_overlap
+        }
+        design_files = [self.R1_end_adapter, self.R2_end_adapter, self.targets, self.intervals, self.baseline]
+        return [getFingerprint([curr_R1, curr_R2] + design_files, params) for curr_R1, curr_R2 in zip(self.R1, self.R2)]
+
+
+    def writeLoadedProfiles(self, pairs_spl, msings_spl):
+        """
+        Write the samples profiles coming from a previous analysis in the workflow folder: one report with the lengths distributions of the combined pairs and one report with the mSINGS results.
+
+        :param pairs_spl: The sample with the lengths distributions of the combined pairs.
+        :type pairs_spl: anacore.msi.MSISample
+        :param msings_spl: The sample with the mSINGS results.
+        :type msings_spl: anacore.msi.MSISample
+        :return: Pathes to the pairs report and to the mSINGS report.
+        :rtype: (str, str)
+        """
+        out_paths = []
+        for folder, spl in [("loaded_pairs", pairs_spl), ("loaded_msings", msings_spl)]:
+            folder_path = os.path.join(self.directory, folder)
+            if not os.path.exists(folder_path):
+                os.mkdir(folder_path)
+            out_path = os.path.join(folder_path, spl.name + "_report.json")
+            MSIReport.write([spl], out_path)
+            out_paths.append(out_path)
+        return tuple(out_paths)
+
+
+    def loadPreviousProfiles(self):
+        """
+        Set the samples and their profiles from the previous output.
+        """
+        pairs_samples, msings_samples, from_merged = getPreviousSamples(self.previous_output, self.classifier + "Pairs")
+        if from_merged:
+            self._log(
+                'The profiles of "{}" are extracted from the merged reports: the mSINGS loci previously set to undetermined by min_support_reads cannot be restored.'.format(self.previous_output),
+                level="warning"
+            )
+        self.samples_names = []
+        self.loaded_pairs_reports = []
+        self.loaded_msings_reports = []
+        for pairs_spl, msings_spl in zip(pairs_samples, msings_samples):
+            self.samples_names.append(pairs_spl.name)
+            pairs_path, msings_path = self.writeLoadedProfiles(pairs_spl, msings_spl)
+            self.loaded_pairs_reports.append(pairs_path)
+            self.loaded_msings_reports.append(msings_path)
+
+
+    def loadStoredProfiles(self):
+        """
+        Set the profiles of the samples already present in the profiles store.
+        """
+        store = ProfilesStore(self.profiles_store)
+        self.profiles_keys = self.getProfilesFingerprints()
+        for spl_idx, (spl_name, key) in enumerate(zip(self.samples_names, self.profiles_keys)):
+            stored_pairs = store.get(key, "pairs")
+            stored_msings = store.get(key, "MSINGS")
+            if stored_pairs is not None and stored_msings is not None:
+                pairs_spl = splitSampleProfiles(MSIReport.parse(stored_pairs)[0], self.classifier + "Pairs")[0]
+                msings_spl = splitSampleProfiles(MSIReport.parse(stored_msings)[0], self.classifier + "Pairs")[1]
+                pairs_spl.name = spl_name
+                msings_spl.name = spl_name
+                self.loaded_pairs_reports[spl_idx], self.loaded_msings_reports[spl_idx] = self.writeLoadedProfiles(pairs_spl, msings_spl)
 
-    def process(self):
-        # Clean reads
-        cleaned_R1 = self.R1
-        if self.R1_end_adapter != None:
-            clean_R1 = self.add_component("Cutadapt", ["a", self.R1_end_adapter, self.R1, None, 0.1, 11], component_prefix="R1")
-            cleaned_R1 = clean_R1.out_R1
-        cleaned_R2 = self.R2
-        if self.R2_end_adapter != None:
-            clean_R2 = self.add_component("Cutadapt", ["a", self.R2_end_adapter, self.R2, None, 0.1, 11], component_prefix="R2")
-            cleaned_R2 = clean_R2.out_R1
 
-        # Align reads
-        bwa = self.add_component("BWAmem", [self.genome_seq, cleaned_R1, cleaned_R2, self.samples_names])
-        idx_aln = self.add_component("BAMIndex", [bwa.aln_files])
-
-        # Call MSI with run_msings.py
-        msings = self.add_component("MSINGS", [idx_aln.out_aln, self.targets, self.intervals, self.baseline, self.genome_seq])
+    def process(self):
+        # Get profiles of the samples not already loaded
+        self.pairs_reports = list(self.loaded_pairs_reports)
+        self.msings_reports = list(self.loaded_msings_reports)
+        self.processed_idx = [spl_idx for spl_idx, curr_report in enumerate(self.loaded_pairs_reports) if curr_report is None]
+        if len(self.processed_idx) != 0:
+            pairs_reports, msings_reports = self.processReads(
+                [self.R1[spl_idx] for spl_idx in self.processed_idx],
+                [self.R2[spl_idx] for spl_idx in self.processed_idx],
+                [self.samples_names[spl_idx] for spl_idx in self.processed_idx]
+            )
+            for spl_idx, pairs_path, msings_path in zip(self.processed_idx, pairs_reports, msings_reports):
+                self.pairs_reports[spl_idx] = pairs_path
+                self.msings_reports[spl_idx] = msings_path
+
+        # Classify
         filtered_msings = self.add_component("MSIFilter", kwargs={
-            "in_reports": msings.aggreg_report,
+            "in_reports": self.msings_reports,
             "method_name": "MSINGS",
             "min_distrib_support": self.min_support_reads,
             "consensus_method": self.loci_consensus_method,
@@ -214,14 +431,9 @@ class MIAmSTag (MIAmSWf):
             "undetermined_weight": 0,
             "locus_weight_is_score": False
         })
-
-        # Retrieve size profile for each MSI
-        on_targets = self.add_component("BamAreasToFastq", [idx_aln.out_aln, self.targets, self.min_zoi_overlap, True, cleaned_R1, cleaned_R2])
-        combine = self.add_component("CombinePairs", [on_targets.out_R1, on_targets.out_R2, None, self.max_mismatch_ratio, self.min_pair_overlap])
-        gather = self.add_component("GatherLocusRes", [combine.out_report, self.targets, self.samples_names, self.classifier + "Pairs", "LocusResPairsCombi"])
         classif = self.add_component("MIAmSClassify", kwargs={
             "references_samples": self.models,
-            "evaluated_samples": gather.out_report,
+            "evaluated_samples": self.pairs_reports,
             "method_name": self.classifier + "Pairs",
             "classifier": self.classifier,
             "classifier_params": self.classifier_params,
@@ -239,6 +451,45 @@ class MIAmSTag (MIAmSWf):
         self.reports_cmpt = self.add_component("MSIMergeReports", [classif.out_report, filtered_msings.out_report])
 
 
+    def processReads(self, R1, R2, samples_names):
+        """
+        Add the components producing the samples profiles from the reads: the lengths distributions of the combined pairs and the mSINGS results.
+
+        :param R1: Pathes to R1.
+        :type R1: list
+        :param R2: Pathes to R2.
+        :type R2: list
+        :param samples_names: The names of the samples.
+        :type samples_names: list
+        :return: Pathes to the pairs reports and to the mSINGS reports.
+        :rtype: (list, list)
+        """
+        # Clean reads
+        cleaned_R1 = R1
+        if self.R1_end_adapter != None:
+            clean_R1 = self.add_component("Cutadapt", ["a", self.R1_end_adapter, R1, None, 0.1, 11], component_prefix="R1")
+            cleaned_R1 = clean_R1.out_R1
+        cleaned_R2 = R2
+        if self.R2_end_adapter != None:
+            clean_R2 = self.add_component("Cutadapt", ["a", self.R2_end_adapter, R2, None, 0.1, 11], component_prefix="R2")
+            cleaned_R2 = clean_R2.out_R1
+
+        # Align reads
+        bwa = self.add_component("BWAmem", [self.genome_seq, cleaned_R1, cleaned_R2, samples_names])
+        idx_aln = self.add_component("BAMIndex", [bwa.aln_files])
+
+        # Call MSI with run_msings.py
+        msings = self.add_component("MSINGS", [idx_aln.out_aln, self.targets, self.intervals, self.baseline, self.genome_seq])
+
+        # Retrieve size profile for each MSI
+        idx_R1 = self.add_component("IndexFastq", [cleaned_R1], component_prefix="R1")
+        idx_R2 = self.add_component("IndexFastq", [cleaned_R2], component_prefix="R2")
+        on_targets = self.add_component("BamAreasToFastq", [idx_aln.out_aln, self.targets, self.min_zoi_overlap, True, idx_R1.out_reads, idx_R2.out_reads, idx_R1.out_index, idx_R2.out_index, self.max_pairs_by_locus])
+        combine = self.add_component("CombinePairs", [on_targets.out_R1, on_targets.out_R2, None, self.max_mismatch_ratio, self.min_pair_overlap, None, None, None, on_targets.repeated_targets, on_targets.samples])
+        gather = self.add_component("GatherLocusRes", [combine.out_report, self.targets, samples_names, self.classifier + "Pairs", "LocusResPairsCombi"])
+        return gather.out_report, msings.aggreg_report
+
+
     def post_process(self):
         if not os.path.exists(self.output_dir):
             os.mkdir(self.output_dir)
@@ -251,9 +502,40 @@ class MIAmSTag (MIAmSWf):
         data_folder = os.path.join(self.output_dir, "data")
         if not os.path.exists(data_folder):
             os.mkdir(data_folder)
-        for curr_res in self.reports_cmpt.out_report:
+        data_file_by_spl = {}
+        methods = set()
+        locus_id_by_name = {}
+        for curr_spl, curr_res in zip(self.samples_names, self.reports_cmpt.out_report):
             filename = os.path.basename(curr_res)
             shutil.copy(curr_res, os.path.join(data_folder, filename))
+            # Data loaded on demand by the report
+            with open(curr_res) as FH_in:
+                spl_data = json.load(FH_in)[0]
+            methods |= set(spl_data["results"].keys())
+            for locus_id, locus in spl_data["loci"].items():
+                locus_id_by_name[locus["name"]] = locus_id
+            data_filename = os.path.splitext(filename)[0] + ".js"
+            with open(os.path.join(data_folder, data_filename), "w") as FH_out:
+                FH_out.write("registerSample({}, {})\n".format(json.dumps(curr_spl), json.dumps(spl_data)))
+            data_file_by_spl[curr_spl] = "data/" + data_filename
+
+        # Copy profiles used in classification
+        profiles_folder = os.path.join(self.output_dir, "profiles")
+        if not os.path.exists(profiles_folder):
+            os.mkdir(profiles_folder)
+        for curr_spl, pairs_report, msings_report in zip(self.samples_names, self.pairs_reports, self.msings_reports):
+            for src, suffix in [(pairs_report, "_pairs.json"), (msings_report, "_MSINGS.json")]:
+                dst = os.path.join(profiles_folder, curr_spl + suffix)
+                if os.path.exists(dst):  # The previous file can be a link on the file of an other execution
+                    os.remove(dst)
+                linkOrCopy(src, dst)
+
+        # Add new profiles in store
+        if self.profiles_store is not None:
+            store = ProfilesStore(self.profiles_store)
+            for spl_idx in self.processed_idx:
+                store.add(self.profiles_keys[spl_idx], "pairs", self.pairs_reports[spl_idx])
+                store.add(self.profiles_keys[spl_idx], "MSINGS", self.msings_reports[spl_idx])
 
         # Copy lib
         wf_src_path = os.path.dirname(os.path.realpath(__file__))
@@ -261,23 +543,21 @@ class MIAmSTag (MIAmSWf):
         out_lib = os.path.join(self.output_dir, "lib")
         if os.path.exists(out_lib):
             shutil.rmtree(out_lib)
-        shutil.copytree(web_lib_path, out_lib)
-
-        # Get results
-        results_by_sample = {}
-        for curr_spl, curr_res in zip(self.samples_names, self.reports_cmpt.out_report):
-            with open(curr_res) as FH_in:
-                results_by_sample[curr_spl] = json.load(FH_in)[0]
+        shutil.copytree(web_lib_path, out_lib)  # Copy instead of links: an edition of the output must not change the application
 
         # Write report
-        higher_peak_by_locus = getHigherPeakByLocus(self.models, self.min_support_reads)
+        higher_peak_by_locus = getCachedHigherPeakByLocus(self.models, self.min_support_reads, os.path.join(self.output_dir, ".models_peaks.json"))
         template_path = os.path.join(wf_src_path, "resources", "report.html")
         report_path = os.path.join(self.output_dir, "report.html")
         with open(report_path, "w") as FH_output:
             with open(template_path) as FH_template:
                 for line in FH_template:
-                    if "= ##DATA##" in line:
-                        line = line.replace("##DATA##", json.dumps(results_by_sample))
+                    if "= ##DATA_FILES##" in line:
+                        line = line.replace("##DATA_FILES##", json.dumps(data_file_by_spl))
+                    elif "= ##METHODS##" in line:
+                        line = line.replace("##METHODS##", json.dumps(sorted(methods)))
+                    elif "= ##LOCUS_ID_BY_NAME##" in line:
+                        line = line.replace("##LOCUS_ID_BY_NAME##", json.dumps(locus_id_by_name))
                     elif "= ##MODELS_HIGHER_PEAK##" in line:
                         line = line.replace("##MODELS_HIGHER_PEAK##", json.dumps(higher_peak_by_locus))
                     FH_output.write(line)
@@ -3,26 +3,47 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '2.3.0'
+__version__ = '2.5.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
 import json
 import argparse
+import importlib
 from anacore.msi import LocusClassifier, MSIReport, Status
-from sklearn.tree import DecisionTreeClassifier as DecisionTree
-from sklearn.neighbors import KNeighborsClassifier as KNeighbors
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier as RandomForest
-from sklearn.svm import SVC
 
 
+# Module and class by classifier name. Only the module of the selected classifier is imported (see getClassifierClass)
+CLASSIFIERS = {
+    "DecisionTree": ("sklearn.tree", "DecisionTreeClassifier"),
+    "KNeighbors": ("sklearn.neighbors", "KNeighborsClassifier"),
+    "LogisticRegression": ("sklearn.linear_model", "LogisticRegression"),
+    "RandomForest": ("sklearn.ensemble", "RandomForestClassifier"),
+    "SVC": ("sklearn.svm", "SVC"),
+    "Wasserstein": ("anacore.msi", "WassersteinClassifier")
+}
+
 
 ########################################################################
 #
 # FUNCTIONS
 #
 ########################################################################
+def getClassifierClass(clf):
+    """
+    Return the class of the classifier. Its module is imported on the first call.
+
+    :param clf: The classifier name (see CLASSIFIERS).
+    :type clf: str
+    :return: The class of the classifier.
+    :rtype: class
+    """
+    if clf not in CLASSIFIERS:
+        raise Exception('The classifier "{}" is not implemented in MIAmSClassifier.'.format(clf))
+    module_name, class_name = CLASSIFIERS[clf]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
 class MIAmSClassifier(LocusClassifier):
     def __init__(self, locus_id, method_name="MIAmS", model_method_name="model", clf="SVC", clf_params=None):
         if clf_params is None:
@@ -31,23 +52,19 @@ class MIAmSClassifier(LocusClassifier):
         super().__init__(locus_id, method_name, clf_obj, model_method_name)
 
     def _getClassifier(self, clf, clf_params):
-        clf_obj = None
+        clf_class = getClassifierClass(clf)
         if clf == "SVC":  # The argument "probability" must be set to True to use predict_proba()
             clf_params["probability"] = True
             clf_params["gamma"] = "auto"
-            clf_obj = SVC(**clf_params)
         elif clf == "KNeighbors":  # The KNeighbors does not accept the argument "random_state"
             if "n_neighbors" in clf_params:
                 clf_params["n_neighbors"] = 2
             if "random_state" in clf_params:
                 del clf_params["random_state"]
-            clf_obj = KNeighbors(**clf_params)
-        else:
-            try:
-                clf_obj = globals()[clf](**clf_params)
-            except Exception:
-                raise Exception('The classifier "{}" is not implemented in MIAmSClassifier.'.format(clf))
-        return clf_obj
+        elif clf == "Wasserstein":  # The Wasserstein does not accept the argument "random_state"
+            if "random_state" in clf_params:
+                del clf_params["random_state"]
+        return clf_class(**clf_params)
 
 def process(args):
     """
@@ -107,7 +124,7 @@ if __name__ == "__main__":
     parser.add_argument('-m', '--method-name', default="MIAmS_combi", help='The name of the method storing locus metrics and where the status will be set. [Default: %(default)s]')
     parser.add_argument('-v', '--version', action='version', version=__version__)
     group_locus = parser.add_argument_group('Locus classifier')  # Locus status
-    group_locus.add_argument('-k', '--classifier', default="SVC", choices=["DecisionTree", "KNeighbors", "LogisticRegression", "RandomForest", "SVC"], help='The classifier used to predict loci status.')
+    group_locus.add_argument('-k', '--classifier', default="SVC", choices=sorted(CLASSIFIERS), help='The classifier used to predict loci status. Wasserstein is the fastest: the status is predicted by the distance between the lengths distributions and the references (see anacore.msi.WassersteinClassifier).')
     group_locus.add_argument('-p', '--classifier-params', action=ClassifierParamsAction, default={}, help='By default the classifier is used with these default parameters defined in scikit-learn. If you want change these parameters you use this option to provide them as json string. Example: {"n_estimators": 1000, "criterion": "entropy"} for RandmForest.')
     group_locus.add_argument('-f', '--min-support-fragments', default=150, type=int, help='The minimum numbers of fragment (reads pairs) for determine the status. [Default: %(default)s]')
     group_locus.add_argument('-s', '--random-seed', default=None, type=int, help='The seed used by the random number generator in the classifier.')
@@ -18,7 +18,7 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '2.0.0'
+__version__ = '2.1.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -39,7 +39,7 @@ class MSIMergeReports (Component):
         self.add_output_file_list("stderr", 'Pathes to the stderr files (format: txt).', pattern='{basename_woext}.stderr', items=self.first_report)
 
     def process(self):
-        cmd = self.get_exec_path("MSIMergeReports.py") + \
+        cmd = self.get_warm_exec_path("MSIMergeReports.py") + \
             " --inputs-reports $1 $2" + \
             " --output-report $3" + \
             " 2> $4"
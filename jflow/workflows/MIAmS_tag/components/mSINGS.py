@@ -18,7 +18,7 @@
 __author__ = 'Charles Van Goethem and Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018'
 __license__ = 'GNU General Public License'
-__version__ = '1.1.0'
+__version__ = '1.2.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -82,7 +82,7 @@ class MSINGS (Component):
         MultiMap(rename_fct, inputs=[tmp_report], outputs=[self.report, self.rename_stderr])
 
         # Aggregate report and analysis
-        cmd = self.get_exec_path("mSINGSToReport.py") + \
+        cmd = self.get_warm_exec_path("mSINGSToReport.py") + \
             " --input-report $1 " + \
             " --input-analysis $2 " + \
             " --output $3 " + \
@@ -18,7 +18,7 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.1.0'
+__version__ = '1.2.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -48,7 +48,7 @@ class MSIFilter (Component):
         self.add_output_file_list("stderr", 'Pathes to the stderr files (format: txt).', pattern='{basename_woext}.stderr', items=self.in_reports)
 
     def process(self):
-        cmd = self.get_exec_path("msiFilter.py") + \
+        cmd = self.get_warm_exec_path("msiFilter.py") + \
             " --consensus-method " + str(self.consensus_method) + \
             " --method-name " + str(self.method_name) + \
             " --min-voting-loci " + str(self.min_voting_loci) + \
@@ -17,7 +17,7 @@
  *
  * @author  Frederic Escudie
  * @license  GNU General Public License
- * @version  1.3.0
+ * @version  1.4.1
  */
 
 function sortNumber(a,b) {
@@ -29,16 +29,51 @@ String.prototype.capitalize = function() {
 };
 
 
-function getMethods(data) {
-    let methods = new Set()
-    data.forEach(function(curr_spl){
-        Object.keys(curr_spl.results).forEach(function(curr_method){
-            methods.add(curr_method)
-        })
-    })
-    methods = Array.from(methods)
-    methods.sort()
-    return methods
+function registerSample( spl_name, spl_data ){
+    data_by_spl[spl_name] = spl_data
+}
+
+function loadSample( spl_name, callback, error_callback ){
+    if( spl_name in data_by_spl ){
+        callback(data_by_spl[spl_name])
+    } else {
+        // The data file is loaded as a script to be usable with file:// protocol
+        let script = document.createElement("script")
+        script.src = data_file_by_spl[spl_name]
+        script.onload = function(){
+            callback(data_by_spl[spl_name])
+        }
+        script.onerror = error_callback
+        document.head.appendChild(script)
+    }
+}
+
+function showSample( select_spl, methods, distrib_method ){
+    const displayError = function(){
+        $("#user-alert").text('Error when loading data.')
+        $("#user-alert").removeClass("d-none")
+    }
+    $("#user-alert").addClass("d-none")
+    const spl_name = select_spl.val()
+    loadSample(
+        spl_name,
+        function( spl_data ){
+            if( spl_name != select_spl.val() ){  // An other sample has been selected during the loading
+                return
+            }
+            try {
+                selectSample(spl_data, methods, distrib_method)
+                navButtonUpdate(select_spl)
+            } catch(error) {
+                displayError()
+            }
+        },
+        function(){
+            if( spl_name == select_spl.val() ){
+                displayError()
+            }
+        }
+    )
 }
 
 function selectSample( spl_data, methods, distrib_method, pre_zoom_min=null, pre_zoom_max=null ){
@@ -50,7 +85,7 @@ function selectSample( spl_data, methods, distrib_method, pre_zoom_min=null, pre
 
 function navButtonUpdate(select_spl){
     const curr_idx = select_spl.prop('selectedIndex')
-    if(curr_idx == Object.keys(data_by_spl).length - 1){
+    if(curr_idx == Object.keys(data_file_by_spl).length - 1){
         $("#next-spl").addClass("disabled")
     } else {
         $("#next-spl").removeClass("disabled")
@@ -148,18 +183,6 @@ function addMethodsInTable(methods){
     })
 }
 
-function getLocusIdByName(data_by_spl){
-    let locus_id_by_name = {}
-    for(let spl_id in data_by_spl){
-        const spl = data_by_spl[spl_id]
-        for(let locus_id in spl.loci){
-            const locus_name = spl.loci[locus_id].name
-            locus_id_by_name[locus_name] = locus_id
-        }
-    }
-    return locus_id_by_name
-}
-
 function drawSizeGraph( container_id, data, method, pre_zoom_min=null, pre_zoom_max=null ){
     // Transforms data to series
     let series = []
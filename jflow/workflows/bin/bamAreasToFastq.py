@@ -19,15 +19,19 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '2.0.0'
+__version__ = '2.3.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
+import heapq
 import pysam
+import hashlib
 import argparse
+from itertools import zip_longest
 from anacore.bed import getAreas
 from anacore.region import RegionList
-from anacore.sequenceIO import FastqIO
+from anacore.fastqIndex import FastqIndex
+from anacore.sequenceIO import FastqIO, PairedFastqIO
 
 
 ########################################################################
@@ -53,28 +57,106 @@ def pickSeq(in_path, out_path, kept_ids):
                     FH_out.write(record)
 
 
-def getReadsFromBAM(aln_path, selected_areas, min_len_on_area=20):
+def pickPairs(in_R1_path, in_R2_path, out_R1_path, out_R2_path, kept_ids, reading_workers="thread"):
+    """
+    Filter pairs of fastq by sequences IDs. R1 and R2 are read in lock-step.
+
+    :param in_R1_path: The path to the initial R1 file (format: fastq).
+    :type in_R1_path: str
+    :param in_R2_path: The path to the initial R2 file (format: fastq).
+    :type in_R2_path: str
+    :param out_R1_path: The path to the outputted R1 file (format: fastq).
+    :type out_R1_path: str
+    :param out_R2_path: The path to the outputted R2 file (format: fastq).
+    :type out_R2_path: str
+    :param kept_ids: IDs of kept pairs.
+    :type kept_ids: set
+    :param reading_workers: None to decode R1 and R2 in the current thread, "thread" or "process" to decode them concurrently (see anacore.sequenceIO.PairedFastqIO).
+    :type reading_workers: str
+    """
+    with PairedFastqIO(in_R1_path, in_R2_path, workers=reading_workers) as FH_in:
+        with PairedFastqIO(out_R1_path, out_R2_path, "w") as FH_out:
+            for R1, R2 in FH_in:
+                if R1.id in kept_ids:
+                    FH_out.write(R1, R2)
+
+
+def pickIndexedPairs(in_R1_path, in_R2_path, out_R1_path, out_R2_path, kept_ids, in_R1_index=None, in_R2_index=None):
+    """
+    Filter pairs of fastq by sequences IDs. The records are retrieved by random access on the fastq with their index (see anacore.fastqIndex.FastqIndex).
+
+    :param in_R1_path: The path to the initial R1 file (format: fastq uncompressed or compressed with BGZF).
+    :type in_R1_path: str
+    :param in_R2_path: The path to the initial R2 file (format: fastq uncompressed or compressed with BGZF).
+    :type in_R2_path: str
+    :param out_R1_path: The path to the outputted R1 file (format: fastq).
+    :type out_R1_path: str
+    :param out_R2_path: The path to the outputted R2 file (format: fastq).
+    :type out_R2_path: str
+    :param kept_ids: IDs of kept pairs.
+    :type kept_ids: set
+    :param in_R1_index: The path to the index of the R1 file. [Default: in_R1_path + FastqIndex.EXTENSION]
+    :type in_R1_index: str
+    :param in_R2_index: The path to the index of the R2 file. [Default: in_R2_path + FastqIndex.EXTENSION]
+    :type in_R2_index: str
+    """
+    with FastqIndex(in_R1_path, in_R1_index) as FH_R1:
+        with FastqIndex(in_R2_path, in_R2_index) as FH_R2:
+            with PairedFastqIO(out_R1_path, out_R2_path, "w") as FH_out:
+                for R1, R2 in zip_longest(FH_R1.getRecords(kept_ids), FH_R2.getRecords(kept_ids)):
+                    if R1 is None or R2 is None or R1.id != R2.id:
+                        raise IOError('The reads pairs selected in {} and {} are not consistent around "{}".'.format(in_R1_path, in_R2_path, (R2 if R1 is None else R1).id))
+                    FH_out.write(R1, R2)
+
+
+def getSubsamplingKey(read_id):
+    """
+    Return the key used to subsample reads pairs. This key is a hash of the read ID: it does not depend on the order of the reads in files and it is the same from one execution to another.
+
+    :param read_id: The read ID.
+    :type read_id: str
+    :return: The subsampling key.
+    :rtype: int
+    """
+    return int.from_bytes(hashlib.md5(read_id.encode()).digest()[:8], "big")
+
+
+def subsampleIds(reads_id, max_nb):
+    """
+    Return at most max_nb reads IDs. The selected IDs are those with the lowest subsampling keys (see getSubsamplingKey) which makes the selection uniform and reproducible.
+
+    :param reads_id: The reads IDs.
+    :type reads_id: set
+    :param max_nb: The maximum number of returned IDs.
+    :type max_nb: int
+    :return: The selected reads IDs.
+    :rtype: set
+    """
+    if max_nb is None or len(reads_id) <= max_nb:
+        return reads_id
+    return set(heapq.nsmallest(max_nb, reads_id, key=getSubsamplingKey))
+
+
+def getReadsFromBAM(aln_path, selected_areas, min_len_on_area=20, max_pairs_by_area=None):
     """
     Retrun the ids of the reads pairs overlapping the provided regions.
 
     :param aln_path: Path to the alignments file (format: BAM).
     :type aln_path: str
-    :param R1_path: Path to the outputted R1 file (format: fastq).
-    :type R1_path: str
-    :param R2_path: Path to the outputted R2 file (format: fastq).
-    :type R2_path: str
     :param selected_areas: The selected regions.
     :type selected_areas: anacore.region.RegionList
     :param min_len_on_area: A reads pair is written on fastq only if this number of nucleotides of the target are covered by the each read.
     :type min_len_on_area: int
+    :param max_pairs_by_area: The maximum number of reads pairs selected by region. If more pairs overlap the region, they are subsampled on the hash of their ID (see subsampleIds). [Default: no limit]
+    :type max_pairs_by_area: int
     :return: List of ids of the reads pairs overlapping the provided regions.
     :rtype: set
     """
     selected_reads = set()
     with pysam.AlignmentFile(aln_path, "rb") as FH_sam:
-        already_selected = dict()
         for area_idx, curr_area in enumerate(selected_areas):
             selected_in_area = dict()
+            completed_in_area = set()
             for read in FH_sam.fetch(curr_area.reference.name, curr_area.start, curr_area.end):
                 if read.reference_start and read.reference_end:  # Skip reads with a mapping score but no information on alignment (CIGAR=*)
                     len_on_area = None
@@ -85,13 +167,13 @@ def getReadsFromBAM(aln_path, selected_areas, min_len_on_area=20):
                     if len_on_area > min_len_on_area:
                         read_id = read.query_name
                         read_phase = "R2" if read.is_read2 else "R1"
-                        if read_id not in already_selected:
+                        if read_id not in selected_reads:
                             if read_id not in selected_in_area:
                                 selected_in_area[read_id] = {"R1": None, "R2": None}
                             selected_in_area[read_id][read_phase] = True
                             if selected_in_area[read_id]["R1"] is not None and selected_in_area[read_id]["R2"] is not None:
-                                selected_reads.add(read_id)
-                                already_selected[read_id] = 1
+                                completed_in_area.add(read_id)
+            selected_reads |= subsampleIds(completed_in_area, max_pairs_by_area)
     return selected_reads
 
 
@@ -103,28 +185,41 @@ def getReadsFromBAM(aln_path, selected_areas, min_len_on_area=20):
 if __name__ == "__main__":
     # Manage parameters
     parser = argparse.ArgumentParser(description='Extract reads pairs overlapping the specified regions from a BAM file.')
+    parser.add_argument('-n', '--max-pairs', type=int, help='The maximum number of reads pairs selected by region. If more pairs overlap the region, a reproducible subsample based on the hash of the reads IDs is selected. [Default: no limit]')
     parser.add_argument('-m', '--min-overlap', default=20, type=int, help='A reads pair is selected only if this number of nucleotides of the target are covered by the each read. [Default: %(default)s]')
     parser.add_argument('-s', '--split-targets', action='store_true', help='With this parameter each region has his own pair of outputted fastq. In this configuration --output-R1 and --output-R2 must contain the placeholder "##TARGET##" dynamically replaced by the region name.')
     parser.add_argument('-v', '--version', action='version', version=__version__)
+    parser.add_argument('-w', '--reading-workers', default="thread", choices=["none", "thread", "process"], help='With "thread" or "process" R1 and R2 are decoded concurrently by one background thread or process by file. [Default: %(default)s]')
     group_input = parser.add_argument_group('Inputs')  # Inputs
     group_input.add_argument('-a', '--input-aln', required=True, help='The path to the alignment file (format: BAM).')
     group_input.add_argument('-t', '--input-targets', required=True, help='The path to the targets file (format: BED). The position of the interests areas are extracted from column 7 (thickStart) and column 8 (thickEnd) if they exist otherwise they are extracted from column 2 (Start) and column 3 (End).')
     group_input.add_argument('-i1', '--input-R1', required=True, help='The path to the inputted reads file (format: fastq).')
     group_input.add_argument('-i2', '--input-R2', required=True, help='The path to the inputted reads file (format: fastq).')
+    group_input.add_argument('-x1', '--input-R1-index', help='The path to the index of the inputted R1 file (see indexFastq.py). With this option the reads are retrieved by random access instead of a full scan of the fastq.')
+    group_input.add_argument('-x2', '--input-R2-index', help='The path to the index of the inputted R2 file (see indexFastq.py). With this option the reads are retrieved by random access instead of a full scan of the fastq.')
     group_output = parser.add_argument_group('Outputs')  # Outputs
     group_output.add_argument('-o1', '--output-R1', required=True, help='The path to the outputted reads file (format: fastq).')
     group_output.add_argument('-o2', '--output-R2', required=True, help='The path to the outputted reads file (format: fastq).')
     args = parser.parse_args()
+    if args.reading_workers == "none":
+        args.reading_workers = None
+    if (args.input_R1_index is None) != (args.input_R2_index is None):
+        raise Exception('The parameters --input-R1-index and --input-R2-index must be used together.')
     if args.split_targets:
         if "##TARGET##" not in args.output_R1 or "##TARGET##" not in args.output_R2:
             raise Exception('With {} the parameters {} and {} must contains "##TARGET##" as placeholder.'.format(args.split_targets.flag, args.output_R1.flag, args.output_R2.flag))
 
     # Process
+    def pickSelected(out_R1_path, out_R2_path, kept_ids):
+        if args.input_R1_index is None:
+            pickPairs(args.input_R1, args.input_R2, out_R1_path, out_R2_path, kept_ids, args.reading_workers)
+        else:
+            pickIndexedPairs(args.input_R1, args.input_R2, out_R1_path, out_R2_path, kept_ids, args.input_R1_index, args.input_R2_index)
+
     selected_areas = getAreas(args.input_targets)
     if not args.split_targets:
-        reads_id = getReadsFromBAM(args.input_aln, selected_areas, args.min_overlap)
-        pickSeq(args.input_R1, args.output_R1, reads_id)
-        pickSeq(args.input_R2, args.output_R2, reads_id)
+        reads_id = getReadsFromBAM(args.input_aln, selected_areas, args.min_overlap, args.max_pairs)
+        pickSelected(args.output_R1, args.output_R2, reads_id)
     else:
         uniq_names = set([elt.name for elt in selected_areas if elt.name is not None])
         if len(selected_areas) != len(uniq_names):
@@ -134,6 +229,5 @@ if __name__ == "__main__":
             curr_output_R1.replace("##TARGET##", curr_area.name)
             curr_output_R2 = args.output_R2
             curr_output_R2.replace("##TARGET##", curr_area.name)
-            reads_id = getReadsFromBAM(args.input_aln, RegionList([curr_area]), args.min_overlap)
-            pickSeq(args.input_R1, curr_output_R1, reads_id)
-            pickSeq(args.input_R2, curr_output_R2, reads_id)
+            reads_id = getReadsFromBAM(args.input_aln, RegionList([curr_area]), args.min_overlap, args.max_pairs)
+            pickSelected(curr_output_R1, curr_output_R2, reads_id)
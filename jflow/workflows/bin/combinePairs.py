@@ -19,15 +19,18 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2017 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.4.0'
+__version__ = '1.8.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
 import sys
 import json
+import math
 import logging
 import argparse
-from anacore.sequenceIO import Sequence, FastqIO
+import functools
+from anacore.bed import getAreas
+from anacore.sequenceIO import Sequence, FastqIO, PairedFastqIO
 
 
 ########################################################################
@@ -101,6 +104,217 @@ def seqRevCom(seq):
     )
 
 
+def getAnchoredShifts(R1_seq, R2_seq, min_overlap, kmer_size, nb_anchors=4):
+    """
+    Return the shifts between R1 and the reverse complement of R2 where they share k-mers. The k-mers of R2 are indexed and nb_anchors k-mers evenly distributed on R1 are searched in this index. A shift is the start of the overlap on R1 minus its start on R2.
+
+    :param R1_seq: The sequence of R1.
+    :type R1_seq: str
+    :param R2_seq: The reverse complemented sequence of R2.
+    :type R2_seq: str
+    :param min_overlap: Minimum overlap between R1 and R2.
+    :type min_overlap: int
+    :param kmer_size: The length of the k-mers.
+    :type kmer_size: int
+    :param nb_anchors: The number of k-mers of R1 searched in R2.
+    :type nb_anchors: int
+    :return: The sorted shifts with an overlap of at least min_overlap.
+    :rtype: list
+    """
+    R1_len = len(R1_seq)
+    R2_len = len(R2_seq)
+    if R1_len < kmer_size or R2_len < kmer_size:
+        return []
+    positions_by_kmer = {}
+    for R2_pos in range(R2_len - kmer_size + 1):
+        kmer = R2_seq[R2_pos:R2_pos + kmer_size]
+        if kmer not in positions_by_kmer:
+            positions_by_kmer[kmer] = [R2_pos]
+        else:
+            positions_by_kmer[kmer].append(R2_pos)
+    last_R1_pos = R1_len - kmer_size
+    anchors_pos = {0} if nb_anchors < 2 else {round(idx * last_R1_pos / (nb_anchors - 1)) for idx in range(nb_anchors)}
+    shifts = set()
+    for R1_pos in anchors_pos:
+        for R2_pos in positions_by_kmer.get(R1_seq[R1_pos:R1_pos + kmer_size], []):
+            shift = R1_pos - R2_pos
+            if min_overlap - R2_len <= shift <= R1_len - min_overlap:
+                shifts.add(shift)
+    return sorted(shifts)
+
+
+def getBestOverlap(R1_seq, R2_seq, min_overlap, max_contradict_ratio, kmer_size=None, expected_lengths=None):
+    """
+    Return the best overlap between R1 and the reverse complement of R2. The shifts are evaluated from the shortest overlap with R2 first to the shortest overlap with R1 first and the overlap with the highest number of supporting nucleotids is selected (the last evaluated in case of equality). With kmer_size only the shifts anchored by a shared k-mer are evaluated (see getAnchoredShifts) and all the shifts are evaluated only if none of them produces a valid overlap. With expected_lengths the selected overlap is the same but the shifts are evaluated from the nearest to the expected fragments lengths (see getGuidedBestOverlap).
+
+    :param R1_seq: The sequence of R1.
+    :type R1_seq: str
+    :param R2_seq: The reverse complemented sequence of R2.
+    :type R2_seq: str
+    :param min_overlap: Minimum overlap between R1 and R2.
+    :type min_overlap: int
+    :param max_contradict_ratio: Error ratio in overlap region between R1 and R2.
+    :type max_contradict_ratio: float
+    :param kmer_size: The length of the k-mers used to select the evaluated shifts. By default all the shifts are evaluated.
+    :type kmer_size: int
+    :param expected_lengths: The expected lengths of the fragment (example: the lengths of the targeted amplicons).
+    :type expected_lengths: tuple
+    :return: The best overlap (nb_support, nb_contradict, R1_start, R2_start and length) or None if the pair cannot be combined.
+    :rtype: dict
+    """
+    R1_len = len(R1_seq)
+    R2_len = len(R2_seq)
+    if R1_len < min_overlap or R2_len < min_overlap:
+        return None
+    searchBestOverlap = getShiftsBestOverlap
+    if expected_lengths:
+        searchBestOverlap = functools.partial(getGuidedBestOverlap, expected_lengths=expected_lengths)
+    all_shifts = range(min_overlap - R2_len, R1_len - min_overlap + 1)
+    if kmer_size is not None:
+        best_overlap = searchBestOverlap(R1_seq, R2_seq, getAnchoredShifts(R1_seq, R2_seq, min_overlap, kmer_size), max_contradict_ratio)
+        if best_overlap is not None:
+            return best_overlap
+    return searchBestOverlap(R1_seq, R2_seq, all_shifts, max_contradict_ratio)
+
+
+def getFragLength(R1_len, R2_len, R1_start, overlap_len):
+    """
+    Return the length of the fragment resulting from the combination of R1 and R2.
+
+    :param R1_len: The length of R1.
+    :type R1_len: int
+    :param R2_len: The length of R2.
+    :type R2_len: int
+    :param R1_start: The start of the overlap on R1.
+    :type R1_start: int
+    :param overlap_len: The length of the overlap.
+    :type overlap_len: int
+    :return: The length of the fragment.
+    :rtype: int
+    """
+    frag_len = overlap_len
+    if R1_start != 0:  # R1 is first
+        frag_len = R1_len + R2_len - overlap_len
+    return frag_len
+
+
+def getGuidedBestOverlap(R1_seq, R2_seq, shifts, max_contradict_ratio, expected_lengths):
+    """
+    Return the best overlap between R1 and the reverse complement of R2 on the selected shifts. The result is the same as getShiftsBestOverlap but the shifts are evaluated from the nearest to the farthest of the expected fragments lengths. The evaluation of a shift stops as soon as it cannot beat the current best overlap and the search stops as soon as none of the remaining shifts can beat it.
+
+    :param R1_seq: The sequence of R1.
+    :type R1_seq: str
+    :param R2_seq: The reverse complemented sequence of R2.
+    :type R2_seq: str
+    :param shifts: The evaluated shifts. A shift is the start of the overlap on R1 minus its start on R2.
+    :type shifts: list
+    :param max_contradict_ratio: Error ratio in overlap region between R1 and R2.
+    :type max_contradict_ratio: float
+    :param expected_lengths: The expected lengths of the fragment.
+    :type expected_lengths: tuple
+    :return: The best overlap (nb_support, nb_contradict, R1_start, R2_start and length) or None if the pair cannot be combined.
+    :rtype: dict
+    """
+    R1_len = len(R1_seq)
+    R2_len = len(R2_seq)
+    # Order shifts by distance to the expected lengths
+    shifts_by_dist = []
+    for shift in shifts:
+        R1_start = max(0, shift)
+        overlap_len = min(R1_len - R1_start, R2_len - max(0, -shift))
+        frag_len = getFragLength(R1_len, R2_len, R1_start, overlap_len)
+        dist = min([abs(frag_len - expected) for expected in expected_lengths])
+        shifts_by_dist.append((dist, shift, overlap_len))
+    shifts_by_dist.sort()
+    # Upper bound of the score for the remaining shifts. As in exhaustive scan the best overlap is the one with the highest support then with the highest shift.
+    remaining_max_scores = [None for elt in shifts_by_dist]
+    max_score = (-1, -math.inf)
+    for idx in range(len(shifts_by_dist) - 1, -1, -1):
+        dist, shift, overlap_len = shifts_by_dist[idx]
+        max_score = max(max_score, (overlap_len, shift))
+        remaining_max_scores[idx] = max_score
+    # Search
+    best_overlap = None
+    best_score = (-1, -math.inf)
+    for idx, (dist, shift, overlap_len) in enumerate(shifts_by_dist):
+        if remaining_max_scores[idx] < best_score:  # None of the remaining shifts can beat the best
+            break
+        if (overlap_len, shift) >= best_score:
+            R1_start = max(0, shift)
+            R2_start = max(0, -shift)
+            # Maximum number of contradictions to respect the ratio and to beat the best
+            max_contradict = int(max_contradict_ratio * overlap_len) + 1
+            while max_contradict >= 0 and float(max_contradict) / overlap_len > max_contradict_ratio:
+                max_contradict -= 1
+            max_contradict = min(max_contradict, overlap_len - best_score[0] - (0 if shift > best_score[1] else 1))
+            nb_contradict = 0
+            is_candidate = max_contradict >= 0
+            if is_candidate:
+                for nt_R1, nt_R2, in zip(R1_seq[R1_start:R1_start + overlap_len], R2_seq[R2_start:R2_start + overlap_len]):
+                    if nt_R1 != nt_R2:
+                        nb_contradict += 1
+                        if nb_contradict > max_contradict:
+                            is_candidate = False
+                            break
+            if is_candidate:
+                best_score = (overlap_len - nb_contradict, shift)
+                best_overlap = {
+                    "nb_support": overlap_len - nb_contradict,
+                    "nb_contradict": nb_contradict,
+                    "R1_start": R1_start,
+                    "R2_start": R2_start,
+                    "length": overlap_len
+                }
+    return best_overlap
+
+
+def getShiftsBestOverlap(R1_seq, R2_seq, shifts, max_contradict_ratio):
+    """
+    Return the best overlap between R1 and the reverse complement of R2 on the selected shifts (see getBestOverlap).
+
+    :param R1_seq: The sequence of R1.
+    :type R1_seq: str
+    :param R2_seq: The reverse complemented sequence of R2.
+    :type R2_seq: str
+    :param shifts: The evaluated shifts in ascending order. A shift is the start of the overlap on R1 minus its start on R2.
+    :type shifts: list
+    :param max_contradict_ratio: Error ratio in overlap region between R1 and R2.
+    :type max_contradict_ratio: float
+    :return: The best overlap (nb_support, nb_contradict, R1_start, R2_start and length) or None if the pair cannot be combined.
+    :rtype: dict
+    """
+    R1_len = len(R1_seq)
+    R2_len = len(R2_seq)
+    best_overlap = None
+    max_nb_support = -1
+    for shift in shifts:  # For each shift
+        R1_start = max(0, shift)
+        R2_start = max(0, -shift)
+        curr_overlap_len = min(R1_len - R1_start, R2_len - R2_start)
+        if best_overlap is not None and R1_start != 0 and curr_overlap_len < best_overlap["nb_support"]:  # R1 is first and overlap become lower than nb support
+            break
+        # Evaluate overlap
+        nb_support = 0
+        R1_ov_s = R1_seq[R1_start:R1_start + curr_overlap_len]
+        R2_ov_s = R2_seq[R2_start:R2_start + curr_overlap_len]
+        for nt_R1, nt_R2, in zip(R1_ov_s, R2_ov_s):  # For each nt in overlap
+            if nt_R1 == nt_R2:
+                nb_support = nb_support + 1
+        nb_contradict = curr_overlap_len - nb_support
+        # Filter consensus and select the best
+        if nb_support >= max_nb_support:
+            if float(nb_contradict) / curr_overlap_len <= max_contradict_ratio:
+                max_nb_support = nb_support
+                best_overlap = {
+                    "nb_support": nb_support,
+                    "nb_contradict": nb_contradict,
+                    "R1_start": R1_start,
+                    "R2_start": R2_start,
+                    "length": curr_overlap_len
+                }
+    return best_overlap
+
+
 def process(args, log):
     """
     Combine R1 and R2 by their overlapping segment.
@@ -112,101 +326,65 @@ def process(args, log):
     """
     nb_pairs = 0
     combined = 0
+    # Amplicons libraries contain a lot of identical pairs: the best overlap is memoized by pair of sequences
+    findBestOverlap = functools.lru_cache(maxsize=args.cache_size)(getBestOverlap)
+    expected_lengths = None
+    if args.input_targets is not None:
+        expected_lengths = tuple(sorted(set(
+            [area.length() for area in getAreas(args.input_targets) if area.thickStart is not None and area.thickEnd is not None]
+        )))
     with FastqIO(args.output_combined, "w") as FH_combined:
-        with FastqIO(args.input_R1) as FH_r1:
-            with FastqIO(args.input_R2) as FH_r2:
-                for R1 in FH_r1:
-                    R2 = seqRevCom(FH_r2.next_seq())
-                    nb_pairs += 1
-                    best_overlap = None
-                    max_nb_support = -1
-                    R1_len = len(R1.string)
-                    R2_len = len(R2.string)
-                    R1_start = 0
-                    R2_start = R2_len - args.min_overlap
-                    is_valid = R1_len >= args.min_overlap and R2_len >= args.min_overlap
-                    can_be_better = True
-                    while is_valid and can_be_better:  # For each shift
-                        nb_support = 0
-                        nb_contradict = 0
-                        curr_overlap_len = min(R1_len - R1_start, R2_len - R2_start)
-                        if best_overlap is not None and R1_start != 0 and curr_overlap_len < best_overlap["nb_support"]:  # R1 is first and overlap become lower than nb support
-                            can_be_better = False
-                        else:
-                            # Evaluate overlap
-                            R1_ov_s = R1.string[R1_start:R1_start + curr_overlap_len]
-                            R2_ov_s = R2.string[R2_start:R2_start + curr_overlap_len]
-                            for nt_R1, nt_R2, in zip(R1_ov_s, R2_ov_s):  # For each nt in overlap
-                                if nt_R1 == nt_R2:
-                                    nb_support = nb_support + 1
-                            nb_contradict = curr_overlap_len - nb_support
-                            # Filter consensus and select the best
-                            if nb_support >= max_nb_support:
-                                if float(nb_contradict) / curr_overlap_len <= args.max_contradict_ratio:
-                                    max_nb_support = nb_support
-                                    best_overlap = {
-                                        "nb_support": nb_support,
-                                        "nb_contradict": nb_contradict,
-                                        "R1_start": R1_start,
-                                        "R2_start": R2_start,
-                                        "length": curr_overlap_len
-                                    }
-                            # Next shift
-                            if R1_start == 0:
-                                if R2_start == 0:
-                                    R1_start = 1
-                                else:
-                                    R2_start = R2_start - 1
+        with PairedFastqIO(args.input_R1, args.input_R2, workers=args.reading_workers) as FH_pairs:
+            for R1, R2 in FH_pairs:
+                R2 = seqRevCom(R2)
+                nb_pairs += 1
+                R1_len = len(R1.string)
+                R2_len = len(R2.string)
+                best_overlap = findBestOverlap(R1.string, R2.string, args.min_overlap, args.max_contradict_ratio, args.kmer_size, expected_lengths)
+                if best_overlap is not None:  # Current pair has valid combination
+                    # Filter fragment on length
+                    valid_frag_len = True
+                    if args.max_frag_length is not None or args.min_frag_length is not None:
+                        curr_frag_len = getFragLength(R1_len, R2_len, best_overlap["R1_start"], best_overlap["length"])
+                        if args.min_frag_length is not None:
+                            valid_frag_len = curr_frag_len >= args.min_frag_length
+                        if args.max_frag_length is not None:
+                            valid_frag_len = valid_frag_len and curr_frag_len <= args.max_frag_length
+                    # Write combined sequence
+                    if valid_frag_len:
+                        combined += 1
+                        complete_seq = ""
+                        complete_qual = ""
+                        R1_ov_s = R1.string[best_overlap["R1_start"]:best_overlap["R1_start"] + best_overlap["length"]]
+                        R1_ov_q = R1.quality[best_overlap["R1_start"]:best_overlap["R1_start"] + best_overlap["length"]]
+                        R2_ov_s = R2.string[best_overlap["R2_start"]:best_overlap["R2_start"] + best_overlap["length"]]
+                        R2_ov_q = R2.quality[best_overlap["R2_start"]:best_overlap["R2_start"] + best_overlap["length"]]
+                        for nt_R1, qual_R1, nt_R2, qual_R2 in zip(R1_ov_s, R1_ov_q, R2_ov_s, R2_ov_q):  # For each nt in overlap
+                            if nt_R1 == nt_R2:
+                                complete_seq += nt_R1
+                                complete_qual += max(qual_R1, qual_R2)
                             else:
-                                R1_start = R1_start + 1
-                                if R1_len - R1_start < args.min_overlap:
-                                    is_valid = False
-                    if best_overlap is not None:  # Current pair has valid combination
-                        # Filter fragment on length
-                        valid_frag_len = True
-                        if args.max_frag_length is not None or args.min_frag_length is not None:
-                            curr_frag_len = curr_overlap_len
-                            if best_overlap["R1_start"] != 0:  # R1 is first
-                                curr_frag_len = R1_len + R2_len - curr_overlap_len
-                            if args.min_frag_length is not None:
-                                valid_frag_len = curr_frag_len >= args.min_frag_length
-                            if args.max_frag_length is not None:
-                                valid_frag_len = curr_frag_len <= args.max_frag_length
-                        # Write combined sequence
-                        if valid_frag_len:
-                            combined += 1
-                            complete_seq = ""
-                            complete_qual = ""
-                            R1_ov_s = R1.string[best_overlap["R1_start"]:best_overlap["R1_start"] + best_overlap["length"]]
-                            R1_ov_q = R1.quality[best_overlap["R1_start"]:best_overlap["R1_start"] + best_overlap["length"]]
-                            R2_ov_s = R2.string[best_overlap["R2_start"]:best_overlap["R2_start"] + best_overlap["length"]]
-                            R2_ov_q = R2.quality[best_overlap["R2_start"]:best_overlap["R2_start"] + best_overlap["length"]]
-                            for nt_R1, qual_R1, nt_R2, qual_R2 in zip(R1_ov_s, R1_ov_q, R2_ov_s, R2_ov_q):  # For each nt in overlap
-                                if nt_R1 == nt_R2:
+                                if qual_R1 >= qual_R2:
                                     complete_seq += nt_R1
-                                    complete_qual += max(qual_R1, qual_R2)
+                                    complete_qual += qual_R1
                                 else:
-                                    if qual_R1 >= qual_R2:
-                                        complete_seq += nt_R1
-                                        complete_qual += qual_R1
-                                    else:
-                                        complete_seq += nt_R2
-                                        complete_qual += qual_R2
-                            if best_overlap["R1_start"] > 0:  # If R1 start before R2 (insert size > read length)
-                                complete_seq = R1.string[0:best_overlap["R1_start"]] + complete_seq + R2.string[best_overlap["length"]:]
-                                complete_qual = R1.quality[0:best_overlap["R1_start"]] + complete_qual + R2.quality[best_overlap["length"]:]
-                            consensus_record = Sequence(
-                                R1.id,
-                                complete_seq,
-                                "Support_ratio:{}/{};R1_start:{};R2_start:{}".format(
-                                    best_overlap["nb_support"],
-                                    best_overlap["length"],
-                                    best_overlap["R1_start"],
-                                    best_overlap["R2_start"]
-                                ),
-                                complete_qual
-                            )
-                            FH_combined.write(consensus_record)
+                                    complete_seq += nt_R2
+                                    complete_qual += qual_R2
+                        if best_overlap["R1_start"] > 0:  # If R1 start before R2 (insert size > read length)
+                            complete_seq = R1.string[0:best_overlap["R1_start"]] + complete_seq + R2.string[best_overlap["length"]:]
+                            complete_qual = R1.quality[0:best_overlap["R1_start"]] + complete_qual + R2.quality[best_overlap["length"]:]
+                        consensus_record = Sequence(
+                            R1.id,
+                            complete_seq,
+                            "Support_ratio:{}/{};R1_start:{};R2_start:{}".format(
+                                best_overlap["nb_support"],
+                                best_overlap["length"],
+                                best_overlap["R1_start"],
+                                best_overlap["R2_start"]
+                            ),
+                            complete_qual
+                        )
+                        FH_combined.write(consensus_record)
     # Log
     log.info(
         "Nb pair: {} ; Nb combined: {} ({}%)".format(
@@ -215,6 +393,14 @@ def process(args, log):
             (0 if nb_pairs == 0 else round(float(combined * 100) / nb_pairs, 2))
         )
     )
+    cache_info = findBestOverlap.cache_info()
+    log.info(
+        "Overlap cache: {} hits ; {} misses ({}% hits)".format(
+            cache_info.hits,
+            cache_info.misses,
+            (0 if nb_pairs == 0 else round(float(cache_info.hits * 100) / nb_pairs, 2))
+        )
+    )
     if args.output_report is not None:
         writeReport(args.output_combined, args.input_R1, args.output_report)
 
@@ -230,15 +416,21 @@ if __name__ == "__main__":
     parser.add_argument('-l', '--min-frag-length', type=int, help='Minimum length for the resulting fragment. This filter is applied after best overlap selection.')
     parser.add_argument('-u', '--max-frag-length', type=int, help='Maximum length for the resulting fragment. This filter is applied after best overlap selection.')
     parser.add_argument('-o', '--min-overlap', default=20, type=int, help='Minimum overlap between R1 and R2. [Default: %(default)s]')
+    parser.add_argument('-k', '--kmer-size', type=int, help='With this option only the shifts where R1 and R2 share k-mers of this length are evaluated. All the shifts are evaluated only if none of these produces a valid overlap. [Default: all the shifts are evaluated]')
+    parser.add_argument('-s', '--cache-size', default=10000, type=int, help='The maximum number of distinct pairs of sequences for which the best overlap is kept in memory to be reused on identical pairs. With 0 the cache is disabled. [Default: %(default)s]')
     parser.add_argument('-m', '--max-contradict-ratio', default=0.1, type=float, help='Error ratio in overlap region between R1 and R2. [Default: %(default)s]')
+    parser.add_argument('-w', '--reading-workers', default="thread", choices=["none", "thread", "process"], help='With "thread" or "process" R1 and R2 are decoded concurrently by one background thread or process by file. [Default: %(default)s]')
     parser.add_argument('-v', '--version', action='version', version=__version__)
     group_input = parser.add_argument_group('Inputs')  # Inputs
     group_input.add_argument('-1', '--input-R1', required=True, help='The path to the R1 file (format: fastq).')
     group_input.add_argument('-2', '--input-R2', required=True, help='The path to the R2 file (format: fastq).')
+    group_input.add_argument('-t', '--input-targets', help='The path to the amplicons of the pairs (format: BED). As in MIAmS targets, the amplicon is described by column 2 (Start) and column 3 (End) only if the microsatellite is in column 7 (thickStart) and column 8 (thickEnd). The overlaps are searched first around the lengths of these amplicons. The result is the same as without this option.')
     group_output = parser.add_argument_group('Outputs')  # Outputs
     group_output.add_argument('-c', '--output-combined', required=True, help='The path to the file with combined pairs (format: fastq).')
     group_output.add_argument('-r', '--output-report', help='The path to the path containing combination metrics (format: JSON).')
     args = parser.parse_args()
+    if args.reading_workers == "none":
+        args.reading_workers = None
 
     # Process
     logging.basicConfig(format='%(asctime)s -- [%(filename)s][pid:%(process)d][%(levelname)s] -- %(message)s')
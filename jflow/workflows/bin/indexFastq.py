@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2019 IUCT-O
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__author__ = 'Frederic Escudie'
+__copyright__ = 'Copyright (C) 2019 IUCT-O'
+__license__ = 'GNU General Public License'
+__version__ = '1.0.0'
+__email__ = 'escudie.frederic@iuct-oncopole.fr'
+__status__ = 'prod'
+
+import sys
+import logging
+import argparse
+from anacore.fastqIndex import FastqIndex, toIndexedBGZF
+
+
+########################################################################
+#
+# MAIN
+#
+########################################################################
+if __name__ == "__main__":
+    # Manage parameters
+    parser = argparse.ArgumentParser(description='Compress fastq with BGZF and write an index on reads IDs. This index allows random access on reads by their ID (see anacore.fastqIndex.FastqIndex).')
+    parser.add_argument('-l', '--compress-level', default=6, type=int, choices=list(range(10)), help='The compression level from 0 (no compression) to 9 (best). [Default: %(default)s]')
+    parser.add_argument('-v', '--version', action='version', version=__version__)
+    group_input = parser.add_argument_group('Inputs')  # Inputs
+    group_input.add_argument('-i', '--input-reads', required=True, help='The path to the reads file (format: fastq).')
+    group_output = parser.add_argument_group('Outputs')  # Outputs
+    group_output.add_argument('-o', '--output-reads', required=True, help='The path to the outputted reads file (format: fastq compressed with BGZF).')
+    group_output.add_argument('-x', '--output-index', help='The path to the outputted index. [Default: --output-reads + "' + FastqIndex.EXTENSION + '"]')
+    args = parser.parse_args()
+
+    # Process
+    logging.basicConfig(format='%(asctime)s -- [%(filename)s][pid:%(process)d][%(levelname)s] -- %(message)s')
+    log = logging.getLogger("indexFastq")
+    log.setLevel(logging.INFO)
+    log.info("Command: " + " ".join(sys.argv))
+    log.info("Start")
+    toIndexedBGZF(args.input_reads, args.output_reads, args.output_index, args.compress_level)
+    log.info("End of job")
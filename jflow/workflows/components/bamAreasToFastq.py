@@ -18,7 +18,7 @@
 __author__ = 'Charles Van Goethem and Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '2.0.0'
+__version__ = '2.3.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -31,9 +31,10 @@ from anacore.bed import BEDIO
 
 class BamAreasToFastq (Component):
 
-    def define_parameters(self, aln, targets, min_overlap=20, split_targets=False, R1=None, R2=None):
+    def define_parameters(self, aln, targets, min_overlap=20, split_targets=False, R1=None, R2=None, R1_index=None, R2_index=None, max_pairs=None):
         # Parameters
         self.add_parameter("min_overlap", "A reads pair is selected only if this number of nucleotides of the target are covered by the each read.", default=min_overlap, type=int)
+        self.add_parameter("max_pairs", "The maximum number of reads pairs selected by target. If more pairs overlap the target, a reproducible subsample based on the hash of the reads IDs is selected.", default=max_pairs, type=int)
         self.add_parameter("split_targets", 'With this parameter each region has his own pair of outputted fastq.', default=split_targets, type=bool)
 
         # Input Files
@@ -41,8 +42,12 @@ class BamAreasToFastq (Component):
         self.add_input_file_list("R1", "The path to the inputted reads file (format: fastq).", default=R1)
         self.add_input_file_list("R2", "The path to the inputted reads file (format: fastq).", default=R2)
         self.add_input_file("targets", "The locations of areas to extract (format: BED). The position of the interests areas are extracted from column 7 (thickStart) and column 8 (thickEnd) if they exist otherwise they are extracted from column 2 (Start) and column 3 (End).", default=targets, required=True)
+        self.add_input_file_list("R1_index", "The path to the index of the inputted R1 file (format: FQI). With this parameter the reads are retrieved by random access instead of a full scan of the fastq.", default=R1_index)
+        self.add_input_file_list("R2_index", "The path to the index of the inputted R2 file (format: FQI). With this parameter the reads are retrieved by random access instead of a full scan of the fastq.", default=R2_index)
         if len(self.R1) != len(self.R2):
             raise Exception("R1 and R2 list must have the same length.")
+        if len(self.R1_index) != len(self.R2_index) or (len(self.R1_index) != 0 and len(self.R1_index) != len(self.R1)):
+            raise Exception("R1_index and R2_index list must have the same length as R1 and R2.")
         if not self.split_targets:
             self.repeated_targets = [self.targets for elt in self.aln]
         else:
@@ -50,6 +55,8 @@ class BamAreasToFastq (Component):
             self.repeated_aln = list()
             self.repeated_R1 = list()
             self.repeated_R2 = list()
+            self.repeated_R1_index = list()
+            self.repeated_R2_index = list()
             self.repeated_targets = list()
             for curr_idx, curr_aln in enumerate(self.aln):
                 for curr_split in self.splitted_targets:
@@ -58,6 +65,9 @@ class BamAreasToFastq (Component):
                     if len(self.R1) > 0 and len(self.R2) > 0:
                         self.repeated_R1.append(self.R1[curr_idx])
                         self.repeated_R2.append(self.R2[curr_idx])
+                    if len(self.R1_index) > 0 and len(self.R2_index) > 0:
+                        self.repeated_R1_index.append(self.R1_index[curr_idx])
+                        self.repeated_R2_index.append(self.R2_index[curr_idx])
 
         # Output Files
         if not self.split_targets:
@@ -69,17 +79,30 @@ class BamAreasToFastq (Component):
             self.add_output_file_list("out_R1", "Pathes to the outputted R1 file (format: fastq).", pattern='{basename_woext}_R1.fastq.gz', items=splitted_prefixes)
             self.add_output_file_list("out_R2", "Pathes to the outputted R2 file (format: fastq).", pattern='{basename_woext}_R2.fastq.gz', items=splitted_prefixes)
             self.add_output_file_list("stderr", "Pathes to the stderr files (format: txt).", pattern='{basename_woext}.stderr', items=splitted_prefixes)
+        self.samples = [self.get_aln_prefix(curr_aln) for curr_aln in (self.repeated_aln if self.split_targets else self.aln)]  # Sample of each output in out_R1 order
+
+
+    def get_aln_prefix(self, aln):
+        if aln.endswith(".gz") or aln.endswith(".bz"):
+            aln = aln[:-3]
+        return os.path.splitext(os.path.basename(aln))[0]
+
+
+    def get_task_sample(self, inputs, outputs):
+        sample_by_out = {os.path.basename(curr_out): curr_spl for curr_out, curr_spl in zip(self.out_R1, self.samples)}
+        for curr_out in outputs:
+            if os.path.basename(str(curr_out)) in sample_by_out:
+                return sample_by_out[os.path.basename(str(curr_out))]
+        return super().get_task_sample(inputs, outputs)
 
 
     def get_splitted_prefixes(self):
         prefixes = list()
         targets_name = self.get_targets_name()
         for curr_aln in self.aln:
-            if curr_aln.endswith(".gz") or curr_aln.endswith(".bz"):
-                curr_aln = curr_aln[:-3]
-            curr_aln = os.path.splitext(os.path.basename(curr_aln))[0]
+            curr_prefix = self.get_aln_prefix(curr_aln)
             for curr_name in targets_name:
-                prefixes.append(curr_aln + "_" + curr_name)
+                prefixes.append(curr_prefix + "_" + curr_name)
         return prefixes
 
 
@@ -118,10 +141,13 @@ class BamAreasToFastq (Component):
         # Exec command
         cmd = self.get_exec_path("bamAreasToFastq.py") + \
             " --min-overlap " + str(self.min_overlap) + \
+            ("" if self.max_pairs is None else " --max-pairs " + str(self.max_pairs)) + \
             " --input-targets $4" + \
             " --input-aln $5" + \
             ("" if len(self.R1) == 0 else " --input-R1 $6") + \
             ("" if len(self.R2) == 0 else " --input-R2 $7") + \
+            ("" if len(self.R1_index) == 0 else " --input-R1-index $8") + \
+            ("" if len(self.R2_index) == 0 else " --input-R2-index $9") + \
             " --output-R1 $1" + \
             " --output-R2 $2" + \
             " 2> $3"
@@ -135,6 +161,11 @@ class BamAreasToFastq (Component):
                 (self.repeated_R1 if self.split_targets else self.R1),
                 (self.repeated_R2 if self.split_targets else self.R2)
             ])
+        if len(self.R1_index) > 0 and len(self.R2_index) > 0:
+            inputs.extend([
+                (self.repeated_R1_index if self.split_targets else self.R1_index),
+                (self.repeated_R2_index if self.split_targets else self.R2_index)
+            ])
         MultiMap(
             bam2fastq_fct,
             inputs=inputs,
@@ -18,10 +18,11 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.1.0'
+__version__ = '1.4.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
+import os
 from jflow.component import Component
 from jflow.abstraction import MultiMap
 from weaver.function import ShellFunction
@@ -29,13 +30,15 @@ from weaver.function import ShellFunction
 
 class CombinePairs (Component):
 
-    def define_parameters(self, R1, R2, names=None, mismatch_ratio=0.25, min_overlap=20, min_frag_length=None, max_frag_length=None):
+    def define_parameters(self, R1, R2, names=None, mismatch_ratio=0.25, min_overlap=20, min_frag_length=None, max_frag_length=None, kmer_size=None, targets=None, samples=None):
         # Parameters
+        self.add_parameter("kmer_size", "With this parameter only the shifts where R1 and R2 share k-mers of this length are evaluated. All the shifts are evaluated only if none of these produces a valid overlap.", default=kmer_size, type=int)
         self.add_parameter("max_frag_length", "Maximum length for the resulting fragment. This filter is applied after best overlap selection.", default=max_frag_length, type=int)
         self.add_parameter("min_frag_length", "Minimum length for the resulting fragment. This filter is applied after best overlap selection.", default=min_frag_length, type=int)
         self.add_parameter("min_overlap", "The minimum required overlap length between two reads to provide a confident overlap.", default=min_overlap, type=int)
         self.add_parameter("mismatch_ratio", "Maximum allowed ratio between the number of mismatched base pairs and the overlap length. Two reads will not be combined with a given overlap if that overlap results in a mismatched base density higher than this value.", default=mismatch_ratio, type=float)
         self.add_parameter_list("names", "The basenames of the output fastq in order of the R1. By default the basename is automatically determined.", default=names)
+        self.add_parameter_list("samples", "The sample of each pair of files in order of the R1. It is used to group the resources of the tasks by sample in the run profile. By default the sample is determined from the R1 name.", default=samples)
         if len(self.names) == 0:
             self.prefixes = self.get_outputs('{basename_woext}', [R1, R2])
         else:
@@ -44,6 +47,11 @@ class CombinePairs (Component):
         # Inputs files
         self.add_input_file_list("R1", "fastq read R1 (format: fastq).", default=R1, required=True)
         self.add_input_file_list("R2", "fastq read R2 (format: fastq).", default=R2, required=True)
+        self.add_input_file_list("targets", "The amplicons of each pair of files in order of the R1 (format: BED). With this parameter the shifts are evaluated from the nearest to the lengths of the amplicons with a zone of interest (columns thickStart and thickEnd). The selected overlap is unchanged.", default=targets)
+        if len(self.targets) != 0 and len(self.targets) != len(self.R1):
+            raise Exception("targets list must have the same length as R1 and R2.")
+        if len(self.samples) != 0 and len(self.samples) != len(self.R1):
+            raise Exception("samples list must have the same length as R1 and R2.")
 
         # Outputs files
         self.add_output_file_list("out_combined", "Pathes to the files containing combined pairs (format: fastq).", pattern='{basename_woext}_combined.fastq.gz', items=self.prefixes)
@@ -51,20 +59,33 @@ class CombinePairs (Component):
         self.add_output_file_list("stderr", "Pathes to the stderr file (format: txt).", pattern='{basename_woext}.stderr', items=self.prefixes)
 
 
+    def get_task_sample(self, inputs, outputs):
+        sample_by_out = {os.path.basename(curr_out): curr_spl for curr_out, curr_spl in zip(self.out_combined, self.samples)}
+        for curr_out in outputs:
+            if os.path.basename(str(curr_out)) in sample_by_out:
+                return sample_by_out[os.path.basename(str(curr_out))]
+        return super().get_task_sample(inputs, outputs)
+
+
     def process(self):
-        cmd = self.get_exec_path("combinePairs.py") + \
+        cmd = self.get_warm_exec_path("combinePairs.py") + \
             ("" if self.max_frag_length == None else " --max-frag-length " + str(self.max_frag_length)) + \
             ("" if self.min_frag_length == None else " --min-frag-length " + str(self.min_frag_length)) + \
+            ("" if self.kmer_size == None else " --kmer-size " + str(self.kmer_size)) + \
             " --min-overlap " + str(self.min_overlap) + \
             " --max-contradict-ratio " + str(self.mismatch_ratio) + \
-            " --input-R1 $1" + \
-            " --input-R2 $2" + \
-            " --output-combined $3" + \
-            " --output-report $4" + \
-            " 2> $5"
-        combinePairs_fct = ShellFunction(cmd, cmd_format='{EXE} {IN} {OUT}')
+            " --input-R1 $4" + \
+            " --input-R2 $5" + \
+            ("" if len(self.targets) == 0 else " --input-targets $6") + \
+            " --output-combined $1" + \
+            " --output-report $2" + \
+            " 2> $3"
+        combinePairs_fct = ShellFunction(cmd, cmd_format='{EXE} {OUT} {IN}')
+        inputs = [self.R1, self.R2]
+        if len(self.targets) != 0:
+            inputs.append(self.targets)
         MultiMap(
             combinePairs_fct,
-            inputs=[self.R1, self.R2],
+            inputs=inputs,
             outputs=[self.out_combined, self.out_report, self.stderr]
         )
@@ -18,7 +18,7 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.0.0'
+__version__ = '1.1.0'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
@@ -78,7 +78,7 @@ class GatherLocusRes (Component):
                         "{}\t{}\t{}\n".format(target_id, targets[target_idx].name, curr_report)
                     )
         # Set commands
-        cmd = self.get_exec_path("gatherLocusRes.py") + \
+        cmd = self.get_warm_exec_path("gatherLocusRes.py") + \
             " --method-name '{}'".format(self.result_method) + \
             " --method-class-name '{}'".format(self.result_class_name) + \
             " --result-keys 'nb_by_length=nb_by_length'" + \
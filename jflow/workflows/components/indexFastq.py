@@ -0,0 +1,53 @@
+#
+# Copyright (C) 2019 IUCT-O
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__author__ = 'Frederic Escudie'
+__copyright__ = 'Copyright (C) 2019 IUCT-O'
+__license__ = 'GNU General Public License'
+__version__ = '1.0.0'
+__email__ = 'escudie.frederic@iuct-oncopole.fr'
+__status__ = 'prod'
+
+from jflow.component import Component
+from jflow.abstraction import MultiMap
+from weaver.function import ShellFunction
+
+
+class IndexFastq (Component):
+
+    def define_parameters(self, in_reads, compress_level=6):
+        # Parameters
+        self.add_parameter("compress_level", "The compression level from 0 (no compression) to 9 (best).", default=compress_level, type=int)
+
+        # Input Files
+        self.add_input_file_list("in_reads", "Pathes to the reads files (format: fastq).", default=in_reads, required=True)
+
+        # Output Files
+        self.add_output_file_list("out_reads", "Pathes to the outputted reads files (format: fastq compressed with BGZF).", pattern='{basename_woext}_idx.fastq.gz', items=self.in_reads)
+        self.add_output_file_list("out_index", "Pathes to the outputted index on reads IDs (format: FQI).", pattern='{basename_woext}_idx.fastq.gz.fqi', items=self.in_reads)
+        self.add_output_file_list("stderr", "Pathes to the stderr files (format: txt).", pattern='{basename_woext}.stderr', items=self.in_reads)
+
+
+    def process(self):
+        cmd = self.get_exec_path("indexFastq.py") + \
+            " --compress-level " + str(self.compress_level) + \
+            " --input-reads $4" + \
+            " --output-reads $1" + \
+            " --output-index $2" + \
+            " 2> $3"
+        index_fct = ShellFunction(cmd, cmd_format='{EXE} {OUT} {IN}')
+        MultiMap(index_fct, inputs=[self.in_reads], outputs=[self.out_reads, self.out_index, self.stderr])
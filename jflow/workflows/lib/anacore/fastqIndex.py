@@ -0,0 +1,484 @@
+#
+# Copyright (C) 2019 IUCT-O
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__author__ = 'Frederic Escudie'
+__copyright__ = 'Copyright (C) 2019 IUCT-O'
+__license__ = 'GNU General Public License'
+__version__ = '1.0.0'
+__email__ = 'escudie.frederic@iuct-oncopole.fr'
+__status__ = 'prod'
+
+import zlib
+import struct
+import hashlib
+from array import array
+from bisect import bisect_left
+from anacore.sequenceIO import FastqIO, Sequence
+
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+BGZF_MAX_BLOCK_DATA = 0xff00  # Maximum size of uncompressed data in one block (same as bgzip)
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+
+def isBGZF(path):
+    """
+    Return True if the file is compressed with BGZF (bgzip, samtools, ...).
+
+    :param path: Path to the processed file.
+    :type path: str
+    :return: True if the file is compressed with BGZF.
+    :rtype: bool
+    """
+    with open(path, "rb") as FH_in:
+        header = FH_in.read(18)
+    return len(header) == 18 and header[:4] == BGZF_MAGIC and header[12:14] == b"BC"
+
+
+def isGzip(path):
+    """
+    Return True if the file starts with the gzip magic number.
+
+    :param path: Path to the processed file.
+    :type path: str
+    :return: True if the file is compressed with gzip (BGZF included).
+    :rtype: bool
+    """
+    with open(path, "rb") as FH_in:
+        magic = FH_in.read(2)
+    return magic == b"\x1f\x8b"
+
+
+class BGZFReader:
+    """
+    Minimal reader for BGZF files supporting seek on virtual offsets.
+
+    A virtual offset is the position of the compressed block in file shifted by 16 bits plus the position in the uncompressed data of this block.
+    """
+
+    def __init__(self, filepath):
+        """
+        Build and return an instance of BGZFReader.
+
+        :param filepath: Path to the file (format: BGZF).
+        :type filepath: str
+        :return: The new instance.
+        :rtype: BGZFReader
+        """
+        self.filepath = filepath
+        self.file_handle = open(filepath, "rb")
+        self._block_start = None
+        self._block_data = b""
+        self._next_block_start = 0
+        self._within_block = 0
+        self._loadBlock(0)
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Close file handle."""
+        if hasattr(self, 'file_handle') and self.file_handle is not None:
+            self.file_handle.close()
+            self.file_handle = None
+
+    def _loadBlock(self, block_start):
+        """
+        Read and decompress the block starting at the selected position in compressed file.
+
+        :param block_start: Position of the block in compressed file.
+        :type block_start: int
+        """
+        self.file_handle.seek(block_start)
+        header = self.file_handle.read(12)
+        if len(header) == 0:  # End of file
+            self._block_data = b""
+            self._next_block_start = block_start
+        else:
+            if len(header) != 12 or header[:4] != BGZF_MAGIC:
+                raise IOError("The block starting at {} in '{}' is not a valid BGZF block.".format(block_start, self.filepath))
+            extra_len = struct.unpack("<H", header[10:12])[0]
+            extra = self.file_handle.read(extra_len)
+            block_size = None
+            extra_idx = 0
+            while extra_idx < extra_len and block_size is None:  # Find subfield BC
+                subfield_id = extra[extra_idx:extra_idx + 2]
+                subfield_len = struct.unpack("<H", extra[extra_idx + 2:extra_idx + 4])[0]
+                if subfield_id == b"BC":
+                    block_size = struct.unpack("<H", extra[extra_idx + 4:extra_idx + 6])[0] + 1
+                extra_idx += 4 + subfield_len
+            if block_size is None:
+                raise IOError("The block starting at {} in '{}' does not contain the BGZF block size.".format(block_start, self.filepath))
+            compressed_data = self.file_handle.read(block_size - 12 - extra_len - 8)
+            self.file_handle.read(8)  # CRC32 and ISIZE
+            self._block_data = zlib.decompress(compressed_data, -15)
+            self._next_block_start = block_start + block_size
+        self._block_start = block_start
+        self._within_block = 0
+
+    def _skipConsumedBlocks(self):
+        """Load the next not empty block if the current block is totally consumed."""
+        while self._within_block >= len(self._block_data) and self._next_block_start != self._block_start:
+            self._loadBlock(self._next_block_start)
+
+    def seek(self, virtual_offset):
+        """
+        Move the cursor on the virtual offset.
+
+        :param virtual_offset: The virtual offset (see BGZFReader).
+        :type virtual_offset: int
+        """
+        block_start = virtual_offset >> 16
+        if block_start != self._block_start:
+            self._loadBlock(block_start)
+        self._within_block = virtual_offset & 0xFFFF
+
+    def tell(self):
+        """
+        Return the virtual offset of the cursor.
+
+        :return: The virtual offset (see BGZFReader).
+        :rtype: int
+        """
+        self._skipConsumedBlocks()
+        return (self._block_start << 16) | self._within_block
+
+    def readline(self):
+        """
+        Return the next line with its end of line character.
+
+        :return: The next line or an empty bytes at the end of the file.
+        :rtype: bytes
+        """
+        line = b""
+        is_end = False
+        while not is_end:
+            self._skipConsumedBlocks()
+            if self._within_block >= len(self._block_data):  # End of file
+                is_end = True
+            else:
+                end_idx = self._block_data.find(b"\n", self._within_block)
+                if end_idx == -1:  # The line continues in the next block
+                    line += self._block_data[self._within_block:]
+                    self._within_block = len(self._block_data)
+                else:
+                    line += self._block_data[self._within_block:end_idx + 1]
+                    self._within_block = end_idx + 1
+                    is_end = True
+        return line
+
+
+class BGZFWriter:
+    """Minimal writer for BGZF files providing the virtual offset of the cursor."""
+
+    def __init__(self, filepath, compress_level=6):
+        """
+        Build and return an instance of BGZFWriter.
+
+        :param filepath: Path to the file (format: BGZF).
+        :type filepath: str
+        :param compress_level: The compression level from 0 (no compression) to 9 (best).
+        :type compress_level: int
+        :return: The new instance.
+        :rtype: BGZFWriter
+        """
+        self.filepath = filepath
+        self.compress_level = compress_level
+        self.file_handle = open(filepath, "wb")
+        self._buffer = b""
+        self._written_size = 0
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Write the remaining data, the EOF marker and close file handle."""
+        if hasattr(self, 'file_handle') and self.file_handle is not None:
+            self._flushBlock()
+            self.file_handle.write(BGZF_EOF)
+            self.file_handle.close()
+            self.file_handle = None
+
+    def _flushBlock(self):
+        """Write the buffered data in a new block."""
+        while len(self._buffer) > 0:
+            data = self._buffer[:BGZF_MAX_BLOCK_DATA]
+            self._buffer = self._buffer[BGZF_MAX_BLOCK_DATA:]
+            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+            compressed_data = compressor.compress(data) + compressor.flush()
+            block_size = 12 + 6 + len(compressed_data) + 8
+            block = BGZF_MAGIC + b"\x00\x00\x00\x00\x00\xff\x06\x00" + b"BC\x02\x00" + struct.pack("<H", block_size - 1) + \
+                compressed_data + struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data))
+            self.file_handle.write(block)
+            self._written_size += block_size
+
+    def tell(self):
+        """
+        Return the virtual offset of the cursor.
+
+        :return: The virtual offset (see BGZFReader).
+        :rtype: int
+        """
+        return (self._written_size << 16) | len(self._buffer)
+
+    def write(self, data):
+        """
+        Write data.
+
+        :param data: The data to write.
+        :type data: bytes
+        """
+        self._buffer += data
+        while len(self._buffer) >= BGZF_MAX_BLOCK_DATA:
+            self._buffer, remaining = self._buffer[:BGZF_MAX_BLOCK_DATA], self._buffer[BGZF_MAX_BLOCK_DATA:]
+            self._flushBlock()
+            self._buffer = remaining
+
+
+class FastqIndex:
+    """
+    Random access on records of a fastq file by their ID.
+
+    The index stores the hash of each read ID and the offset of its record in the fastq. This offset is the position in bytes for an uncompressed file and the virtual offset for a file compressed with BGZF. Files compressed with standard gzip cannot be indexed: they must be converted with toIndexedBGZF().
+
+    Synopsis:
+        FastqIndex.build("reads.fastq.gz")  # Or toIndexedBGZF("reads_gzip.fastq.gz", "reads.fastq.gz")
+        with FastqIndex("reads.fastq.gz") as FH_idx:
+            for record in FH_idx.getRecords(["read_1", "read_2"]):
+                ...
+    """
+
+    EXTENSION = ".fqi"
+    MAGIC = b"FQI\x01"
+
+    def __init__(self, fastq_path, index_path=None):
+        """
+        Build and return an instance of FastqIndex.
+
+        :param fastq_path: Path to the indexed file (format: fastq uncompressed or compressed with BGZF).
+        :type fastq_path: str
+        :param index_path: Path to the index. [Default: fastq_path + FastqIndex.EXTENSION]
+        :type index_path: str
+        :return: The new instance.
+        :rtype: FastqIndex
+        """
+        self.fastq_path = fastq_path
+        self.index_path = FastqIndex.getIndexPath(fastq_path) if index_path is None else index_path
+        self.hashes, self.offsets = FastqIndex.read(self.index_path)
+        self.is_bgzf = isBGZF(fastq_path)
+        self.file_handle = BGZFReader(fastq_path) if self.is_bgzf else open(fastq_path, "rb")
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Close file handle."""
+        if hasattr(self, 'file_handle') and self.file_handle is not None:
+            self.file_handle.close()
+            self.file_handle = None
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @staticmethod
+    def getIndexPath(fastq_path):
+        """
+        Return the default path of the index for the fastq.
+
+        :param fastq_path: Path to the indexed file (format: fastq).
+        :type fastq_path: str
+        :return: The default path of the index.
+        :rtype: str
+        """
+        return fastq_path + FastqIndex.EXTENSION
+
+    @staticmethod
+    def hashId(seq_id):
+        """
+        Return the hash used in index for the read ID. This hash is stable between processes.
+
+        :param seq_id: The read ID.
+        :type seq_id: str
+        :return: The hash (unsigned 64 bits).
+        :rtype: int
+        """
+        return int.from_bytes(hashlib.blake2b(seq_id.encode(), digest_size=8).digest(), "little")
+
+    @staticmethod
+    def read(index_path):
+        """
+        Return hashes and offsets stored in the index. The two arrays are sorted by hash.
+
+        :param index_path: Path to the index.
+        :type index_path: str
+        :return: The hashes and the offsets.
+        :rtype: (array.array, array.array)
+        """
+        with open(index_path, "rb") as FH_in:
+            if FH_in.read(len(FastqIndex.MAGIC)) != FastqIndex.MAGIC:
+                raise IOError("The file '{}' is not a valid fastq index.".format(index_path))
+            nb_records = struct.unpack("<Q", FH_in.read(8))[0]
+            hashes = array("Q")
+            hashes.frombytes(FH_in.read(nb_records * 8))
+            offsets = array("Q")
+            offsets.frombytes(FH_in.read(nb_records * 8))
+        if len(hashes) != nb_records or len(offsets) != nb_records:
+            raise IOError("The fastq index '{}' is truncated.".format(index_path))
+        return hashes, offsets
+
+    @staticmethod
+    def write(index_path, entries):
+        """
+        Write index file.
+
+        :param index_path: Path to the index.
+        :type index_path: str
+        :param entries: The list of tuples (hash, offset). They are sorted before writing.
+        :type entries: list
+        """
+        entries.sort()
+        with open(index_path, "wb") as FH_out:
+            FH_out.write(FastqIndex.MAGIC)
+            FH_out.write(struct.pack("<Q", len(entries)))
+            FH_out.write(array("Q", [curr_hash for curr_hash, offset in entries]).tobytes())
+            FH_out.write(array("Q", [offset for curr_hash, offset in entries]).tobytes())
+
+    @staticmethod
+    def build(fastq_path, index_path=None):
+        """
+        Create index for an existing fastq file.
+
+        :param fastq_path: Path to the indexed file (format: fastq uncompressed or compressed with BGZF).
+        :type fastq_path: str
+        :param index_path: Path to the index. [Default: fastq_path + FastqIndex.EXTENSION]
+        :type index_path: str
+        """
+        if isGzip(fastq_path) and not isBGZF(fastq_path):
+            raise IOError("The file '{}' is compressed with gzip and cannot be accessed randomly. It must be converted with toIndexedBGZF().".format(fastq_path))
+        index_path = FastqIndex.getIndexPath(fastq_path) if index_path is None else index_path
+        entries = list()
+        FH_in = BGZFReader(fastq_path) if isBGZF(fastq_path) else open(fastq_path, "rb")
+        try:
+            offset = FH_in.tell()
+            header = FH_in.readline()
+            while header:
+                if not header.startswith(b"@"):
+                    raise IOError("The line '{}' in '{}' is not a fastq header.".format(header.decode().rstrip(), fastq_path))
+                seq_id = header[1:].split(None, 1)[0].decode()
+                entries.append((FastqIndex.hashId(seq_id), offset))
+                for idx in range(3):  # Sequence, separator and quality
+                    FH_in.readline()
+                offset = FH_in.tell()
+                header = FH_in.readline()
+        finally:
+            FH_in.close()
+        FastqIndex.write(index_path, entries)
+
+    def _getRecordAt(self, offset):
+        """
+        Return the record starting at the offset.
+
+        :param offset: The offset of the record (see FastqIndex).
+        :type offset: int
+        :return: The record.
+        :rtype: anacore.sequenceIO.Sequence
+        """
+        self.file_handle.seek(offset)
+        header = self.file_handle.readline().decode().rstrip()
+        seq_str = self.file_handle.readline().decode().rstrip()
+        self.file_handle.readline()  # Separator
+        seq_qual = self.file_handle.readline().decode().rstrip()
+        if not header.startswith("@"):
+            raise IOError("The offset {} in '{}' does not correspond to a fastq record. The index '{}' is probably outdated.".format(offset, self.fastq_path, self.index_path))
+        fields = header[1:].split(None, 1)
+        return Sequence(fields[0], seq_str, (fields[1] if len(fields) == 2 else None), seq_qual)
+
+    def getOffsets(self, seq_ids):
+        """
+        Return the sorted offsets of the records potentially corresponding to the IDs (hash collisions are not resolved).
+
+        :param seq_ids: The IDs of the reads.
+        :type seq_ids: iterable
+        :return: The offsets in ascending order.
+        :rtype: list
+        """
+        offsets = list()
+        nb_records = len(self.hashes)
+        for curr_id in seq_ids:
+            curr_hash = FastqIndex.hashId(curr_id)
+            idx = bisect_left(self.hashes, curr_hash)
+            while idx < nb_records and self.hashes[idx] == curr_hash:
+                offsets.append(self.offsets[idx])
+                idx += 1
+        return sorted(set(offsets))
+
+    def getRecords(self, seq_ids):
+        """
+        Return a generator on the records corresponding to the IDs. The records are read by ascending offset to minimize seeks: they are returned in file order.
+
+        :param seq_ids: The IDs of the reads.
+        :type seq_ids: iterable
+        :return: The records.
+        :rtype: generator
+        """
+        if not isinstance(seq_ids, (set, dict)):
+            seq_ids = set(seq_ids)
+        for offset in self.getOffsets(seq_ids):
+            record = self._getRecordAt(offset)
+            if record.id in seq_ids:  # Skip hash collisions
+                yield record
+
+
+def toIndexedBGZF(in_path, out_path, index_path=None, compress_level=6):
+    """
+    Write a copy of the fastq compressed with BGZF and its index.
+
+    :param in_path: Path to the initial file (format: fastq).
+    :type in_path: str
+    :param out_path: Path to the outputted file (format: fastq compressed with BGZF).
+    :type out_path: str
+    :param index_path: Path to the outputted index. [Default: out_path + FastqIndex.EXTENSION]
+    :type index_path: str
+    :param compress_level: The compression level from 0 (no compression) to 9 (best).
+    :type compress_level: int
+    """
+    index_path = FastqIndex.getIndexPath(out_path) if index_path is None else index_path
+    entries = list()
+    with FastqIO(in_path) as FH_in:
+        with BGZFWriter(out_path, compress_level) as FH_out:
+            for record in FH_in:
+                entries.append((FastqIndex.hashId(record.id), FH_out.tell()))
+                FH_out.write((FH_in.seqToFastqLine(record) + "\n").encode())
+    FastqIndex.write(index_path, entries)
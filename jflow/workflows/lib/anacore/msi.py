@@ -18,16 +18,33 @@
 __author__ = 'Frederic Escudie'
 __copyright__ = 'Copyright (C) 2018 IUCT-O'
 __license__ = 'GNU General Public License'
-__version__ = '1.7.0'
+__version__ = '1.9.2'
 __email__ = 'escudie.frederic@iuct-oncopole.fr'
 __status__ = 'prod'
 
 import math
 import json
-import numpy as np
+import inspect
+import importlib
 from copy import deepcopy
 
 
+class _LazyModule:
+    """Module imported on the first access to one of its attributes."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+np = _LazyModule("numpy")  # Most of the scripts only read and write the reports: numpy is imported by the classifiers only
+
+
 def toDict(msi_object):
     """
     Retuns a dictionary representing the object. This method is used in json.dump in argument named "default" for recursively convert an object to json.
@@ -126,6 +143,15 @@ class LocusRes:
         self.score = score
         self.data = {} if data is None else data
 
+    def getWeight(self):
+        """
+        Return the number of samples represented by the result. It is upper than 1 for the prototypes of the compacted references (see createMSIRef.py).
+
+        :return: The number of samples represented by the result.
+        :rtype: int
+        """
+        return self.data.get("weight", 1)
+
     @staticmethod
     def fromDict(data):
         """
@@ -664,6 +690,209 @@ class MSISample:
         self.setScore(method)
 
 
+class WassersteinClassifier:
+    """
+    Classifier for lengths distributions based on the Wasserstein distance (earth mover's distance) to the distributions of the training samples. It implements the methods used by LocusClassifier on scikit-learn classifiers.
+
+    The distance between two distributions on the same lengths is the sum of the absolute differences between their cumulative distributions. The distance to a class is the mean of the distances to its n_neighbors nearest training samples and the predicted class is the nearest one. The probabilities are the softmax of the distances to the classes multiplied by -scale_, where scale_ is fitted on the leave-one-out distances of the training samples (temperature scaling with smoothed targets as in Platt scaling).
+
+    With sample_weight each training sample counts for its weight in the nearest neighbors and in the fit of scale_ (example: prototype of several references). The leave-one-out removes all the weight of the sample.
+
+    Synopsis:
+        clf = WassersteinClassifier()
+        clf.fit(train_data, train_labels)
+        clf.predict(test_data)
+        clf.predict_proba(test_data)
+    """
+
+    def __init__(self, n_neighbors=3, max_iter=50, chunk_size=1000000):
+        """
+        Build and return an instance of WassersteinClassifier.
+
+        :param n_neighbors: The number of nearest training samples used in the distance to a class.
+        :type n_neighbors: int
+        :param max_iter: The maximum number of iterations in the fit of the probabilities scale.
+        :type max_iter: int
+        :param chunk_size: The maximum number of values in the intermediate arrays of the distances calculation. It limits the memory consumption.
+        :type chunk_size: int
+        :return: The new instance.
+        :rtype: WassersteinClassifier
+        """
+        self.chunk_size = chunk_size
+        self.max_iter = max_iter
+        self.n_neighbors = n_neighbors
+        self.classes_ = None
+        self.scale_ = None
+        self._train_cdf = None  # Rows are training samples, columns are lengths and values are cumulative frequencies
+        self._train_classes_idx = None  # Index in classes_ of the label of each training sample
+        self._train_weights = None  # Weight of each training sample (None if all the weights are 1)
+
+    def _get_cdf(self, data):
+        """
+        Return the cumulative distributions of the lengths distributions.
+
+        :param data: The lengths distributions. Rows are samples, columns are lengths and values are counts or percentages.
+        :type data: np.matrix
+        :return: The cumulative distributions. Rows are samples, columns are lengths and values are cumulative frequencies.
+        :rtype: np.array
+        """
+        data = np.asarray(data, dtype=float)
+        totals = data.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1
+        return np.cumsum(data / totals, axis=1)
+
+    def _get_distances(self, cdf):
+        """
+        Return the Wasserstein distances between the distributions and the training distributions.
+
+        :param cdf: The cumulative distributions. Rows are samples, columns are lengths and values are cumulative frequencies.
+        :type cdf: np.array
+        :return: The distances. Rows are samples and columns are training samples.
+        :rtype: np.array
+        """
+        nb_train, nb_lengths = self._train_cdf.shape
+        if nb_lengths != cdf.shape[1]:
+            raise Exception("The distributions must have the same number of lengths as the training distributions ({} != {}).".format(cdf.shape[1], nb_lengths))
+        distances = np.empty((cdf.shape[0], nb_train))
+        step = max(1, self.chunk_size // max(1, nb_train * nb_lengths))
+        for start in range(0, cdf.shape[0], step):
+            chunk = cdf[start:start + step]
+            distances[start:start + step] = np.abs(chunk[:, np.newaxis, :] - self._train_cdf[np.newaxis, :, :]).sum(axis=2)
+        return distances
+
+    def _get_classes_distances(self, distances):
+        """
+        Return the distances between the distributions and the classes. The infinite distances (the sample itself in leave-one-out) are excluded from the nearest training samples: a class with only the sample itself is at an infinite distance.
+
+        :param distances: The distances. Rows are samples and columns are training samples.
+        :type distances: np.array
+        :return: The distances. Rows are samples and columns are classes (see classes_).
+        :rtype: np.array
+        """
+        classes_distances = np.empty((distances.shape[0], len(self.classes_)))
+        for class_idx in range(len(self.classes_)):
+            class_distances = distances[:, self._train_classes_idx == class_idx]
+            if self._train_weights is None:
+                nb_neighbors = min(self.n_neighbors, class_distances.shape[1])
+                nearest = np.partition(class_distances, nb_neighbors - 1, axis=1)[:, :nb_neighbors]
+                is_finite = np.isfinite(nearest)
+                nb_finite = is_finite.sum(axis=1)
+                sum_finite = np.where(is_finite, nearest, 0).sum(axis=1)
+                classes_distances[:, class_idx] = np.where(nb_finite > 0, sum_finite / np.maximum(nb_finite, 1), np.inf)
+            else:  # Each neighbor counts for its weight until n_neighbors is reached
+                class_weights = self._train_weights[self._train_classes_idx == class_idx]
+                order = np.argsort(class_distances, axis=1)
+                sorted_distances = np.take_along_axis(class_distances, order, axis=1)
+                sorted_weights = np.where(np.isfinite(sorted_distances), class_weights[order], 0)
+                nb_neighbors = np.minimum(self.n_neighbors, sorted_weights.sum(axis=1))
+                previous_weights = np.cumsum(sorted_weights, axis=1) - sorted_weights
+                contributions = np.clip(nb_neighbors[:, np.newaxis] - previous_weights, 0, sorted_weights)
+                sum_nearest = (np.where(contributions > 0, sorted_distances, 0) * contributions).sum(axis=1)
+                classes_distances[:, class_idx] = np.where(nb_neighbors > 0, sum_nearest / np.maximum(nb_neighbors, 1e-12), np.inf)
+        return classes_distances
+
+    def _get_proba(self, classes_distances, scale):
+        """
+        Return the probabilities of the classes from the distances to the classes.
+
+        :param classes_distances: The distances. Rows are samples and columns are classes.
+        :type classes_distances: np.array
+        :param scale: The factor applied to the distances in the softmax.
+        :type scale: float
+        :return: The probabilities. Rows are samples and columns are classes.
+        :rtype: np.array
+        """
+        logits = -scale * (classes_distances - classes_distances.min(axis=1, keepdims=True))
+        exp_logits = np.exp(logits)
+        return exp_logits / exp_logits.sum(axis=1, keepdims=True)
+
+    def _fit_scale(self, classes_distances, weights=None):
+        """
+        Return the scale minimizing the log loss of the probabilities. The targets are smoothed (1 - 1/(n+2) for the expected class) to prevent an infinite scale on separated training samples.
+
+        :param classes_distances: The leave-one-out distances of the training samples. Rows are samples and columns are classes.
+        :type classes_distances: np.array
+        :param weights: The weight of each training sample in the log loss. [Default: 1 for each sample]
+        :type weights: np.array
+        :return: The scale.
+        :rtype: float
+        """
+        is_finite = np.isfinite(classes_distances).all(axis=1)
+        classes_distances = classes_distances[is_finite]
+        if classes_distances.shape[0] == 0:
+            return 1.0
+        if weights is not None:
+            weights = weights[is_finite]
+        nb_spl, nb_classes = classes_distances.shape
+        smoothing = 1 / (nb_spl + 2)
+        targets = np.full(classes_distances.shape, smoothing / (nb_classes - 1))
+        targets[np.arange(nb_spl), self._train_classes_idx[is_finite]] = 1 - smoothing
+        expected_distances = np.average(targets * classes_distances, axis=0, weights=weights).sum()
+        scale = 1.0
+        for iteration in range(self.max_iter):  # Newton's method on the convex log loss
+            proba = self._get_proba(classes_distances, scale)
+            mean_distances = (proba * classes_distances).sum(axis=1)
+            gradient = expected_distances - np.average(mean_distances, weights=weights)
+            hessian = np.average((proba * classes_distances**2).sum(axis=1) - mean_distances**2, weights=weights)
+            if hessian <= 1e-12:
+                break
+            new_scale = max(0.0, scale - gradient / hessian)
+            if abs(new_scale - scale) < 1e-6 * max(1.0, scale):
+                scale = new_scale
+                break
+            scale = new_scale
+        return scale
+
+    def fit(self, train_data, train_labels, sample_weight=None):
+        """
+        Fit the model using train_data as training data and train_labels as target values.
+
+        :param train_data: The lengths distributions. Rows are samples, columns are lengths and values are counts or percentages.
+        :type train_data: np.matrix
+        :param train_labels: The label of each training sample.
+        :type train_labels: np.array
+        :param sample_weight: The weight of each training sample. [Default: 1 for each sample]
+        :type sample_weight: np.array
+        :return: The instance.
+        :rtype: WassersteinClassifier
+        """
+        self.classes_, self._train_classes_idx = np.unique(np.asarray(train_labels), return_inverse=True)
+        self._train_cdf = self._get_cdf(train_data)
+        self._train_weights = None
+        if sample_weight is not None and not np.all(np.asarray(sample_weight) == 1):
+            self._train_weights = np.asarray(sample_weight, dtype=float)
+        self.scale_ = 1.0
+        if len(self.classes_) > 1:
+            distances = self._get_distances(self._train_cdf)
+            np.fill_diagonal(distances, np.inf)  # Leave-one-out: the sample is excluded from its own class neighbors
+            self.scale_ = self._fit_scale(self._get_classes_distances(distances), self._train_weights)
+        return self
+
+    def predict(self, test_data):
+        """
+        Predict the class of the distributions.
+
+        :param test_data: The lengths distributions. Rows are samples, columns are lengths and values are counts or percentages.
+        :type test_data: np.matrix
+        :return: The predicted class for each sample.
+        :rtype: np.array
+        """
+        classes_distances = self._get_classes_distances(self._get_distances(self._get_cdf(test_data)))
+        return self.classes_[np.argmin(classes_distances, axis=1)]
+
+    def predict_proba(self, test_data):
+        """
+        Return estimated probabilities of the classes (see classes_) for the distributions.
+
+        :param test_data: The lengths distributions. Rows are samples, columns are lengths and values are counts or percentages.
+        :type test_data: np.matrix
+        :return: The probabilities. Rows are samples and columns are classes.
+        :rtype: np.array
+        """
+        classes_distances = self._get_classes_distances(self._get_distances(self._get_cdf(test_data)))
+        return self._get_proba(classes_distances, self.scale_)
+
+
 class LocusClassifier:
     """
     Classifier for locus using MSISample objects.
@@ -786,16 +1015,35 @@ class LocusClassifier:
             labels.append(locus_res.status)
         return np.array(labels)
 
+    def _get_train_weights(self):
+        """
+        Return the weight of each sample in usable train dataset (see LocusRes.getWeight).
+
+        :return: The weight of each sample in usable train dataset or None if all the weights are 1.
+        :rtype: np.array
+        """
+        weights = [curr_spl.loci[self.locus_id].results[self.model_method_name].getWeight() for curr_spl in self._usable_train_dataset]
+        if all(elt == 1 for elt in weights):
+            return None
+        return np.array(weights)
+
     def fit(self, train_dataset):
         """
-        Fit the model using train_dataset as training data and their status as target values.
+        Fit the model using train_dataset as training data and their status as target values. The weights of the compacted references are provided in sample_weight for the classifiers supporting this argument. For the others the references are repeated by their weight.
 
         :param train_dataset: The list of MSISample containing the locus to classify and in LocusRes the data of the selected method and the status ecpected.
         :type test_dataset: list
         """
         self._train_dataset = train_dataset
         self._usable_train_dataset = [spl for spl in train_dataset if self.model_method_name in spl.loci[self.locus_id].results]
-        self.classifier.fit(self._get_train_data(), self._get_train_labels())
+        train_weights = self._get_train_weights()
+        if train_weights is None:
+            self.classifier.fit(self._get_train_data(), self._get_train_labels())
+        elif "sample_weight" in inspect.signature(self.classifier.fit).parameters:
+            self.classifier.fit(self._get_train_data(), self._get_train_labels(), sample_weight=train_weights)
+        else:
+            repeated_idx = np.repeat(np.arange(len(train_weights)), np.rint(train_weights).astype(int))
+            self.classifier.fit(self._get_train_data()[repeated_idx], self._get_train_labels()[repeated_idx])
 
     def predict(self, test_dataset):
         """
@@ -925,7 +1173,7 @@ def getNbSupporting(report, method="model", loci=None):
                 }
             if method in locus.results:
                 locus_status = locus.results[method].status
-                nb_by_locus[locus_id]["supp_by_status"][locus_status] += 1
+                nb_by_locus[locus_id]["supp_by_status"][locus_status] += locus.results[method].getWeight()
     # To list
     counts = []
     for locus_id, locus_info in nb_by_locus.items():
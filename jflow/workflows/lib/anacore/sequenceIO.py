@@ -18,11 +18,13 @@
 __author__ = 'Frederic Escudie - Plateforme bioinformatique Toulouse'
 __copyright__ = 'Copyright (C) 2015 INRA'
 __license__ = 'GNU General Public License'
-__version__ = '1.2.0'
+__version__ = '1.3.1'
 __email__ = 'frogs@toulouse.inra.fr'
 __status__ = 'prod'
 
 import gzip
+import threading
+from queue import Queue, Full
 
 
 def is_gzip(file):
@@ -115,7 +117,7 @@ class FastqIO:
                     seq_qual = line
                     yield Sequence( seq_id, seq_str, seq_desc, seq_qual )
                 self.current_line_nb += 1
-        except:
+        except Exception:  # GeneratorExit must not be converted when the iteration is stopped before the end of file
             raise IOError( "The line " + str(self.current_line_nb) + " in '" + self.filepath + "' cannot be parsed by " + self.__class__.__name__ + "." )
 
     def next_seq(self):
@@ -228,6 +230,210 @@ class FastqIO:
         return seq
 
 
+def _put_until_stopped(queue, item, stop_event):
+    """
+    @summary: Puts item in queue. The wait for a free slot is interrupted when stop_event is set.
+    @param queue: [queue.Queue or multiprocessing.Queue] The queue receiving the item.
+    @param item: The item to put.
+    @param stop_event: [threading.Event or multiprocessing.Event] The event used by the consumer to stop the producer.
+    @return: [bool] True if the item has been put in the queue.
+    """
+    while not stop_event.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def _fastq_batches_producer(filepath, batch_size, queue, stop_event):
+    """
+    @summary: Reads the fastq file and puts its records in queue by batches of batch_size. The end of file is signaled by None and an error by an IOError.
+    @param filepath: [str] The fastq filepath.
+    @param batch_size: [int] The number of records by batch.
+    @param queue: [queue.Queue or multiprocessing.Queue] The queue receiving the batches.
+    @param stop_event: [threading.Event or multiprocessing.Event] The event used by the consumer to stop the producer.
+    """
+    try:
+        with FastqIO(filepath) as FH_in:
+            batch = list()
+            for record in FH_in:
+                batch.append(record)
+                if len(batch) == batch_size:
+                    if not _put_until_stopped(queue, batch, stop_event):
+                        return
+                    batch = list()
+            if len(batch) != 0:
+                if not _put_until_stopped(queue, batch, stop_event):
+                    return
+        _put_until_stopped(queue, None, stop_event)
+    except Exception as error:
+        _put_until_stopped(queue, IOError(str(error)), stop_event)
+    finally:
+        if stop_event.is_set() and hasattr(queue, "cancel_join_thread"):  # The batches never consumed must not block the end of the process
+            queue.cancel_join_thread()
+
+
+class PairedFastqIO:
+    """
+    @summary: Reads or writes R1 and R2 files in lock-step.
+    @note: In read mode each file can be decoded by a background thread or process (see workers).
+    Synopsis:
+        with PairedFastqIO(R1_path, R2_path, workers="thread") as FH_pairs:
+            for R1, R2 in FH_pairs:
+                ...
+    """
+    WORKERS_TYPES = [None, "thread", "process"]
+
+    def __init__(self, filepath_R1, filepath_R2, mode="r", batch_size=1000, workers=None, check_ids=True, queue_size=4):
+        """
+        @param filepath_R1: [str] The R1 filepath.
+        @param filepath_R2: [str] The R2 filepath.
+        @param mode: [str] Mode to open the files ('r', 'w', 'a').
+        @param batch_size: [int] The number of pairs decoded by batch.
+        @param workers: [str] None to decode the two files in the current thread, "thread" or "process" to decode each file in its own background thread or process.
+        @param check_ids: [bool] If True, the IDs of the two reads are compared for each pair and an IOError is raised on the first mismatch.
+        @param queue_size: [int] The maximum number of batches decoded in advance by each background worker.
+        """
+        if workers not in PairedFastqIO.WORKERS_TYPES:
+            raise ValueError("The workers type '{}' is invalid for {}. It must be in: {}".format(workers, self.__class__.__name__, PairedFastqIO.WORKERS_TYPES))
+        self.filepath_R1 = filepath_R1
+        self.filepath_R2 = filepath_R2
+        self.mode = mode
+        self.batch_size = batch_size
+        self.workers = workers
+        self.check_ids = check_ids
+        self.queue_size = queue_size
+        self.current_pair_nb = 0
+        self._writers = None
+        self._stop_event = None
+        self._workers = list()
+        if mode in ["w", "a"]:
+            self._writers = [FastqIO(filepath_R1, mode), FastqIO(filepath_R2, mode)]
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if hasattr(self, '_writers') and self._writers is not None:
+            for FH_out in self._writers:
+                FH_out.close()
+            self._writers = None
+        if hasattr(self, '_stop_event') and self._stop_event is not None:
+            self._stop_event.set()
+            for curr_worker in self._workers:
+                curr_worker.join()
+            self._stop_event = None
+            self._workers = list()
+
+    @staticmethod
+    def get_pair_id(seq_id):
+        """
+        @summary: Returns the ID shared by the two reads of the pair: the ID without the old Illumina suffix /1 or /2.
+        @param seq_id: [str] The ID of the read.
+        @return: [str] The ID of the pair.
+        """
+        if seq_id.endswith("/1") or seq_id.endswith("/2"):
+            return seq_id[:-2]
+        return seq_id
+
+    def _local_batches(self, filepath):
+        """
+        @summary: Returns a generator on the batches of records decoded in the current thread.
+        @param filepath: [str] The fastq filepath.
+        @return: [generator] The batches of records.
+        """
+        with FastqIO(filepath) as FH_in:
+            batch = list()
+            for record in FH_in:
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = list()
+            if len(batch) != 0:
+                yield batch
+
+    def _background_batches(self, queue):
+        """
+        @summary: Returns a generator on the batches of records decoded by a background worker.
+        @param queue: [queue.Queue or multiprocessing.Queue] The queue filled by the worker.
+        @return: [generator] The batches of records.
+        """
+        batch = queue.get()
+        while batch is not None:
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+            batch = queue.get()
+
+    def _get_batches_readers(self):
+        """
+        @summary: Starts the decoding of the two files and returns the two generators on their batches.
+        @return: [list] The generator on the batches of R1 and the generator on the batches of R2.
+        """
+        if self.workers is None:
+            return [self._local_batches(self.filepath_R1), self._local_batches(self.filepath_R2)]
+        if self.workers == "thread":
+            self._stop_event = threading.Event()
+            queues = [Queue(self.queue_size), Queue(self.queue_size)]
+            worker_cls = threading.Thread
+        else:
+            import multiprocessing  # Only loaded with process workers: it slows down the start of the short scripts
+            self._stop_event = multiprocessing.Event()
+            queues = [multiprocessing.Queue(self.queue_size), multiprocessing.Queue(self.queue_size)]
+            worker_cls = multiprocessing.Process
+        for filepath, queue in zip([self.filepath_R1, self.filepath_R2], queues):
+            worker = worker_cls(target=_fastq_batches_producer, args=(filepath, self.batch_size, queue, self._stop_event))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        return [self._background_batches(queue) for queue in queues]
+
+    def iter_batches(self):
+        """
+        @summary: Returns a generator on the batches of pairs.
+        @return: [generator] Each batch is a list of tuples (R1, R2) where R1 and R2 are Sequence.
+        """
+        reader_R1, reader_R2 = self._get_batches_readers()
+        try:
+            for batch_R1 in reader_R1:
+                batch_R2 = next(reader_R2, [])
+                if len(batch_R1) != len(batch_R2):
+                    raise IOError("The files '{}' and '{}' do not contain the same number of reads (difference found after pair {}).".format(self.filepath_R1, self.filepath_R2, self.current_pair_nb + min(len(batch_R1), len(batch_R2))))
+                if self.check_ids:
+                    for idx, (R1, R2) in enumerate(zip(batch_R1, batch_R2)):
+                        if R1.id != R2.id and PairedFastqIO.get_pair_id(R1.id) != PairedFastqIO.get_pair_id(R2.id):
+                            raise IOError("The reads of the pair {} do not have the same ID in '{}' ({}) and '{}' ({}).".format(self.current_pair_nb + idx + 1, self.filepath_R1, R1.id, self.filepath_R2, R2.id))
+                self.current_pair_nb += len(batch_R1)
+                yield list(zip(batch_R1, batch_R2))
+            if next(reader_R2, None) is not None:
+                raise IOError("The files '{}' and '{}' do not contain the same number of reads (difference found after pair {}).".format(self.filepath_R1, self.filepath_R2, self.current_pair_nb))
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.iter_batches():
+            for pair in batch:
+                yield pair
+
+    def write(self, record_R1, record_R2):
+        """
+        @summary: Writes the pair.
+        @param record_R1: [Sequence] The R1.
+        @param record_R2: [Sequence] The R2.
+        """
+        self._writers[0].write(record_R1)
+        self._writers[1].write(record_R2)
+        self.current_pair_nb += 1
+
+
 class FastaIO:
     def __init__(self, filepath, mode="r"):
         """
@@ -0,0 +1,153 @@
+#
+# Copyright (C) 2019 IUCT-O
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__author__ = 'Frederic Escudie'
+__copyright__ = 'Copyright (C) 2019 IUCT-O'
+__license__ = 'GNU General Public License'
+__version__ = '1.0.0'
+__email__ = 'escudie.frederic@iuct-oncopole.fr'
+__status__ = 'prod'
+
+import os
+import json
+import shutil
+import hashlib
+
+
+STORE_FORMAT = "1"  # Change this value invalidates all the stored profiles
+
+
+def getFileChecksum(path, chunk_size=1048576):
+    """
+    Return the MD5 checksum of the file content.
+
+    :param path: Path to the file.
+    :type path: str
+    :param chunk_size: The size of the blocks read in file.
+    :type chunk_size: int
+    :return: The hexadecimal checksum.
+    :rtype: str
+    """
+    checksum = hashlib.md5()
+    with open(path, "rb") as FH_in:
+        chunk = FH_in.read(chunk_size)
+        while chunk:
+            checksum.update(chunk)
+            chunk = FH_in.read(chunk_size)
+    return checksum.hexdigest()
+
+
+def getFileStat(path):
+    """
+    Return a fingerprint of the file based on its path, its size and its last modification time. It is used for the large files which are not modified in place (example: genome).
+
+    :param path: Path to the file.
+    :type path: str
+    :return: The real path, the size and the last modification time.
+    :rtype: list
+    """
+    file_stat = os.stat(path)
+    return [os.path.realpath(path), file_stat.st_size, file_stat.st_mtime]
+
+
+def getFingerprint(files, params):
+    """
+    Return the key of the profiles of a sample. It depends on the content of the input files and on the parameters of the processing.
+
+    :param files: Pathes to the files used in profiles production (example: R1, R2 and targets). None can be used for optional files.
+    :type files: list
+    :param params: The parameters of the processing. It must be serializable in JSON.
+    :type params: dict
+    :return: The key.
+    :rtype: str
+    """
+    fingerprint = hashlib.sha256()
+    fingerprint.update(STORE_FORMAT.encode())
+    for curr_file in files:
+        checksum = "None" if curr_file is None else getFileChecksum(curr_file)
+        fingerprint.update(("\t" + checksum).encode())
+    fingerprint.update(("\t" + json.dumps(params, sort_keys=True)).encode())
+    return fingerprint.hexdigest()
+
+
+class ProfilesStore:
+    """
+    Manage a folder storing the profiles of samples (one file by sample and by kind of profile). Each profile is stored with the fingerprint of the data and the parameters used to produce it.
+
+    Example:
+        store = ProfilesStore("/data/MIAmS_store")
+        key = getFingerprint([R1, R2, targets], {"min_pair_overlap": 20})
+        if store.get(key, "pairs") is None:
+            ...
+            store.add(key, "pairs", pairs_report)
+    """
+
+    def __init__(self, directory):
+        """
+        Build and return an instance of ProfilesStore.
+
+        :param directory: Path to the folder of the store. It is created if it does not exist.
+        :type directory: str
+        :return: The new instance.
+        :rtype: ProfilesStore
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def getPath(self, key, kind):
+        """
+        Return the path of the profile in store.
+
+        :param key: The fingerprint of the profile.
+        :type key: str
+        :param kind: The kind of profile (example: pairs or MSINGS).
+        :type kind: str
+        :return: The path.
+        :rtype: str
+        """
+        return os.path.join(self.directory, key[:2], "{}_{}.json".format(key, kind))
+
+    def get(self, key, kind):
+        """
+        Return the path of the profile if it is stored.
+
+        :param key: The fingerprint of the profile.
+        :type key: str
+        :param kind: The kind of profile (example: pairs or MSINGS).
+        :type kind: str
+        :return: The path to the profile or None if the profile is not stored.
+        :rtype: str
+        """
+        path = self.getPath(key, kind)
+        return path if os.path.exists(path) else None
+
+    def add(self, key, kind, src):
+        """
+        Copy the profile in store. The copy is written in a temporary file renamed at the end to prevent partial profiles with concurrent workflows.
+
+        :param key: The fingerprint of the profile.
+        :type key: str
+        :param kind: The kind of profile (example: pairs or MSINGS).
+        :type kind: str
+        :param src: Path to the profile file.
+        :type src: str
+        """
+        path = self.getPath(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, path)